@@ -11,7 +11,8 @@ from starlette.websockets import WebSocket
 
 from api.routers import botApi, userApi, messageApi, accountApi, chatsApi, proxyApi, userEventApi, filtersApi, \
     notificationApi, securityApi, scrapeForwardApi
-from bot.main import bot
+from bot.main import bot, startup
+from db.engine import pool_checkouts
 from db.models.accounts import AccountCRUD
 
 
@@ -54,6 +55,8 @@ logging.getLogger("uvicorn.access").handlers = [InterceptHandler()]
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start_time = time.time()
+    checkouts = [0]
+    pool_checkouts.set(checkouts)
 
     if request.scope["type"] == "http":
         # Handle HTTP requests
@@ -61,7 +64,7 @@ async def log_requests(request: Request, call_next):
         process_time = time.time() - start_time
         logger.info(
             f"Completed request: {request.method} {request.url} in {process_time:.2f} "
-            f"seconds with status code {response.status_code}"
+            f"seconds with status code {response.status_code}, {checkouts[0]} pool checkouts"
         )
         return response
     elif request.scope["type"] == "websocket":
@@ -89,12 +92,16 @@ app.include_router(scrapeForwardApi.router, tags=["ScrapeForwardMode"], prefix='
 async def start_active_accounts():
     account_crud = AccountCRUD()
     accounts = await account_crud.get_all_accounts()
-    for account in accounts:
-        if account.active:
-            await bot.start_monitoring_for_session(account.id)
+    startup.start([account for account in accounts if account.active])
+
+
+async def shutdown_bot():
+    await startup.stop()
+    await bot.shutdown()
 
 
 app.on_event("startup")(start_active_accounts)
+app.on_event("shutdown")(shutdown_bot)
 
 
 def custom_openapi():
@@ -39,6 +39,7 @@ async def update_account(phone: str, username: Optional[str] = None, created_by:
         updated_account = await db_crud.account_crud.update(phone, **updated_data)
         if not updated_account:
             raise HTTPException(status_code=404, detail="Account not found")
+        await bot.invalidate_ingest_context(account_id=phone)
         return updated_account
     raise HTTPException(status_code=404, detail="No data provided")
 
@@ -46,6 +47,7 @@ async def update_account(phone: str, username: Optional[str] = None, created_by:
 @router.delete("/accounts/{phone}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_account(phone: str, user_id: int = Depends(get_current_user_id)):
     await db_crud.account_crud.delete_on_cascade(phone)
+    await bot.invalidate_ingest_context(account_id=phone)
     return {"detail": "Account deleted"}
 
 
@@ -1,12 +1,14 @@
 import asyncio
 import json
-import os
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 from loguru import logger
 from pydantic import BaseModel
 from api.security import get_current_user_id, get_user_id_from_token, require_role
-from bot.main import bot
+from bot.bot import TelegramChatHistory
+from bot.main import bot, startup
+from bot.reconcile import RECONCILE_STRATEGY, STRATEGIES
+from bot.session_store import delete_session
 from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect, Query
 from db.facade import DB
 
@@ -20,8 +22,7 @@ async def get_code(phone: str):
     if status != "Code sent":
         account = await db_crud.account_crud.read(phone)
         if not account:
-            session_file_path = f'bot/sessions/{phone}.session'
-            os.remove(session_file_path)
+            await delete_session(phone)
         raise HTTPException(status_code=403, detail=f"{status}")
     return status
 
@@ -54,15 +55,41 @@ async def get_deleted(start_timestamp: int = Query(..., description="Start times
                       end_timestamp: int = Query(..., description="End timestamp"),
                       chats: ChatsModel = Depends(),
                       filters: FiltersModel = Depends(),
+                      mode: str = Query("db", description="db answers from tracked changes, "
+                                                          "rescan re-reads chat history from Telegram"),
+                      incremental: bool = Query(True, description="rescan only messages stored since the "
+                                                                  "previous rescan of each chat"),
+                      strategy: str = Query(RECONCILE_STRATEGY, description="probe checks stored ids in batches "
+                                                                           "of 100, scan pages through history"),
                       user_id: int = Depends(get_current_user_id)):
+    if mode not in ("db", "rescan"):
+        raise HTTPException(status_code=400, detail="mode must be db or rescan")
+    if strategy not in STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"strategy must be one of {STRATEGIES}")
     account_ids = await db_crud.account_crud.get_accounts_by_user_id(user_id=user_id)
     account_id = account_ids[0]
     try:
-        deleted_messages = await bot.check_deleted_in_chat(start_time=start_timestamp,
-                                                           end_time=end_timestamp,
-                                                           chats=chats.chats,
-                                                           account_id=account_id.id,
-                                                           filters=filters.filters)
+        if mode == "rescan":
+            deleted_messages = await bot.check_deleted_in_chat(start_time=start_timestamp,
+                                                               end_time=end_timestamp,
+                                                               chats=chats.chats,
+                                                               account_id=account_id.id,
+                                                               filters=filters.filters,
+                                                               incremental=incremental,
+                                                               strategy=strategy)
+        else:
+            changed_messages = await db_crud.message_crud.get_changed_messages(account_id=account_id.id,
+                                                                               chat_ids=chats.chats,
+                                                                               start_time=start_timestamp,
+                                                                               end_time=end_timestamp)
+            changed_messages = await TelegramChatHistory.apply_filters_to_messages(changed_messages,
+                                                                                   filters.filters)
+            deleted_messages = {"deleted": {}, "modified": {}}
+            for message in changed_messages:
+                if message.is_deleted:
+                    deleted_messages["deleted"].setdefault(message.chat_id, []).append(message.to_dict())
+                if message.is_updated:
+                    deleted_messages["modified"].setdefault(message.chat_id, []).append(message.to_dict())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return {
@@ -92,10 +119,48 @@ async def create_session(session_name: str, user_id: int = Depends(get_current_u
 @router.get("/bot/list_sessions")
 @require_role("admin")
 async def list_sessions(user_id: int = Depends(get_current_user_id)):
-    sessions = bot.list_sessions()
+    sessions = await bot.list_sessions()
     return sessions
 
 
+@router.get("/bot/metrics")
+@require_role("admin")
+async def get_metrics(user_id: int = Depends(get_current_user_id)):
+    return await bot.metrics()
+
+
+@router.get("/bot/startup_progress")
+@require_role("admin")
+async def get_startup_progress(user_id: int = Depends(get_current_user_id)):
+    return startup.progress()
+
+
+class BackfillModel(BaseModel):
+    chats: List[int]
+    since: Optional[int] = None
+    max_messages: Optional[int] = None
+    apply_rules: bool = True
+
+
+async def check_account_owner(account_id: str, user_id: int):
+    accounts = await db_crud.account_crud.get_accounts_by_user_id(user_id=user_id)
+    if account_id not in [account.id for account in accounts]:
+        raise HTTPException(status_code=404, detail="Account not found")
+
+
+@router.post("/bot/backfill/{account_id}")
+async def start_backfill(account_id: str, backfill: BackfillModel, user_id: int = Depends(get_current_user_id)):
+    await check_account_owner(account_id, user_id)
+    return await bot.start_backfill(account_id, backfill.chats, since=backfill.since,
+                                    max_messages=backfill.max_messages, apply_rules=backfill.apply_rules)
+
+
+@router.get("/bot/backfill/{account_id}")
+async def get_backfill_status(account_id: str, user_id: int = Depends(get_current_user_id)):
+    await check_account_owner(account_id, user_id)
+    return await bot.backfill_status(account_id)
+
+
 @router.get("/bot/fetch_chats/{session_name}", response_model=str)
 async def fetch_chats(session_name: str):
     try:
@@ -159,7 +224,9 @@ async def websocket_new_messages(websocket: WebSocket):
         return
 
     account_ids = [account.id for account in user_accounts]
-    last_sent_time = datetime.now().timestamp()
+    # (created_at, id) of the last message sent; the id keeps messages that share
+    # a second with the previous batch from being skipped.
+    last_sent = (datetime.now().timestamp(), 0)
     default_filters = {"username": None,
                        "chat_title": None,
                        "content": None,
@@ -185,7 +252,7 @@ async def websocket_new_messages(websocket: WebSocket):
             except asyncio.TimeoutError:
                 pass
 
-            new_messages = await db_crud.message_crud.get_new_messages_async(filters, last_sent_time, account_ids)
+            new_messages = await db_crud.message_crud.get_new_messages_async(filters, last_sent, account_ids)
             if new_messages:
                 msgs = []
                 for message in new_messages:
@@ -193,7 +260,7 @@ async def websocket_new_messages(websocket: WebSocket):
                     msg.update({"chat": message.chat.to_dict()})
                     msgs.append(msg)
                 await websocket.send_text(json.dumps(msgs, default=str))
-                last_sent_time = max(message.created_at for message in new_messages)
+                last_sent = (new_messages[-1].created_at, new_messages[-1].id)
 
     except WebSocketDisconnect:
         logger.error("WebSocket disconnected")
@@ -3,6 +3,7 @@ from loguru import logger
 from fastapi import APIRouter, HTTPException, status, Depends
 
 from api.security import get_current_user_id, require_role
+from bot.main import bot
 from db.facade import DB
 from db.models.filters import UserFilterModel
 
@@ -16,6 +17,7 @@ async def create_user_filter(user_filter: dict, user_id: int = Depends(get_curre
     logger.warning(user_filter)
 
     new_event = await db_crud.userFilter_crud.create(user_filter, user_id)
+    await bot.invalidate_ingest_context(user_id=user_id, rules_changed=True)
     return new_event
 
 
@@ -32,12 +34,14 @@ async def update_user_filter(filter_id: int, user_filter: UserFilterModel, user_
     updated_filter = await db_crud.userFilter_crud.update(filter_id, **user_filter.model_dump())
     if not updated_filter:
         raise HTTPException(status_code=404, detail="User filter not found")
+    await bot.invalidate_ingest_context(user_id=updated_filter.user_id, rules_changed=True)
     return updated_filter
 
 
 @router.delete("/filters/{filter_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_filter(filter_id: int, user_id: int = Depends(get_current_user_id)):
     await db_crud.userFilter_crud.delete(filter_id)
+    await bot.invalidate_ingest_context(user_id=user_id, rules_changed=True)
     return {"detail": "User filter deleted"}
 
 
@@ -6,8 +6,9 @@ from fastapi import APIRouter, HTTPException, status, Query, Depends
 from fastapi.responses import FileResponse
 from starlette.background import BackgroundTask
 from api.security import get_current_user_id, require_role
+from api.utils import encode_cursor, decode_cursor
 from db.facade import DB
-from db.models.message import MessageModel, MessageCreateModel, FilterModel
+from db.models.message import MessageModel, MessageCreateModel, FilterModel, MESSAGE_PAGE_SIZE, MESSAGE_PAGE_MAX
 
 
 router = APIRouter()
@@ -42,6 +43,14 @@ async def delete_message(message_id: int):
     return {"detail": "Message deleted"}
 
 
+def message_page(messages: list, limit: int) -> dict:
+    # Only a full page can have more rows behind it.
+    next_cursor = None
+    if len(messages) == limit:
+        next_cursor = encode_cursor(messages[-1].created_at, messages[-1].id)
+    return {"messages": messages, "next_cursor": next_cursor}
+
+
 @router.get("/messages/")
 @require_role('admin')
 async def read_messages(
@@ -49,32 +58,43 @@ async def read_messages(
         chat_id: Optional[int] = None,
         start_time: Optional[datetime] = Query(None),
         end_time: Optional[datetime] = Query(None),
+        cursor: Optional[str] = None,
+        limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MESSAGE_PAGE_MAX),
         user_id: int = Depends(get_current_user_id)):
 
     if start_time is None:
         start_time = datetime.now() - timedelta(hours=24)
-        
+
+    # created_at is stored as a unix timestamp.
     messages = await db_crud.message_crud.get_filtered_messages(username=username, chat_id=chat_id,
-                                                                start_time=start_time,
-                                                                end_time=end_time)
-    return messages
+                                                                start_time=start_time.timestamp(),
+                                                                end_time=end_time.timestamp() if end_time else None,
+                                                                before=decode_cursor(cursor),
+                                                                limit=limit)
+    return message_page(messages, limit)
 
 
 @router.post("/messages/history/")
-async def get_history_messages(unix_timestamp: Optional[int],
-                               limit: Optional[int],
-                               filters: FilterModel,
+async def get_history_messages(filters: FilterModel,
+                               unix_timestamp: Optional[int] = None,
+                               cursor: Optional[str] = None,
+                               limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MESSAGE_PAGE_MAX),
                                user_id: int = Depends(get_current_user_id)):
+    before = decode_cursor(cursor)
     try:
         accounts = await db_crud.account_crud.get_accounts_by_user_id(user_id)
         accounts_ids = [account.id for account in accounts]
         filters = filters.to_dict()
-        history_messages = await DB.message_crud.get_history_messages(filters=filters,
-                                                                      account_ids=accounts_ids,
-                                                                      limit=limit,
-                                                                      timestamp=unix_timestamp)
-
-        return history_messages
+        history_messages = await db_crud.message_crud.get_history_messages(filters=filters,
+                                                                           account_ids=accounts_ids,
+                                                                           limit=limit,
+                                                                           timestamp=unix_timestamp,
+                                                                           before=before)
+
+        # Pages are fetched newest first; each page is returned oldest first.
+        page = message_page(history_messages, limit)
+        page["messages"] = history_messages[::-1]
+        return page
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
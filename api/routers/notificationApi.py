@@ -6,6 +6,7 @@ from typing import List
 from starlette.websockets import WebSocket, WebSocketDisconnect
 from api.security import get_current_user_id, get_user_id_from_token
 from db.facade import DB
+from decorators.db_session import unit_of_work
 from db.models.notification import NotificationModel, MarkAsReadModel, CreateNotificationModel
 
 
@@ -67,15 +68,16 @@ async def get_grouped_notifications_by_events(user_id: int = Depends(get_current
 
 @router.post("/notifications/user/me/mark_as_read", status_code=status.HTTP_200_OK)
 async def mark_notifications_as_read(notifications: MarkAsReadModel, user_id: int = Depends(get_current_user_id)):
-    notifications_to_mark = await db_crud.notification_crud.get_all_by_user_id(user_id)
-    notifications_dict = {notification.id: notification for notification in notifications_to_mark}
-
-    for notification_id in notifications.notification_ids:
-        if notification_id in notifications_dict:
-            await db_crud.notification_crud.update(notification_id, read=True)
-        else:
-            raise HTTPException(status_code=404,
-                                detail=f"Notification with ID {notification_id} not found for user {user_id}")
+    # One transaction: an unknown id leaves every notification unread.
+    async with unit_of_work():
+        notifications_to_mark = await db_crud.notification_crud.get_all_by_user_id(user_id)
+        notifications_dict = {notification.id: notification for notification in notifications_to_mark}
+
+        for notification_id in notifications.notification_ids:
+            if notification_id not in notifications_dict:
+                raise HTTPException(status_code=404,
+                                    detail=f"Notification with ID {notification_id} not found for user {user_id}")
+        await db_crud.notification_crud.update_many(notifications.notification_ids, read=True)
 
     return {"detail": "Notifications marked as read"}
 
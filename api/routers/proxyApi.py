@@ -1,11 +1,13 @@
 from enum import Enum
 
-from fastapi import HTTPException, status, APIRouter, UploadFile, File, Depends
+from fastapi import HTTPException, status, APIRouter, UploadFile, File, Depends, Query
 from typing import List
 from api.security import get_current_user_id, require_role
 from api.utils import Country_list
 from db.facade import DB
+from decorators.db_session import unit_of_work
 from db.models.proxy import ProxyModel, ProxyResponseModel
+from utils.proxy_import import ProxyImporter
 
 
 router = APIRouter()
@@ -68,12 +70,13 @@ async def update_proxy(proxy_id: int, proxy_data: dict, user_id: int = Depends(g
 @require_role('admin')
 async def delete_proxy(proxy_id: int, user_id: int = Depends(get_current_user_id)):
     try:
-        proxy_to_delete = await DB.proxy_crud.read(id=proxy_id)
-        if proxy_to_delete is None:
-            raise HTTPException(status_code=404, detail="Proxy not found")
-        else:
-            await DB.proxy_crud.delete(id=proxy_id)
-            return {"message": f"Proxy id {proxy_id} is deleted"}
+        async with unit_of_work():
+            proxy_to_delete = await DB.proxy_crud.read(id=proxy_id)
+            if proxy_to_delete is None:
+                raise HTTPException(status_code=404, detail="Proxy not found")
+            else:
+                await DB.proxy_crud.delete(id=proxy_id)
+                return {"message": f"Proxy id {proxy_id} is deleted"}
 
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -92,32 +95,11 @@ async def get_available_proxies(user_id: int = Depends(get_current_user_id)):
 @router.post("/proxies/upload", status_code=status.HTTP_201_CREATED)
 @require_role('admin')
 async def upload_proxies(prx_type: str, location: CountryEnum, file: UploadFile = File(...),
+                         check: bool = Query(False, description="Probe each new proxy before it can be leased"),
                          user_id: int = Depends(get_current_user_id)):
     try:
-        contents = await file.read()
-        proxies = contents.decode().splitlines()
-        created_proxies = []
-
-        for proxy_line in proxies:
-            proxy_data = proxy_line.split(':')
-            ip = proxy_data[0]
-            port = proxy_data[1]
-            login = proxy_data[2]
-            password = proxy_data[3]
-
-            clear_proxy_data = {
-                "type": prx_type,
-                "login": login,
-                "password": password,
-                "ip": ip,
-                "port": int(port),
-                "location": location
-            }
-
-            new_proxy = await db_crud.proxy_crud.create(**clear_proxy_data)
-            created_proxies.append(new_proxy)
-
-        return created_proxies
+        importer = ProxyImporter(prx_type, location.value, check=check)
+        return await importer.run(file)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
     finally:
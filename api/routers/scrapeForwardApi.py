@@ -5,9 +5,11 @@ from typing import List
 import bcrypt
 from dotenv import load_dotenv
 from api.security import create_access_token, get_current_user_id
+from bot.main import bot
 from utils.functions import send_verification_email
 from fastapi import APIRouter, HTTPException, status, Path, Depends
 from db.facade import DB
+from decorators.db_session import unit_of_work
 from db.models.users import UserResponseModel, UserModel, LoginRequest, UserRegistrationResponseModel, ChangePassword
 import random
 import string
@@ -30,6 +32,7 @@ async def update_scrape_forward_mode(scrape_forward_mode: bool, user_id: int = D
     updated_user = await db_crud.user_crud.update(user_id, **update_data)
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
+    await bot.invalidate_ingest_context(user_id=user_id)
     return updated_user
 
 
@@ -42,16 +45,18 @@ async def update_scrape_forward_mode(title: str | list[str] | None, user_id: int
         titles = [title]
 
     chat_ids = []
-    for chat_title in titles:
-        chat = await db_crud.chat_crud.get_by_title(title=chat_title)
-        if chat:
-            chat_ids.append(str(chat.id))
-
-    clear_chat_ids = ",".join(chat_ids)
-    update_data = {"target_chats": clear_chat_ids}
-    updated_user = await db_crud.user_crud.update(user_id, **update_data)
+    async with unit_of_work():
+        for chat_title in titles:
+            chat = await db_crud.chat_crud.get_by_title(title=chat_title)
+            if chat:
+                chat_ids.append(str(chat.id))
+
+        clear_chat_ids = ",".join(chat_ids)
+        update_data = {"target_chats": clear_chat_ids}
+        updated_user = await db_crud.user_crud.update(user_id, **update_data)
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
+    await bot.invalidate_ingest_context(user_id=user_id)
     return updated_user
 
 
@@ -5,9 +5,11 @@ from typing import List
 import bcrypt
 from dotenv import load_dotenv
 from api.security import create_access_token, get_current_user_id
+from bot.main import bot
 from utils.functions import send_verification_email
 from fastapi import APIRouter, HTTPException, status, Path, Depends
 from db.facade import DB
+from decorators.db_session import unit_of_work
 from db.models.users import UserResponseModel, UserModel, LoginRequest, UserRegistrationResponseModel, ChangePassword
 import random
 import string
@@ -58,12 +60,14 @@ async def update_user(user: dict, user_id: int = Depends(get_current_user_id)):
     updated_user = await DB.user_crud.update(user_id, **user)
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
+    await bot.invalidate_ingest_context(user_id=user_id)
     return updated_user
 
 
 @router.delete("/users/me", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(user_id: int = Depends(get_current_user_id)):
     await DB.user_crud.delete(id=user_id)
+    await bot.invalidate_ingest_context(user_id=user_id)
     return {"detail": "User deleted"}
 
 
@@ -146,9 +150,12 @@ async def retry_email_verification(user_id: int):
 
 @router.post("/verify_email")
 async def verify_email(user_id: int, token: str):
-    user = await DB.user_crud.read(id=user_id)
-    if user and user.verification_token == token:
-        await DB.user_crud.update(id=user_id, is_verified=True)
+    async with unit_of_work():
+        user = await DB.user_crud.read(id=user_id)
+        verified = user and user.verification_token == token
+        if verified:
+            await DB.user_crud.update(id=user_id, is_verified=True)
+    if verified:
         access_token = create_access_token(data={"sub": str(user.id)},
                                            expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
         refresh_token = create_access_token(data={"sub": str(user.id)},
@@ -2,6 +2,7 @@ from typing import List
 from fastapi import APIRouter, HTTPException, status, Depends
 
 from api.security import get_current_user_id, require_role
+from bot.main import bot
 from db.facade import DB
 from db.models.message import MessageModel
 from db.models.user_events import UserEventModel
@@ -15,6 +16,7 @@ db_crud = DB()
 async def create_user_event(user_event: dict, user_id: int = Depends(get_current_user_id)):
 
     new_event = await db_crud.userEvent_crud.create(user_event, user_id)
+    await bot.invalidate_ingest_context(user_id=user_id, rules_changed=True)
     return new_event
 
 
@@ -31,12 +33,14 @@ async def update_user_event(event_id: int, user_event: UserEventModel, user_id:
     updated_event = await db_crud.userEvent_crud.update(event_id, **user_event.model_dump())
     if not updated_event:
         raise HTTPException(status_code=404, detail="User event not found")
+    await bot.invalidate_ingest_context(user_id=updated_event.user_id, rules_changed=True)
     return updated_event
 
 
 @router.delete("/user_events/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_event(event_id: int, user_id: int = Depends(get_current_user_id)):
     await db_crud.userEvent_crud.delete(event_id)
+    await bot.invalidate_ingest_context(user_id=user_id, rules_changed=True)
     return {"detail": "User event deleted"}
 
 
@@ -63,7 +67,7 @@ async def get_triggered_messages_by_event_id(event_id: int):
         raise HTTPException(status_code=404, detail="No messages found for this event")
 
     message_ids = [em.message_id for em in event_messages]
-    messages = await db_crud.userEventMessage_crud.get_messages_by_ids(message_ids)
+    messages = await db_crud.message_crud.get_messages_by_ids(message_ids)
     return messages
 
 
@@ -74,5 +78,5 @@ async def get_triggered_messages_by_user_id(user_id: int = Depends(get_current_u
         raise HTTPException(status_code=404, detail="No messages found for this user")
 
     message_ids = [um.message_id for um in user_messages]
-    messages = await db_crud.userEventMessage_crud.get_messages_by_ids(message_ids)
+    messages = await db_crud.message_crud.get_messages_by_ids(message_ids)
     return messages
@@ -1,5 +1,8 @@
+import base64
+import binascii
+
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Request, WebSocket
+from fastapi import Request, WebSocket, HTTPException
 
 
 class CustomOAuth2PasswordBearer(OAuth2PasswordBearer):
@@ -9,6 +12,22 @@ class CustomOAuth2PasswordBearer(OAuth2PasswordBearer):
 
 oauth2_scheme = CustomOAuth2PasswordBearer(tokenUrl="/api/token")
 
+
+# Page cursors are the (created_at, id) of the last row handed out, kept opaque
+# so clients pass them back unchanged.
+def encode_cursor(created_at: int, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}:{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> tuple | None:
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return int(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 Country = [
     ('US', 'United States'),
     ('AF', 'Afghanistan'),
@@ -0,0 +1,85 @@
+# Latency of MessageCRUD.get_messages_by_ids and set_messages_deleted against the
+# per-id SELECT loop they replaced.
+#
+#   python -m benchmarks.message_ids_fetch [--sizes 10,1000,100000] [--baseline-max 100000]
+#
+# Runs against a throwaway SQLite database (BENCH_DB_URL overrides it), never DB_URL.
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+os.environ["DB_URL"] = os.getenv(
+    "BENCH_DB_URL", f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'message_ids_bench.db')}"
+)
+
+from sqlalchemy import delete, insert, select  # noqa: E402
+
+from db.create_tables import create_tables  # noqa: E402
+from db.engine import async_session  # noqa: E402
+from db.facade import DB  # noqa: E402
+from db.models.message import Message  # noqa: E402
+
+db_crud = DB()
+
+
+async def per_id_loop(ids: list) -> list:
+    # The implementation before set-based fetching: one round trip per id.
+    async with async_session() as session:
+        messages = []
+        for id_ in ids:
+            result = await session.execute(select(Message).filter(Message.id == id_))
+            messages.append(result.scalars().one_or_none())
+        return messages
+
+
+async def load_messages(count: int):
+    async with async_session() as session:
+        await session.execute(delete(Message))
+        rows = [{"id": id_, "account_id": "+10000000000", "chat_id": -1001234567890, "message_id": id_,
+                 "text": f"message {id_}", "is_deleted": False, "is_updated": False,
+                 "created_at": 1_700_000_000 + id_, "updated_at": 1_700_000_000 + id_}
+                for id_ in range(1, count + 1)]
+        for start in range(0, len(rows), 5000):
+            await session.execute(insert(Message), rows[start:start + 5000])
+        await session.commit()
+
+
+async def timed(coro) -> tuple:
+    started = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - started) * 1000
+
+
+async def main(args):
+    sizes = [int(size) for size in args.sizes.split(",")]
+    await create_tables()
+    await load_messages(max(args.messages, max(sizes)))
+    rng = random.Random(args.seed)
+
+    print(f"{'ids':>8} {'per-id loop':>14} {'get_messages_by_ids':>20} {'set_messages_deleted':>21}")
+    for size in sizes:
+        ids = rng.sample(range(1, max(args.messages, max(sizes)) + 1), size)
+        baseline = "skipped"
+        if size <= args.baseline_max:
+            _, elapsed = await timed(per_id_loop(ids))
+            baseline = f"{elapsed:.1f} ms"
+
+        messages, fetch_ms = await timed(db_crud.message_crud.get_messages_by_ids(ids))
+        assert [message.id for message in messages] == ids, "get_messages_by_ids lost the order of ids"
+        messages, delete_ms = await timed(db_crud.message_crud.set_messages_deleted(ids))
+        assert [message.id for message in messages] == ids and all(message.is_deleted for message in messages)
+
+        print(f"{size:>8} {baseline:>14} {fetch_ms:>17.1f} ms {delete_ms:>18.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,1000,100000", help="comma separated id counts")
+    parser.add_argument("--messages", type=int, default=100_000, help="messages stored before measuring")
+    parser.add_argument("--baseline-max", type=int, default=100_000,
+                        help="largest id count to time the per-id loop for")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
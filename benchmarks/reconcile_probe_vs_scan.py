@@ -0,0 +1,140 @@
+# Compares the "scan" and "probe" reconcile strategies on a fake Telegram client.
+#
+#   python -m benchmarks.reconcile_probe_vs_scan [--history 200000] [--stored 4000] [--rtt 0.05]
+#
+# Runs against a throwaway SQLite database (BENCH_DB_URL overrides it), never DB_URL.
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+os.environ["DB_URL"] = os.getenv(
+    "BENCH_DB_URL", f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'reconcile_bench.db')}"
+)
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from bot.reconcile import Reconciler  # noqa: E402
+from db.create_tables import create_tables  # noqa: E402
+from db.engine import async_session  # noqa: E402
+from db.models.accounts import Account  # noqa: E402
+from db.models.chats import Chat  # noqa: E402
+from db.models.message import Message  # noqa: E402
+from db.models.reconcile_state import ReconcileState  # noqa: E402
+
+ACCOUNT_ID = "+10000000000"
+CHAT_ID = -1001234567890
+TELEGRAM_PAGE_SIZE = 100
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, text: str):
+        self.id = message_id
+        self.text = text
+
+
+class FakeClient:
+    # Serves a chat history from memory and counts requests the way Telethon would
+    # issue them: iter_messages pages by 100, get_messages sends one request per call.
+    def __init__(self, history: dict, rtt: float):
+        self.history = history
+        self.ids = sorted(history)
+        self.rtt = rtt
+        self.requests = 0
+
+    async def _request(self):
+        self.requests += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+
+    async def iter_messages(self, entity, min_id: int = 0, reverse: bool = False):
+        ids = [message_id for message_id in self.ids if message_id > min_id]
+        for start in range(0, len(ids), TELEGRAM_PAGE_SIZE):
+            await self._request()
+            for message_id in ids[start:start + TELEGRAM_PAGE_SIZE]:
+                yield self.history[message_id]
+
+    async def get_messages(self, entity, ids: list):
+        await self._request()
+        return [self.history.get(message_id) for message_id in ids]
+
+
+async def no_filters(messages, filters):
+    return messages
+
+
+def build_chat(history_size: int, stored: int, deleted_ratio: float, edited_ratio: float, seed: int):
+    rng = random.Random(seed)
+    stored_ids = sorted(rng.sample(range(1, history_size + 1), stored))
+    deleted = set(rng.sample(stored_ids, int(stored * deleted_ratio)))
+    edited = set(rng.sample([i for i in stored_ids if i not in deleted], int(stored * edited_ratio)))
+
+    history = {message_id: FakeMessage(message_id, f"edited {message_id}" if message_id in edited
+                                       else f"message {message_id}")
+               for message_id in range(1, history_size + 1) if message_id not in deleted}
+    rows = [{"account_id": ACCOUNT_ID, "chat_id": CHAT_ID, "message_id": message_id, "text": f"message {message_id}",
+             "is_deleted": False, "is_updated": False, "created_at": 1_700_000_000 + message_id,
+             "updated_at": 1_700_000_000 + message_id} for message_id in stored_ids]
+    return history, rows, deleted, edited
+
+
+async def load_rows(rows: list):
+    async with async_session() as session:
+        await session.execute(delete(ReconcileState))
+        await session.execute(delete(Message))
+        await session.execute(delete(Chat))
+        await session.execute(delete(Account))
+        await session.execute(insert(Account), [{"id": ACCOUNT_ID, "created_at": 0, "updated_at": 0}])
+        await session.execute(insert(Chat), [{"id": CHAT_ID, "chat_title": "bench", "created_at": 0,
+                                              "updated_at": 0}])
+        for start in range(0, len(rows), 5000):
+            await session.execute(insert(Message), rows[start:start + 5000])
+        await session.commit()
+
+
+async def run_strategy(strategy: str, history: dict, rows: list, rtt: float) -> dict:
+    # Every strategy starts from the same stored state: a run marks deletions and applies edits.
+    await load_rows(rows)
+    client = FakeClient(history, rtt)
+    reconciler = Reconciler(client, ACCOUNT_ID, no_filters, strategy=strategy)
+    started = time.perf_counter()
+    diff = await reconciler.run([CHAT_ID], 0, 2 ** 40, incremental=False)
+    return {
+        "seconds": time.perf_counter() - started,
+        "requests": client.requests,
+        "fetched": reconciler.counters["fetched"],
+        "deleted": {message["message_id"] for message in diff["deleted"].get(CHAT_ID, [])},
+        "modified": {message["message_id"] for message in diff["modified"].get(CHAT_ID, [])},
+    }
+
+
+async def main(args):
+    await create_tables()
+    history, rows, deleted, edited = build_chat(args.history, args.stored, args.deleted_ratio,
+                                                args.edited_ratio, args.seed)
+    print(f"chat: {args.history} messages, {args.stored} stored, {len(deleted)} deleted, {len(edited)} edited, "
+          f"rtt {args.rtt * 1000:.0f} ms")
+
+    results = {}
+    for strategy in ("scan", "probe"):
+        result = results[strategy] = await run_strategy(strategy, history, rows, args.rtt)
+        print(f"{strategy:>5}: {result['seconds']:8.2f}s  {result['requests']:6} requests  "
+              f"{result['fetched']:8} fetched  {len(result['deleted'])} deleted  {len(result['modified'])} modified")
+
+    for strategy, result in results.items():
+        assert result["deleted"] == deleted, f"{strategy} found the wrong deletions"
+        assert result["modified"] == edited, f"{strategy} found the wrong edits"
+    print("both strategies found the same deletions and edits")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", type=int, default=200_000, help="messages in the chat history")
+    parser.add_argument("--stored", type=int, default=4_000, help="messages stored for the chat")
+    parser.add_argument("--deleted-ratio", type=float, default=0.15)
+    parser.add_argument("--edited-ratio", type=float, default=0.05)
+    parser.add_argument("--rtt", type=float, default=0.0, help="simulated seconds per Telegram request")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
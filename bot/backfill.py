@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from loguru import logger
+from telethon import errors
+
+from bot.entities import describe_chat, normalize_text, build_message_data
+from bot.scheduler import request_priority, BACKFILL
+from db.facade import DB
+from db.models.backfill import RUNNING, DONE, FAILED
+
+load_dotenv()
+db_crud = DB()
+
+BACKFILL_ACCOUNT_CONCURRENCY = int(os.getenv("BACKFILL_ACCOUNT_CONCURRENCY", 2))
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", 1000))
+BACKFILL_WAIT_TIME = float(os.getenv("BACKFILL_WAIT_TIME", 1.0))
+BACKFILL_MAX_WAIT_TIME = 10.0
+BACKFILL_ON_LOGIN_MESSAGES = int(os.getenv("BACKFILL_ON_LOGIN_MESSAGES", 0))
+
+
+class ChatProgress:
+    def __init__(self, processed: int):
+        self.started_at = time.monotonic()
+        self.processed_at_start = processed
+        self.processed = processed
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return (self.processed - self.processed_at_start) / elapsed if elapsed > 0 else 0.0
+
+
+class Backfiller:
+    # Imports chat history newest to oldest, one page at a time. Each page is
+    # inserted before the checkpoint moves past it, so a restarted job resumes
+    # from the last saved offset_id without gaps.
+    def __init__(self, history, concurrency: int = BACKFILL_ACCOUNT_CONCURRENCY,
+                 page_size: int = BACKFILL_PAGE_SIZE, wait_time: float = BACKFILL_WAIT_TIME):
+        self.history = history
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.wait_time = wait_time
+        self.semaphores = {}
+        self.tasks = {}
+        self.progress = {}
+        self.flood_waits = 0
+
+    async def start(self, account_id: str, chat_ids: list, since: int = None, max_messages: int = None,
+                    apply_rules: bool = True) -> dict:
+        await db_crud.backfill_crud.schedule(account_id, chat_ids, since=since, max_messages=max_messages,
+                                             apply_rules=apply_rules)
+        await self.resume(account_id)
+        return await self.status(account_id)
+
+    async def resume(self, account_id: str):
+        for checkpoint in await db_crud.backfill_crud.get_unfinished(account_id):
+            key = (account_id, checkpoint.chat_id)
+            task = self.tasks.get(key)
+            if task is not None and not task.done():
+                continue
+            self.tasks[key] = asyncio.create_task(self.run_chat(checkpoint))
+
+    def is_running(self, account_id: str) -> bool:
+        return any(key[0] == account_id and not task.done() for key, task in self.tasks.items())
+
+    async def run_chat(self, checkpoint):
+        key = (checkpoint.account_id, checkpoint.chat_id)
+        semaphore = self.semaphores.setdefault(checkpoint.account_id, asyncio.Semaphore(self.concurrency))
+        request_priority.set(BACKFILL)
+        wait_time = self.wait_time
+        async with semaphore:
+            while True:
+                try:
+                    await self.backfill_chat(checkpoint, wait_time)
+                    return
+                except errors.FloodWaitError as e:
+                    # Resume from the checkpoint after the wait, and slow the pacing down.
+                    self.flood_waits += 1
+                    wait_time = min(BACKFILL_MAX_WAIT_TIME, max(wait_time, 0.5) * 2)
+                    logger.warning(f"Backfill of {checkpoint.chat_id} for {checkpoint.account_id} hit FloodWait, "
+                                   f"sleeping {e.seconds}s")
+                    await asyncio.sleep(e.seconds)
+                except Exception as e:
+                    logger.error(f"Backfill of {checkpoint.chat_id} for {checkpoint.account_id} failed: {e}")
+                    checkpoint.status = FAILED
+                    await db_crud.backfill_crud.save(*key, status=FAILED, error=str(e))
+                    return
+                finally:
+                    if self.tasks.get(key) is asyncio.current_task() and checkpoint.status in (DONE, FAILED):
+                        del self.tasks[key]
+
+    async def backfill_chat(self, checkpoint, wait_time: float):
+        account_id, chat_id = checkpoint.account_id, checkpoint.chat_id
+        client = self.history.sessions.get(account_id)
+        if client is None:
+            client = await self.history.get_client_by_session_name(account_id)
+        if client is None:
+            raise Exception("Client is not authorized")
+
+        checkpoint.status = RUNNING
+        await db_crud.backfill_crud.save(account_id, chat_id, status=RUNNING, error=None)
+        progress = self.progress[(account_id, chat_id)] = ChatProgress(checkpoint.processed)
+
+        entity = await client.get_entity(chat_id)
+        chat_info = describe_chat(entity)
+        if chat_info is None:
+            raise Exception(f"Unsupported chat type {type(entity).__name__}")
+        since = datetime.fromtimestamp(checkpoint.since, tz=timezone.utc) if checkpoint.since else None
+        limit = None
+        if checkpoint.max_messages:
+            limit = max(checkpoint.max_messages - checkpoint.processed, 0)
+
+        messages = client.iter_messages(entity, offset_id=checkpoint.offset_id, limit=limit, wait_time=wait_time)
+        page = []
+        async for message in messages:
+            if since is not None and message.date < since:
+                break
+            page.append(message)
+            if len(page) >= self.page_size:
+                await self.flush_page(checkpoint, chat_info, entity, page, messages.total)
+                progress.processed = checkpoint.processed
+                page = []
+        if page:
+            await self.flush_page(checkpoint, chat_info, entity, page, messages.total)
+            progress.processed = checkpoint.processed
+
+        checkpoint.status = DONE
+        await db_crud.backfill_crud.save(account_id, chat_id, status=DONE)
+        logger.info(f"Backfill of {chat_id} for {account_id} finished: {checkpoint.processed} messages read, "
+                    f"{checkpoint.inserted} inserted")
+
+    async def flush_page(self, checkpoint, chat_info: tuple, entity, page: list, total: int | None):
+        account_id, chat_id = checkpoint.account_id, checkpoint.chat_id
+        existing = await db_crud.message_crud.get_existing_message_ids(account_id, chat_info[0],
+                                                                      [message.id for message in page])
+        rows = []
+        for message in page:
+            text = normalize_text(message.text)
+            if not text or message.id in existing:
+                continue
+            row = build_message_data(text, chat_info, account_id, message.sender or entity, message.id)
+            row["created_at"] = int(message.date.timestamp())
+            rows.append(row)
+
+        await db_crud.message_crud.create_many(rows)
+        if checkpoint.apply_rules and rows:
+            await self.apply_rules(account_id, rows)
+
+        checkpoint.offset_id = page[-1].id
+        checkpoint.processed += len(page)
+        checkpoint.inserted += len(rows)
+        if total is not None:
+            checkpoint.total = min(total, checkpoint.max_messages) if checkpoint.max_messages else total
+        await db_crud.backfill_crud.save(account_id, chat_id, offset_id=checkpoint.offset_id,
+                                         processed=checkpoint.processed, inserted=checkpoint.inserted,
+                                         total=checkpoint.total)
+
+    async def apply_rules(self, account_id: str, rows: list):
+        context = await self.history.ingest_context.get(account_id)
+        if context is None:
+            return
+        for row in rows:
+            triggered_events = await self.history.rule_engine.match_events(row, context.user_id)
+            if triggered_events:
+                await self.history.notification_dispatcher.submit(triggered_events, context.tg_id)
+
+    async def status(self, account_id: str = None) -> dict:
+        accounts = {}
+        for checkpoint in await db_crud.backfill_crud.get_for_account(account_id):
+            account = accounts.setdefault(checkpoint.account_id, {"messages_per_second": 0.0, "remaining": 0,
+                                                                  "eta_s": None, "chats": {}})
+            chat = checkpoint.to_dict()
+            progress = self.progress.get((checkpoint.account_id, checkpoint.chat_id))
+            if progress is not None and checkpoint.status == RUNNING:
+                chat["messages_per_second"] = round(progress.rate(), 1)
+                account["messages_per_second"] += progress.rate()
+            if checkpoint.status not in (DONE, FAILED) and checkpoint.total is not None:
+                account["remaining"] += max(checkpoint.total - checkpoint.processed, 0)
+            account["chats"][checkpoint.chat_id] = chat
+
+        for account in accounts.values():
+            if account["messages_per_second"] > 0:
+                account["eta_s"] = round(account["remaining"] / account["messages_per_second"])
+            account["messages_per_second"] = round(account["messages_per_second"], 1)
+        return {"flood_waits": self.flood_waits, "accounts": accounts}
+
+    async def stop(self):
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks.clear()
@@ -2,31 +2,59 @@ import asyncio
 import json
 import os
 import pathlib
-from datetime import datetime, timezone
-
-from aiogram.exceptions import TelegramForbiddenError
 
 from api.utils import Country_list
-from db.models.chats import ChatModel
+from dotenv import load_dotenv
 from db.models.accounts import AccountModel
 from telethon import TelegramClient, events, errors
 from loguru import logger
 from telethon.tl.types import Chat, Channel, User
 from db.facade import DB
+from bot.backfill import Backfiller, BACKFILL_ON_LOGIN_MESSAGES
+from bot.changes import MessageChangeTracker
+from bot.entities import describe_chat
+from bot.forwarder import Forwarder
+from bot.hibernation import SessionHibernator
+from bot.media import MediaDownloader, MEDIA_ENABLED
+from bot.ingest_context import IngestContextCache
+from bot.notifications import NotificationDispatcher
+from bot.pipeline import IngestPipeline
+from bot.proxy_pool import ProxyPool
+from bot.reconcile import Reconciler, RECONCILE_STRATEGY
+from bot.rule_engine import RuleEngine
+from bot.scheduler import ScheduledTelegramClient, request_scheduler
+from bot.session_store import SESSION_DIR, open_session, delete_session, flush_sessions
+from bot.sink import message_sink
+from bot.supervisor import SessionSupervisor
 from telegram.tgbot import TGbot
 from utils.functions import get_country_from_phone_number
 
+load_dotenv()
 db_crud = DB()
 
+PENDING_LOGIN_TTL = float(os.getenv("PENDING_LOGIN_TTL", 600))
+
 
 class TelegramChatHistory:
-    def __init__(self, base_dir='bot/sessions'):
+    def __init__(self, base_dir='bot/sessions', proxy_health_checks: bool = True):
         self.base_dir = pathlib.Path(base_dir).resolve()
         self.api_id = 2040
         self.api_hash = 'b18441a1ff607e10a989891a5462e627'
         self.sessions = {}
         self.pending_sessions = {}
+        self.pending_login_timers = {}
         self.monitoring_tasks = {}
+        self.ingest_context = IngestContextCache()
+        self.rule_engine = RuleEngine()
+        self.notification_dispatcher = NotificationDispatcher(TGbot)
+        self.forwarders = {}
+        self.pipelines = {}
+        self.change_trackers = {}
+        self.supervisors = {}
+        self.proxy_pool = ProxyPool(self, check_health=proxy_health_checks)
+        self.media_downloader = MediaDownloader() if MEDIA_ENABLED else None
+        self.backfiller = Backfiller(self)
+        self.hibernator = SessionHibernator(self)
         if not self.base_dir.exists():
             self.base_dir.mkdir(parents=True)
 
@@ -37,17 +65,18 @@ class TelegramChatHistory:
         if phone in self.sessions.keys() or phone in self.pending_sessions.keys():
             logger.error("Account already exists")
             return 'Account already exists'
+        proxy = None
         try:
             location = await get_country_from_phone_number(phone)
             if location not in Country_list:
                 location = 'Germany'
-            proxy = await db_crud.proxy_crud.get_available_by_location(location)
+            proxy = await self.proxy_pool.lease(location)
             if proxy:
-                proxy = proxy[0]
-                client = TelegramClient(
-                    session="bot/sessions/" + phone,
+                client = ScheduledTelegramClient(
+                    session=await open_session(phone),
                     api_id=self.api_id,
                     api_hash=self.api_hash,
+                    account_id=phone,
                     proxy=(
                         proxy.type,
                         proxy.ip,
@@ -63,32 +92,65 @@ class TelegramChatHistory:
                     phone_code = await client.send_code_request(phone)
                     phone_code_hash = phone_code.phone_code_hash
                     self.pending_sessions[phone] = [client, phone_code_hash, proxy.id]
+                    self._expire_pending_login_later(phone)
                     logger.info("Code sent to " + phone)
                     return 'Code sent'
                 else:
                     await client.disconnect()
+                    await self.proxy_pool.release(proxy.id)
             else:
-                client = TelegramClient(
-                    session="bot/sessions/" + phone,
+                client = ScheduledTelegramClient(
+                    session=await open_session(phone),
                     api_id=self.api_id,
-                    api_hash=self.api_hash
+                    api_hash=self.api_hash,
+                    account_id=phone
                 )
                 await client.connect()
                 if not await client.is_user_authorized():
                     phone_code = await client.send_code_request(phone)
                     phone_code_hash = phone_code.phone_code_hash
                     self.pending_sessions[phone] = [client, phone_code_hash, None]
+                    self._expire_pending_login_later(phone)
                     logger.info("Code sent to " + phone)
                     return 'Code sent'
                 else:
                     await client.disconnect()
         except errors.PhoneNumberBannedError as e:
             logger.error(f"got: {e.message}")
+            if proxy:
+                await self.proxy_pool.release(proxy.id)
             return 'PhoneNumberBanned'
 
+    def _expire_pending_login_later(self, phone):
+        # A login nobody finishes with pass_code would hold its client and its
+        # leased proxy forever.
+        async def expire():
+            await asyncio.sleep(PENDING_LOGIN_TTL)
+            logger.warning(f"Login for {phone} not completed within {PENDING_LOGIN_TTL:.0f}s, dropped")
+            await self.drop_pending_login(phone)
+
+        self.pending_login_timers[phone] = asyncio.create_task(expire())
+
+    def _forget_pending_login(self, phone):
+        timer = self.pending_login_timers.pop(phone, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        return self.pending_sessions.pop(phone, None)
+
+    async def drop_pending_login(self, phone):
+        pending = self._forget_pending_login(phone)
+        if pending is None:
+            return
+        client, _, proxy_id = pending
+        try:
+            await client.disconnect()
+        except Exception as e:
+            logger.error(f"Failed to disconnect the pending login client for {phone}: {e}")
+        await self.proxy_pool.release(proxy_id)
+
     async def pass_code(self, phone, code=None, account=None, password=None):
 
-        client, phone_cash, proxy_id = self.pending_sessions.get(phone)
+        client, phone_cash, proxy_id = self.pending_sessions.get(phone, (None, None, None))
         if client:
             try:
                 if password is not None:
@@ -102,18 +164,23 @@ class TelegramChatHistory:
                                          )
                 me = await client.get_me()
                 self.sessions[me.phone] = client
-                del self.pending_sessions[phone]
+                self._forget_pending_login(phone)
                 username = me.username if me.username is not None else me.first_name
                 user = await db_crud.user_crud.get_user_id_by_username(account)
                 account_data = {"id": me.phone,
                                 "username": username,
-                                "created_by": user.id}
+                                "created_by": user.id,
+                                "proxy_id": proxy_id}
                 new_account = await db_crud.account_crud.create(**account_data)
 
                 if new_account:
                     logger.info(f"Account created in database for {me.phone}")
                     account_id = new_account.id
                     await self.fetch_and_save_chats(client, account_id)
+                    if BACKFILL_ON_LOGIN_MESSAGES > 0:
+                        chats = await db_crud.chat_crud.get_chats_for_account(account_id)
+                        await self.backfiller.start(account_id, [chat.id for chat in chats],
+                                                    max_messages=BACKFILL_ON_LOGIN_MESSAGES)
 
                 else:
                     logger.error(f"Failed to create account in database for {me.phone}")
@@ -135,7 +202,8 @@ class TelegramChatHistory:
         if session_name in self.sessions:
             logger.info(f"Session {session_name} already exists.")
 
-        client = TelegramClient('bot/sessions/' + session_name, self.api_id, self.api_hash)
+        client = ScheduledTelegramClient(await open_session(session_name), self.api_id, self.api_hash,
+                                         account_id=session_name)
         await client.connect()
         me = await client.get_me()
         self.sessions[session_name] = client
@@ -161,21 +229,31 @@ class TelegramChatHistory:
         logger.info(f"Session {session_name} created and monitoring started.")
 
     async def start_monitoring_for_session(self, session_name):
-        if session_name in self.monitoring_tasks:
+        task = self.monitoring_tasks.get(session_name)
+        if task is not None and not task.done():
             logger.info(f"Monitoring already started for {session_name}.")
-            return
+            return True
         await db_crud.account_crud.set_active(session_name, True)
-        await self.get_client_by_session_name(session_name)
-        task = asyncio.create_task(self.monitor_messages(session_name))
+        client = await self.get_client_by_session_name(session_name)
+        if client is None or session_name not in self.sessions:
+            logger.error(f"Monitoring not started for {session_name}: client is not authorized.")
+            return False
+        self.proxy_pool.start()
+        self.hibernator.start()
+        if self.media_downloader is not None:
+            self.media_downloader.start()
+        supervisor = self.supervisors[session_name] = SessionSupervisor(self, session_name)
+        task = asyncio.create_task(supervisor.run())
         self.monitoring_tasks[session_name] = task
+        await self.backfiller.resume(session_name)
 
         logger.info(f"Monitoring started for {session_name}.")
-        return self.monitoring_tasks
+        return True
 
     async def get_client_by_session_name(self, session_name: str) -> TelegramClient | None:
-        session_file_path = f"bot/sessions/{session_name}"
-
-        os.makedirs(os.path.dirname(session_file_path), exist_ok=True)
+        os.makedirs(SESSION_DIR, exist_ok=True)
+        await self.hibernator.wake(session_name)
+        self.hibernator.touch(session_name)
 
         client = self.sessions.get(session_name)
 
@@ -192,10 +270,11 @@ class TelegramChatHistory:
             try:
                 account = await db_crud.account_crud.read(session_name)
                 proxy = await db_crud.proxy_crud.read(account.proxy_id) if account else None
-                client = TelegramClient(
-                    session=session_file_path,
+                client = ScheduledTelegramClient(
+                    session=await open_session(session_name),
                     api_id=self.api_id,
                     api_hash=self.api_hash,
+                    account_id=session_name,
                     proxy=(proxy.type, proxy.ip, proxy.port, True, proxy.login, proxy.password) if proxy else None
                 )
                 await client.connect()
@@ -212,217 +291,80 @@ class TelegramChatHistory:
                 return None
         return client
 
-    async def monitor_messages(self, session_name):
+    async def monitor_messages(self, session_name, supervisor: SessionSupervisor = None):
         if session_name not in self.sessions:
             raise Exception(f"Session {session_name} not found.")
         client = self.sessions[session_name]
+        forwarder = self.forwarders[session_name] = Forwarder(client, session_name)
+        pipeline = self.pipelines[session_name] = IngestPipeline(self, session_name, forwarder)
+        tracker = self.change_trackers[session_name] = MessageChangeTracker(session_name, pipeline)
+        pipeline.start()
 
         try:
             async with (client):
                 @client.on(events.NewMessage)
                 async def handler(event):
-                    try:
-                        chat = await event.get_chat()
-                        if isinstance(chat, User):
-                            chat_id = chat.id
-                            chat_name = chat.first_name
-                            if hasattr(chat, 'usernames'):
-                                try:
-                                    chat_username = chat.usernames[0].username if chat.usernames else chat.first_name
-                                except KeyError:
-                                    chat_username = chat.first_name
-                            else:
-                                chat_username = chat.username if hasattr(chat, 'username') else chat.first_name
-                            chat_type = 'Private chat'
-                        elif isinstance(chat, Chat):
-                            chat_id = chat.id
-                            chat_name = chat.title if hasattr(chat, 'title') else "Unknown"
-                            if hasattr(chat, 'usernames'):
-                                try:
-                                    chat_username = chat.usernames[0].username if chat.usernames else chat.title
-                                except KeyError:
-                                    chat_username = chat.title
-                            else:
-                                chat_username = chat.username if hasattr(chat, 'username') else chat.title
-                            chat_type = 'Group'
-                        elif isinstance(chat, Channel):
-                            chat_id = chat.id
-                            chat_name = chat.title if hasattr(chat, 'title') else "Unknown"
-                            if hasattr(chat, 'usernames'):
-                                try:
-                                    chat_username = chat.usernames[0].username if chat.usernames else chat.title
-                                except KeyError:
-                                    chat_username = chat.title
-                            else:
-                                chat_username = chat.username if hasattr(chat, 'username') else chat.title
-                            chat_type = 'Group' if chat.megagroup else 'Channel'
-                        else:
-                            chat_id = 0
-                            chat_name = 'Unknown'
-                            chat_username = 'Unknown'
-                            chat_type = 'Unknown'
-
-                    except errors.rpcerrorlist.ChannelPrivateError:
-                        return
-
-                    existing_chat = await db_crud.chat_crud.read(chat_id)
-                    if not existing_chat:
-                        chat_model = ChatModel(id=chat_id,
-                                               chat_title=chat_name,
-                                               chat_username=chat_username,
-                                               chat_type=chat_type)
-                        await db_crud.chat_crud.create(**chat_model.model_dump())
-                        await db_crud.chat_crud.add_account_to_chat(chat_id, session_name)
-
-                    sender = await event.get_sender()
-                    if isinstance(sender, User):
-                        sender_username = sender.username if sender else sender.first_name
-                    else:
-                        sender_username = chat_username
-                    # try:
-                    #     sender_bot = sender.bot
-                    # except AttributeError:
-                    #     sender_bot = False
-                    if sender is not None:
-                        message_text = event.text.replace('\n', '') if event.text else ''
-                        if message_text:
-
-                            message_data = {
-                                "text": message_text,
-                                "chat_id": chat_id,
-                                "chat_title": chat_name,
-                                "account_id": session_name,
-                                "sender_user_id": sender.id if sender else None,
-                                "sender_username": sender_username,
-                                "message_id": event.message.id,
-                            }
-
-                            account = await db_crud.account_crud.read(session_name)
-                            user_id = account.created_by
-                            user = await db_crud.user_crud.read(user_id)
-                            if user.scrape_forward_mode:
-                                need_to_forward = await self.compare_events_and_message(message_data,
-                                                                                        account.created_by,
-                                                                                        user_filters=True)
-
-                                if need_to_forward:
-                                    user_raw_forward_chats = user.target_chats.split(",")
-                                    for target_chat_id in user_raw_forward_chats:
-                                        target_chat = await client.get_entity(int(target_chat_id))
-                                        await event.forward_to(target_chat)
-
-                            triggered_events = await self.compare_events_and_message(message_data, account.created_by)
-                            if triggered_events:
-                                await self.send_event_response(triggered_events)
-                            await db_crud.message_crud.create(**message_data)
-
+                    self.hibernator.touch(session_name)
+                    if supervisor is not None:
+                        supervisor.on_message(event.message.date)
+                    await pipeline.submit(event)
+
+                @client.on(events.MessageDeleted)
+                async def deleted_handler(event):
+                    self.hibernator.touch(session_name)
+                    tracker.on_deleted(event)
+
+                @client.on(events.MessageEdited)
+                async def edited_handler(event):
+                    self.hibernator.touch(session_name)
+                    tracker.on_edited(event)
+
+                if supervisor is not None:
+                    supervisor.on_connected()
+                # Replays updates missed while the account was disconnected through the handlers above.
+                await client.catch_up()
                 await client.run_until_disconnected()
+            if supervisor is not None:
+                supervisor.on_disconnected("Disconnected")
         except Exception as e:
             logger.error(f"Error in monitoring {session_name}: {str(e)}")
-
-    @staticmethod
-    async def send_event_response(triggerd_events):
-        for event, user_id, match_details, message in triggerd_events:
-            user = await db_crud.user_crud.read(user_id)
-
-            detail_message = " | ".join(match_details)
-            notification_message = (f"<b>Event Triggered:</b> {detail_message}\n"
-                                    f"\n<b>Message:</b>\n"
-                                    f"[{message['sender_username']}]: {message['text']}")
-
-            await db_crud.notification_crud.create(user_id=user_id, event_id=event.id, text=notification_message)
-
-            if user and user.tg_id:
-                try:
-                    await TGbot.send_message(chat_id=user.tg_id, text=notification_message, parse_mode="HTML")
-                except TelegramForbiddenError:
-                    await db_crud.user_crud.set_notification_status(user_id, False)
-                    await db_crud.notification_crud.create(user_id=user_id,
-                                                           event_id=event.id,
-                                                           text='You have blocked bot for notifications.')
-
-    @staticmethod
-    async def compare_events_and_message(message: dict, user_id: int, user_filters: bool = False) -> list:
-        filters_events = await db_crud.userEvent_crud.get_all_by_user_id(user_id)
-        if user_filters:
-            filters_events = await db_crud.userFilter_crud.get_scrape_and_forward_filters(user_id)
-
-        triggered_events = []
-
-        for event in filters_events:
-            match_details = []
-            event_data = event.get_data()
-
-            if event_data['username'] and any(
-                    username == message["sender_username"] for username in event_data['username']):
-                match_details.append(f"username: {event_data['username']}")
-
-            if event_data['chat_title'] and any(
-                    chat_title == message["chat_title"] for chat_title in event_data['chat_title']):
-                match_details.append(f"chat title: {event_data['chat_title']}")
-
-            if event_data['content'] and any(content in message['text'] for content in event_data['content']):
-                match_details.append(f"content match: {event_data['content']} in message")
-
-            if event_data['startswith'] and any(
-                    message['text'].startswith(start) for start in event_data['startswith']):
-                match_details.append(f"message starts with: {event_data['startswith']}")
-
-            if match_details:
-                triggered_events.append((event, event_data['user_id'], match_details, message))
-
-        return triggered_events
+            if supervisor is not None:
+                supervisor.on_disconnected(str(e))
+        finally:
+            await pipeline.stop()
+            await forwarder.stop()
+            await tracker.stop()
+            if self.pipelines.get(session_name) is pipeline:
+                del self.pipelines[session_name]
+            if self.forwarders.get(session_name) is forwarder:
+                del self.forwarders[session_name]
+            if self.change_trackers.get(session_name) is tracker:
+                del self.change_trackers[session_name]
 
     @staticmethod
     async def fetch_and_save_chats(client, account_id):
+        chats = []
         async for dialog in client.iter_dialogs():
-            chat = dialog.entity
-            if isinstance(chat, User):
-                chat_id = chat.id
-                chat_name = chat.first_name
-                if hasattr(chat, 'usernames'):
-                    try:
-                        chat_username = chat.usernames[0].username if chat.usernames else chat.first_name
-                    except KeyError:
-                        chat_username = chat.first_name
-                else:
-                    chat_username = chat.username if hasattr(chat, 'username') else chat.first_name
-                chat_type = 'Private chat'
-            elif isinstance(chat, Chat):
-                chat_id = chat.id
-                chat_name = chat.title if hasattr(chat, 'title') else "Unknown"
-                if hasattr(chat, 'usernames'):
-                    try:
-                        chat_username = chat.usernames[0].username if chat.usernames else chat.title
-                    except KeyError:
-                        chat_username = chat.title
-                else:
-                    chat_username = chat.username if hasattr(chat, 'username') else chat.title
-                chat_type = 'Group'
-            elif isinstance(chat, Channel):
-                chat_id = chat.id
-                chat_name = chat.title if hasattr(chat, 'title') else "Unknown"
-                if hasattr(chat, 'usernames'):
-                    try:
-                        chat_username = chat.usernames[0].username if chat.usernames else chat.title
-                    except KeyError:
-                        chat_username = chat.title
-                else:
-                    chat_username = chat.username if hasattr(chat, 'username') else chat.title
-                chat_type = 'Group' if chat.megagroup else 'Channel'
-            else:
+            chat_info = describe_chat(dialog.entity)
+            if chat_info is None:
                 continue
-            chat_data = {
+            chat_id, chat_name, chat_username, chat_type = chat_info
+            chats.append({
                 "id": chat_id,
                 "chat_title": chat_name,
                 'chat_type': chat_type,
                 'chat_username': chat_username,
+            })
 
-            }
-            await db_crud.chat_crud.create(**chat_data)
-            await db_crud.chat_crud.add_account_to_chat(chat_id, account_id)
+        result = await db_crud.chat_crud.upsert_many(chats)
+        result["linked"] = await db_crud.chat_crud.add_account_to_chats([chat['id'] for chat in chats], account_id)
+        logger.info(f"Synced {len(chats)} dialogs for {account_id}: {result['inserted']} inserted, "
+                    f"{result['updated']} updated, {result['linked']} newly linked")
+        return result
 
     async def fetch_all_chats_to_json(self, session_name):
+        await self.hibernator.wake(session_name)
+        self.hibernator.touch(session_name)
         if session_name not in self.sessions:
             logger.error(f"Session {session_name} not found.")
             return None
@@ -471,7 +413,9 @@ class TelegramChatHistory:
         return json_data
 
     async def stop_monitoring(self):
-        for session_name, task in self.monitoring_tasks.items():
+        # Supervisors remove their own entry when they finish, so iterate over a copy.
+        for session_name in list(self.monitoring_tasks):
+            task = self.monitoring_tasks.pop(session_name)
             task.cancel()
             await db_crud.account_crud.set_active(session_name, False)
             try:
@@ -479,9 +423,72 @@ class TelegramChatHistory:
             except asyncio.CancelledError:
                 logger.info(f"Monitoring stopped for {session_name}")
 
-    def list_sessions(self):
+    async def invalidate_ingest_context(self, user_id: int = None, account_id: str = None,
+                                        rules_changed: bool = False):
+        if rules_changed:
+            self.rule_engine.invalidate()
+        if user_id is not None:
+            self.ingest_context.invalidate_user(user_id)
+        if account_id is not None:
+            self.ingest_context.invalidate_account(account_id)
+
+    async def list_sessions(self):
         return list(self.sessions.keys())
 
+    async def metrics(self):
+        return {
+            "message_sink": message_sink.stats(),
+            "ingest_context": self.ingest_context.stats(),
+            "rule_engine": self.rule_engine.stats(),
+            "notifications": self.notification_dispatcher.stats(),
+            "forwarders": {account_id: forwarder.stats() for account_id, forwarder in self.forwarders.items()},
+            "pipelines": {account_id: pipeline.stats() for account_id, pipeline in self.pipelines.items()},
+            "message_changes": {account_id: tracker.stats()
+                                for account_id, tracker in self.change_trackers.items()},
+            "sessions": {account_id: supervisor.stats() for account_id, supervisor in self.supervisors.items()},
+            "proxy_pool": self.proxy_pool.stats(),
+            "media": self.media_downloader.stats() if self.media_downloader is not None else None,
+            "hibernation": self.hibernator.stats(),
+            "scheduler": request_scheduler.stats(),
+        }
+
+    async def start_backfill(self, account_id: str, chat_ids: list, since: int = None,
+                             max_messages: int = None, apply_rules: bool = True) -> dict:
+        return await self.backfiller.start(account_id, chat_ids, since=since, max_messages=max_messages,
+                                           apply_rules=apply_rules)
+
+    async def backfill_status(self, account_id: str = None) -> dict:
+        return await self.backfiller.status(account_id)
+
+    async def stop_ingest(self):
+        # Tears monitoring down for process shutdown. Unlike stop_monitoring, this
+        # leaves accounts.active alone so the accounts are resumed on the next start.
+        tasks = list(self.monitoring_tasks.values())
+        self.monitoring_tasks.clear()
+        for task in tasks:
+            task.cancel()
+        # Each monitor_messages drains its pipeline and forwarder on the way out.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for pipeline in list(self.pipelines.values()):
+            await pipeline.stop()
+        for forwarder in list(self.forwarders.values()):
+            await forwarder.stop()
+
+    async def shutdown(self):
+        await self.hibernator.stop()
+        for phone in list(self.pending_sessions):
+            await self.drop_pending_login(phone)
+        # Producers first: whatever the pipelines still hold must reach the sink
+        # and the dispatcher before those are flushed and stopped.
+        await self.stop_ingest()
+        await self.backfiller.stop()
+        await self.proxy_pool.stop()
+        if self.media_downloader is not None:
+            await self.media_downloader.stop()
+        await self.notification_dispatcher.stop()
+        await message_sink.stop()
+        await flush_sessions()
+
     async def remove_session(self, session_name):
         try:
             del self.sessions[session_name]
@@ -494,10 +501,16 @@ class TelegramChatHistory:
 
         # Delete account from the database
 
+        account = await db_crud.account_crud.read(session_name)
+        if account is not None:
+            await self.proxy_pool.release(account.proxy_id)
         await db_crud.account_crud.delete_on_cascade(session_name)
+        self.ingest_context.invalidate_account(session_name)
+        self.supervisors.pop(session_name, None)
+        self.hibernator.forget(session_name)
         try:
 
-            os.remove(f'bot/sessions/{session_name}.session')
+            await delete_session(session_name)
         except Exception as e:
             logger.error(f'Session not found. {e}')
             return
@@ -505,6 +518,9 @@ class TelegramChatHistory:
         return True
 
     async def stop_monitoring_for_session(self, session_name):
+        if session_name in self.hibernator.hibernated:
+            self.hibernator.forget(session_name)
+            await db_crud.account_crud.set_active(session_name, False)
         if session_name in self.monitoring_tasks:
             task = self.monitoring_tasks.pop(session_name)
             task.cancel()
@@ -516,57 +532,13 @@ class TelegramChatHistory:
 
     async def check_deleted_in_chat(self, start_time: int, end_time: int,
                                     chats: list = None, account_id: str = None,
-                                    filters: dict = None) -> dict:
-        diff = {"deleted": {}, "modified": {}}
-
-        start_time_dt = datetime.fromtimestamp(start_time, tz=timezone.utc).replace(
-            hour=0, minute=0, second=0, microsecond=0)
-        for chat_id in chats:
-            saved_messages = await db_crud.message_crud.get_messages_by_chat_id_and_time(
-                chat_id=chat_id,
-                start_time=start_time,
-                end_time=end_time,
-                account_id=account_id
-            )
-            filtered_saved_messages = await self.apply_filters_to_messages(saved_messages, filters)
-            saved_message_dict = {message.message_id: message for message in filtered_saved_messages}
-
-            client = self.sessions.get(account_id, None)
-            if client is None:
-                client = await self.get_client_by_session_name(account_id)
-            current_messages_in_chat = []
-
-            async for message in client.iter_messages(entity=chat_id, offset_date=start_time_dt, reverse=True):
-                if message.date.tzinfo is None:
-                    message_date_aware = message.date.replace(tzinfo=timezone.utc)
-                else:
-                    message_date_aware = message.date.astimezone(timezone.utc)
-
-                if message_date_aware < start_time_dt:
-                    break
-                current_messages_in_chat.append(message)
-
-            filtered_current_messages = await self.apply_filters_to_messages(current_messages_in_chat, filters)
-            current_message_dict = {message.id: message for message in filtered_current_messages}
-
-            deleted_message_ids = set(saved_message_dict.keys()) - set(current_message_dict.keys())
-            deleted_messages = [saved_message_dict[message_id] for message_id in deleted_message_ids]
-
-            if deleted_messages:
-                deleted_message_ids = [message.id for message in deleted_messages]
-                updated_deleted_messages = await db_crud.message_crud.set_messages_deleted(ids=deleted_message_ids)
-                updated_deleted_messages = [msg.to_dict() for msg in updated_deleted_messages]
-                diff["deleted"][chat_id] = updated_deleted_messages
-
-            for message_id, current_message in current_message_dict.items():
-                saved_message = saved_message_dict.get(message_id)
-                if saved_message and saved_message.text != current_message.text:
-                    await db_crud.message_crud.update(saved_message.id, text=current_message.text,
-                                                      is_updated=True, before_update_text=saved_message.text)
-                    new_message = await db_crud.message_crud.read(saved_message.id)
-                    diff["modified"].setdefault(chat_id, []).append(new_message.to_dict())
-
-        return diff
+                                    filters: dict = None, incremental: bool = True,
+                                    strategy: str = RECONCILE_STRATEGY) -> dict:
+        client = self.sessions.get(account_id, None)
+        if client is None:
+            client = await self.get_client_by_session_name(account_id)
+        reconciler = Reconciler(client, account_id, self.apply_filters_to_messages, filters, strategy=strategy)
+        return await reconciler.run(chats, start_time, end_time, incremental=incremental)
 
     @staticmethod
     async def apply_filters_to_messages(messages, filters):
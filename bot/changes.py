@@ -0,0 +1,128 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from loguru import logger
+from telethon import utils
+
+from bot.entities import normalize_text
+from bot.sink import message_sink
+from db.facade import DB
+
+load_dotenv()
+db_crud = DB()
+
+CHANGE_BATCH_WINDOW = float(os.getenv("CHANGE_BATCH_WINDOW", 1.0))
+CHANGE_DRAIN_TIMEOUT = float(os.getenv("CHANGE_DRAIN_TIMEOUT", 5.0))
+
+
+class MessageChangeTracker:
+    # Collects MessageDeleted/MessageEdited updates for one account and applies
+    # them as a few set-based UPDATEs per batch window.
+    def __init__(self, account_id: str, pipeline=None, batch_window: float = CHANGE_BATCH_WINDOW,
+                 drain_timeout: float = CHANGE_DRAIN_TIMEOUT):
+        self.account_id = account_id
+        self.pipeline = pipeline
+        self.batch_window = batch_window
+        self.drain_timeout = drain_timeout
+        self.deleted = {}
+        self.edited = {}
+        self.flush_task = None
+
+        self.deleted_events = 0
+        self.edited_events = 0
+        self.deleted_rows = 0
+        self.edited_rows = 0
+        self.failed_flushes = 0
+        self.drain_timeouts = 0
+
+    @staticmethod
+    def _peer_id(chat_id):
+        if chat_id is None:
+            return None
+        return utils.resolve_id(chat_id)[0]
+
+    def _schedule(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush_later())
+
+    def on_deleted(self, event):
+        chat_id = self._peer_id(event.chat_id)
+        self.deleted.setdefault(chat_id, set()).update(event.deleted_ids)
+        self.deleted_events += 1
+        self._schedule()
+
+    def on_edited(self, event):
+        text = normalize_text(event.text)
+        if not text:
+            return
+        chat_id = self._peer_id(event.chat_id)
+        self.edited[(chat_id, event.message.id)] = text
+        self.edited_events += 1
+        self._schedule()
+
+    async def _flush_later(self):
+        # Keeps going while changes are pending: ones that arrived during a flush,
+        # or a batch that failed and was put back.
+        while True:
+            await asyncio.sleep(self.batch_window)
+            await self.flush()
+            if not self.deleted and not self.edited:
+                return
+
+    def _restore(self, deleted: dict, edited: dict):
+        for chat_id, message_ids in deleted.items():
+            self.deleted.setdefault(chat_id, set()).update(message_ids)
+        # Edits that arrived since the batch was taken are newer and win.
+        self.edited = {**edited, **self.edited}
+
+    async def flush(self):
+        deleted, self.deleted = self.deleted, {}
+        edited, self.edited = self.edited, {}
+        if not deleted and not edited:
+            return
+
+        # The message an update refers to may still be in the ingest pipeline or
+        # buffered in the write-behind sink; it has to reach the table first.
+        if self.pipeline is not None and not await self.pipeline.drain(self.drain_timeout):
+            self.drain_timeouts += 1
+            logger.warning(f"Ingest pipeline of {self.account_id} did not drain in {self.drain_timeout}s, "
+                           f"applying message changes anyway")
+        try:
+            await message_sink.flush_all()
+            for chat_id, message_ids in deleted.items():
+                self.deleted_rows += await db_crud.message_crud.mark_deleted(self.account_id, chat_id,
+                                                                             list(message_ids))
+            if edited:
+                edits = [{"chat_id": chat_id, "message_id": message_id, "text": text}
+                         for (chat_id, message_id), text in edited.items()]
+                self.edited_rows += await db_crud.message_crud.apply_edits(self.account_id, edits)
+        except Exception as e:
+            # Marking deletions and applying edits are idempotent, so the whole batch is retried.
+            self.failed_flushes += 1
+            self._restore(deleted, edited)
+            logger.error(f"Failed to apply message changes for {self.account_id}, will retry: {e}")
+
+    async def stop(self):
+        if self.flush_task is not None and not self.flush_task.done():
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        if self.deleted or self.edited:
+            logger.error(f"Message changes for {self.account_id} lost on stop: "
+                         f"{sum(len(ids) for ids in self.deleted.values())} deletions, {len(self.edited)} edits")
+
+    def stats(self) -> dict:
+        return {
+            "pending_deleted": sum(len(ids) for ids in self.deleted.values()),
+            "pending_edited": len(self.edited),
+            "deleted_events": self.deleted_events,
+            "edited_events": self.edited_events,
+            "deleted_rows": self.deleted_rows,
+            "edited_rows": self.edited_rows,
+            "failed_flushes": self.failed_flushes,
+            "drain_timeouts": self.drain_timeouts,
+        }
@@ -0,0 +1,65 @@
+from telethon.tl.types import Chat, Channel, User
+
+from db.models.chats import PRIVATE_CHAT, BASIC_GROUP, SUPERGROUP, CHANNEL
+
+
+def describe_chat(chat) -> tuple | None:
+    if isinstance(chat, User):
+        chat_id = chat.id
+        chat_name = chat.first_name
+        if hasattr(chat, 'usernames'):
+            try:
+                chat_username = chat.usernames[0].username if chat.usernames else chat.first_name
+            except KeyError:
+                chat_username = chat.first_name
+        else:
+            chat_username = chat.username if hasattr(chat, 'username') else chat.first_name
+        chat_type = PRIVATE_CHAT
+    elif isinstance(chat, Chat):
+        chat_id = chat.id
+        chat_name = chat.title if hasattr(chat, 'title') else "Unknown"
+        if hasattr(chat, 'usernames'):
+            try:
+                chat_username = chat.usernames[0].username if chat.usernames else chat.title
+            except KeyError:
+                chat_username = chat.title
+        else:
+            chat_username = chat.username if hasattr(chat, 'username') else chat.title
+        chat_type = BASIC_GROUP
+    elif isinstance(chat, Channel):
+        chat_id = chat.id
+        chat_name = chat.title if hasattr(chat, 'title') else "Unknown"
+        if hasattr(chat, 'usernames'):
+            try:
+                chat_username = chat.usernames[0].username if chat.usernames else chat.title
+            except KeyError:
+                chat_username = chat.title
+        else:
+            chat_username = chat.username if hasattr(chat, 'username') else chat.title
+        chat_type = SUPERGROUP if chat.megagroup else CHANNEL
+    else:
+        return None
+    return chat_id, chat_name, chat_username, chat_type
+
+
+def get_sender_username(sender, chat_username: str):
+    if isinstance(sender, User):
+        return sender.username if sender else sender.first_name
+    return chat_username
+
+
+def normalize_text(text) -> str:
+    return text.replace('\n', '') if text else ''
+
+
+def build_message_data(text: str, chat_info: tuple, account_id: str, sender, message_id: int) -> dict:
+    chat_id, chat_name, chat_username, _ = chat_info
+    return {
+        "text": text,
+        "chat_id": chat_id,
+        "chat_title": chat_name,
+        "account_id": account_id,
+        "sender_user_id": sender.id,
+        "sender_username": get_sender_username(sender, chat_username),
+        "message_id": message_id,
+    }
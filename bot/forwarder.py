@@ -0,0 +1,143 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+from telethon import errors
+
+from bot.scheduler import priority, FORWARD
+
+load_dotenv()
+
+FORWARD_CONCURRENCY = int(os.getenv("FORWARD_CONCURRENCY", 4))
+FORWARD_BATCH_WINDOW = float(os.getenv("FORWARD_BATCH_WINDOW", 0.5))
+FORWARD_MAX_BATCH = 100
+
+
+class TargetStats:
+    def __init__(self):
+        self.forwarded = 0
+        self.calls = 0
+        self.failed = 0
+        self.flood_waits = 0
+        self.total_latency = 0.0
+        self.first_forward_at = None
+
+    def to_dict(self) -> dict:
+        elapsed = time.monotonic() - self.first_forward_at if self.first_forward_at else 0
+        return {
+            "forwarded": self.forwarded,
+            "calls": self.calls,
+            "failed": self.failed,
+            "flood_waits": self.flood_waits,
+            "avg_latency_ms": round(self.total_latency / self.calls * 1000, 2) if self.calls else 0.0,
+            "messages_per_second": round(self.forwarded / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+class Forwarder:
+    def __init__(self, client, account_id: str, concurrency: int = FORWARD_CONCURRENCY,
+                 batch_window: float = FORWARD_BATCH_WINDOW):
+        self.client = client
+        self.account_id = account_id
+        self.batch_window = batch_window
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.entities = {}
+        self.pending = {}
+        self.tasks = set()
+        self.target_stats = {}
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def submit(self, source_chat_id: int, source_peer, message_id: int, target_chat_ids: list):
+        if not target_chat_ids:
+            return
+        key = (source_chat_id, tuple(target_chat_ids))
+        batch = self.pending.get(key)
+        if batch is None:
+            batch = self.pending[key] = {"peer": source_peer, "ids": []}
+            batch["timer"] = self._spawn(self._flush_later(key))
+        batch["ids"].append(message_id)
+
+    async def _flush_later(self, key):
+        await asyncio.sleep(self.batch_window)
+        await self._flush(key)
+
+    async def _flush(self, key):
+        # stop() may have flushed the batch already.
+        batch = self.pending.pop(key, None)
+        if batch is None:
+            return
+        _, target_chat_ids = key
+        ids = batch["ids"]
+        for start in range(0, len(ids), FORWARD_MAX_BATCH):
+            chunk = ids[start:start + FORWARD_MAX_BATCH]
+            await asyncio.gather(*(self._forward(target_chat_id, batch["peer"], chunk)
+                                   for target_chat_id in target_chat_ids))
+
+    async def _resolve(self, target_chat_id: int):
+        entity = self.entities.get(target_chat_id)
+        if entity is None:
+            entity = self.entities[target_chat_id] = asyncio.ensure_future(self.client.get_entity(target_chat_id))
+        try:
+            return await entity
+        except Exception:
+            self.entities.pop(target_chat_id, None)
+            raise
+
+    async def _forward(self, target_chat_id: int, source_peer, ids: list):
+        stats = self.target_stats.setdefault(target_chat_id, TargetStats())
+        try:
+            with priority(FORWARD):
+                target_chat = await self._resolve(target_chat_id)
+                async with self.semaphore:
+                    started = time.perf_counter()
+                    await self.client.forward_messages(target_chat, ids, from_peer=source_peer)
+        except errors.FloodWaitError as e:
+            stats.flood_waits += 1
+            logger.warning(f"Forward from {self.account_id} to {target_chat_id} hit FloodWait, "
+                           f"retrying in {e.seconds}s")
+            self._spawn(self._retry_later(e.seconds, target_chat_id, source_peer, ids))
+            return
+        except Exception as e:
+            stats.failed += len(ids)
+            logger.error(f"Failed to forward {len(ids)} messages from {self.account_id} to {target_chat_id}: {e}")
+            return
+
+        if stats.first_forward_at is None:
+            stats.first_forward_at = time.monotonic()
+        stats.calls += 1
+        stats.forwarded += len(ids)
+        stats.total_latency += time.perf_counter() - started
+
+    async def _retry_later(self, delay: float, target_chat_id: int, source_peer, ids: list):
+        await asyncio.sleep(delay)
+        await self._forward(target_chat_id, source_peer, ids)
+
+    async def stop(self, flush_timeout: float = 5.0):
+        # Pending batches go out now instead of after their window; whatever is
+        # still sending or waiting out a FloodWait gets flush_timeout to finish.
+        for key, batch in list(self.pending.items()):
+            batch["timer"].cancel()
+            self._spawn(self._flush(key))
+        deadline = time.monotonic() + flush_timeout
+        # A FloodWait during the flush spawns a retry, so wait until no task is left.
+        while self.tasks and time.monotonic() < deadline:
+            await asyncio.wait(set(self.tasks), timeout=deadline - time.monotonic())
+        if self.tasks:
+            logger.warning(f"Forwarder for {self.account_id} stopped with {len(self.tasks)} forwards unfinished")
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": sum(len(batch["ids"]) for batch in self.pending.values()),
+            "cached_entities": len(self.entities),
+            "targets": {target_chat_id: stats.to_dict() for target_chat_id, stats in self.target_stats.items()},
+        }
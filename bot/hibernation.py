@@ -0,0 +1,152 @@
+import asyncio
+import gc
+import os
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", 0))
+SESSION_IDLE_CHECK_INTERVAL = float(os.getenv("SESSION_IDLE_CHECK_INTERVAL", 60.0))
+SESSION_WAKE_INTERVAL = float(os.getenv("SESSION_WAKE_INTERVAL", 3600.0))
+
+HIBERNATED = "hibernated"
+
+
+def resident_memory() -> int | None:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class SessionHibernator:
+    # Disconnects monitored accounts that saw no activity for idle_timeout seconds
+    # and drops their clients. A hibernated account is woken again when an API call
+    # needs its client, and every wake_interval seconds so catch-up stays short.
+    def __init__(self, history, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 check_interval: float = SESSION_IDLE_CHECK_INTERVAL, wake_interval: float = SESSION_WAKE_INTERVAL):
+        self.history = history
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self.wake_interval = wake_interval
+        self.last_activity = {}
+        self.hibernated = {}
+        self.waking = {}
+        self.task = None
+
+        self.hibernations = 0
+        self.wakes = 0
+        self.rss_freed = 0
+        self.wake_latencies = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.idle_timeout > 0
+
+    def start(self):
+        if self.enabled and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self._run())
+
+    def touch(self, session_name: str):
+        self.last_activity[session_name] = time.monotonic()
+
+    def forget(self, session_name: str):
+        self.last_activity.pop(session_name, None)
+        self.hibernated.pop(session_name, None)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Idle session check failed: {e}")
+
+    async def check(self):
+        now = time.monotonic()
+        for session_name in list(self.history.monitoring_tasks):
+            last_activity = self.last_activity.setdefault(session_name, now)
+            if now - last_activity >= self.idle_timeout and not self.history.backfiller.is_running(session_name):
+                await self.hibernate(session_name)
+
+        if self.wake_interval > 0:
+            for session_name, hibernated_at in list(self.hibernated.items()):
+                if now - hibernated_at >= self.wake_interval:
+                    await self.wake(session_name)
+
+    async def hibernate(self, session_name: str):
+        task = self.history.monitoring_tasks.get(session_name)
+        if task is None or session_name in self.hibernated:
+            return
+        rss_before = resident_memory()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        client = self.history.sessions.pop(session_name, None)
+        if client is not None and client.is_connected():
+            await client.disconnect()
+        del client
+        supervisor = self.history.supervisors.get(session_name)
+        if supervisor is not None:
+            supervisor.status = HIBERNATED
+        self.hibernated[session_name] = time.monotonic()
+        self.hibernations += 1
+
+        gc.collect()
+        rss_after = resident_memory()
+        freed = rss_before - rss_after if rss_before is not None and rss_after is not None else 0
+        self.rss_freed += max(freed, 0)
+        logger.info(f"Session {session_name} hibernated after {self.idle_timeout:.0f}s idle, "
+                    f"RSS {freed / 1024 / 1024:+.1f} MiB freed")
+
+    async def wake(self, session_name: str) -> bool:
+        if session_name not in self.hibernated:
+            return False
+        # Concurrent callers for the same account wait on a single reconnect.
+        waking = self.waking.get(session_name)
+        if waking is None:
+            waking = self.waking[session_name] = asyncio.ensure_future(self._wake(session_name))
+            waking.add_done_callback(lambda _: self.waking.pop(session_name, None))
+        return await asyncio.shield(waking)
+
+    async def _wake(self, session_name: str) -> bool:
+        started = time.monotonic()
+        self.hibernated.pop(session_name, None)
+        self.touch(session_name)
+        if not await self.history.start_monitoring_for_session(session_name):
+            logger.error(f"Failed to wake session {session_name}")
+            self.hibernated[session_name] = time.monotonic()
+            return False
+        latency = time.monotonic() - started
+        self.wakes += 1
+        self.wake_latencies = (self.wake_latencies + [latency])[-100:]
+        logger.info(f"Session {session_name} woken in {latency:.2f}s")
+        return True
+
+    async def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        latencies = sorted(self.wake_latencies)
+        return {
+            "enabled": self.enabled,
+            "hibernated": len(self.hibernated),
+            "hibernations": self.hibernations,
+            "wakes": self.wakes,
+            "rss_bytes": resident_memory(),
+            "rss_freed_bytes": self.rss_freed,
+            "wake_latency_avg_s": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "wake_latency_max_s": round(latencies[-1], 3) if latencies else None,
+        }
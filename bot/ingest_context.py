@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+
+from db.facade import DB
+
+load_dotenv()
+db_crud = DB()
+
+INGEST_CONTEXT_TTL = float(os.getenv("INGEST_CONTEXT_TTL", 300))
+
+
+class AccountContext:
+    def __init__(self, account, user):
+        self.account_id = account.id
+        self.user_id = account.created_by
+        self.user = user
+        self.tg_id = user.tg_id if user else None
+        self.scrape_forward_mode = bool(user.scrape_forward_mode) if user else False
+        self.target_chats = [int(chat_id) for chat_id in user.target_chats.split(",") if chat_id] \
+            if user and user.target_chats else []
+        self.loaded_at = time.monotonic()
+
+
+class IngestContextCache:
+    def __init__(self, ttl: float = INGEST_CONTEXT_TTL):
+        self.ttl = ttl
+        self.contexts = {}
+        self.locks = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, account_id: str) -> AccountContext | None:
+        context = self.contexts.get(account_id)
+        if context and time.monotonic() - context.loaded_at < self.ttl:
+            self.hits += 1
+            return context
+
+        lock = self.locks.setdefault(account_id, asyncio.Lock())
+        async with lock:
+            context = self.contexts.get(account_id)
+            if context and time.monotonic() - context.loaded_at < self.ttl:
+                self.hits += 1
+                return context
+
+            self.misses += 1
+            generation = self.generation
+            context = await self.load(account_id)
+            # Rows may have changed while loading; only cache a context that no invalidation raced with.
+            if context and generation == self.generation:
+                self.contexts[account_id] = context
+            return context
+
+    @staticmethod
+    async def load(account_id: str) -> AccountContext | None:
+        account = await db_crud.account_crud.read(account_id)
+        if account is None:
+            return None
+        user = await db_crud.user_crud.read(account.created_by)
+        return AccountContext(account, user)
+
+    def invalidate_user(self, user_id: int):
+        self.generation += 1
+        for account_id, context in list(self.contexts.items()):
+            if context.user_id == user_id:
+                del self.contexts[account_id]
+
+    def invalidate_account(self, account_id: str):
+        self.generation += 1
+        self.contexts.pop(account_id, None)
+
+    def invalidate_all(self):
+        self.generation += 1
+        self.contexts.clear()
+
+    def stats(self) -> dict:
+        return {
+            "cached_accounts": len(self.contexts),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,4 +1,13 @@
+import os
+
+from dotenv import load_dotenv
+
 from bot.bot import TelegramChatHistory
+from bot.sharding import ShardSupervisor
+from bot.startup import StartupCoordinator
 
+load_dotenv()
+BOT_SHARDS = int(os.getenv("BOT_SHARDS", 1))
 
-bot = TelegramChatHistory()
+bot = ShardSupervisor(BOT_SHARDS) if BOT_SHARDS > 1 else TelegramChatHistory()
+startup = StartupCoordinator(bot)
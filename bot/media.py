@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import os
+import pathlib
+import time
+import uuid
+
+from dotenv import load_dotenv
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
+
+from bot.scheduler import request_priority, BACKFILL
+from bot.sink import message_sink
+from db.facade import DB
+
+load_dotenv()
+db_crud = DB()
+
+MEDIA_ENABLED = os.getenv("MEDIA_ENABLED", "false").lower() in ("1", "true", "yes")
+MEDIA_DIR = os.getenv("MEDIA_DIR", "media")
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", 4))
+MEDIA_QUEUE_SIZE = int(os.getenv("MEDIA_QUEUE_SIZE", 1000))
+MEDIA_ACCOUNT_CONCURRENCY = int(os.getenv("MEDIA_ACCOUNT_CONCURRENCY", 2))
+MEDIA_DC_CONCURRENCY = int(os.getenv("MEDIA_DC_CONCURRENCY", 4))
+MEDIA_MAX_FILE_SIZE = int(os.getenv("MEDIA_MAX_FILE_SIZE_MB", 20)) * 1024 * 1024
+MEDIA_QUOTA = int(os.getenv("MEDIA_QUOTA_MB", 10240)) * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+EVICTION_BATCH = 100
+
+
+def get_downloadable_media(message):
+    if message.photo is not None:
+        return message.photo, message.photo.dc_id, None, "image/jpeg"
+    if message.document is not None:
+        return message.document, message.document.dc_id, message.document.size, message.document.mime_type
+    return None
+
+
+def hash_file(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class MediaDownloader:
+    # Downloads photos and documents into a content-addressed store: a file is
+    # kept once under its sha256, however many messages or chats it appears in.
+    def __init__(self, base_dir: str = MEDIA_DIR, workers: int = MEDIA_WORKERS, queue_size: int = MEDIA_QUEUE_SIZE,
+                 account_concurrency: int = MEDIA_ACCOUNT_CONCURRENCY, dc_concurrency: int = MEDIA_DC_CONCURRENCY,
+                 max_file_size: int = MEDIA_MAX_FILE_SIZE, quota: int = MEDIA_QUOTA):
+        self.base_dir = pathlib.Path(base_dir).resolve()
+        self.workers_count = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.account_concurrency = account_concurrency
+        self.dc_concurrency = dc_concurrency
+        self.max_file_size = max_file_size
+        self.quota = quota
+        self.account_semaphores = {}
+        self.dc_semaphores = {}
+        self.hash_locks = {}
+        self.eviction_lock = asyncio.Lock()
+        self.workers = []
+        self.used_bytes = None
+
+        self.queued = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.evicted = 0
+        self.bytes_downloaded = 0
+        self.bytes_written = 0
+        self.total_download_time = 0.0
+
+    def start(self):
+        if self.workers:
+            return
+        (self.base_dir / "tmp").mkdir(parents=True, exist_ok=True)
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+
+    def submit(self, client, account_id: str, chat_id: int, message) -> bool:
+        media = get_downloadable_media(message)
+        if media is None:
+            return False
+        if media[2] is not None and media[2] > self.max_file_size:
+            self.skipped += 1
+            return False
+        try:
+            self.queue.put_nowait((client, account_id, chat_id, message, media))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.queued += 1
+        return True
+
+    async def _worker(self):
+        # Media is fetched in the background and yields to live traffic like backfill does.
+        request_priority.set(BACKFILL)
+        while True:
+            client, account_id, chat_id, message, media = await self.queue.get()
+            try:
+                await self.download(client, account_id, chat_id, message, media)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Media download of message {message.id} in {chat_id} for {account_id} failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def download(self, client, account_id: str, chat_id: int, message, media):
+        file, dc_id, _, mime_type = media
+        tmp_path = self.base_dir / "tmp" / uuid.uuid4().hex
+        account_semaphore = self.account_semaphores.setdefault(account_id,
+                                                               asyncio.Semaphore(self.account_concurrency))
+        dc_semaphore = self.dc_semaphores.setdefault(dc_id, asyncio.Semaphore(self.dc_concurrency))
+        try:
+            async with account_semaphore, dc_semaphore:
+                started = time.perf_counter()
+                await client.download_media(message, file=str(tmp_path))
+                self.total_download_time += time.perf_counter() - started
+            size = tmp_path.stat().st_size
+            self.downloaded += 1
+            self.bytes_downloaded += size
+
+            sha256 = await asyncio.to_thread(hash_file, tmp_path)
+            media_id = await self.store(tmp_path, sha256, size, mime_type)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        # The message row may still be buffered in the write-behind sink.
+        await message_sink.flush_all()
+        await db_crud.media_crud.link_message(media_id, account_id, chat_id, message.id)
+        await self.enforce_quota(media_id)
+
+    async def store(self, tmp_path: pathlib.Path, sha256: str, size: int, mime_type: str | None) -> int:
+        async with self.hash_locks.setdefault(sha256, asyncio.Lock()):
+            try:
+                existing = await db_crud.media_crud.get_by_hash(sha256)
+                if existing is not None:
+                    self.deduplicated += 1
+                    await db_crud.media_crud.touch(existing.id)
+                    return existing.id
+
+                path = self.base_dir / sha256[:2] / sha256[2:4] / sha256
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+                try:
+                    media_file = await db_crud.media_crud.create(sha256=sha256, path=str(path.relative_to(self.base_dir)),
+                                                                 size=size, mime_type=mime_type)
+                except IntegrityError:
+                    # Another shard stored the same content first.
+                    self.deduplicated += 1
+                    return (await db_crud.media_crud.get_by_hash(sha256)).id
+                self.bytes_written += size
+                if self.used_bytes is not None:
+                    self.used_bytes += size
+                return media_file.id
+            finally:
+                self.hash_locks.pop(sha256, None)
+
+    async def enforce_quota(self, keep_id: int):
+        async with self.eviction_lock:
+            if self.used_bytes is None:
+                self.used_bytes = await db_crud.media_crud.total_size()
+            while self.used_bytes > self.quota:
+                victims = await db_crud.media_crud.get_least_recently_used(EVICTION_BATCH, exclude_id=keep_id)
+                if not victims:
+                    break
+                freed = 0
+                evicted_ids = []
+                for victim in victims:
+                    (self.base_dir / victim.path).unlink(missing_ok=True)
+                    evicted_ids.append(victim.id)
+                    freed += victim.size
+                    if self.used_bytes - freed <= self.quota:
+                        break
+                await db_crud.media_crud.delete_many(evicted_ids)
+                self.used_bytes -= freed
+                self.evicted += len(evicted_ids)
+                logger.info(f"Evicted {len(evicted_ids)} media files ({freed} bytes) to stay under quota")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "skipped_too_large": self.skipped,
+            "downloaded": self.downloaded,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "evicted": self.evicted,
+            "bytes_downloaded": self.bytes_downloaded,
+            "bytes_written": self.bytes_written,
+            "used_bytes": self.used_bytes,
+            "quota_bytes": self.quota,
+            "download_bytes_per_second": round(self.bytes_downloaded / self.total_download_time)
+            if self.total_download_time else 0,
+        }
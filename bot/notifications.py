@@ -0,0 +1,155 @@
+import asyncio
+import os
+import random
+import time
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter, TelegramNetworkError, \
+    TelegramServerError, TelegramAPIError
+from dotenv import load_dotenv
+from loguru import logger
+
+from bot.sink import WriteBehindSink
+from db.facade import DB
+from utils.rate_limit import TokenBucket
+
+load_dotenv()
+db_crud = DB()
+
+NOTIFICATION_QUEUE_SIZE = int(os.getenv("NOTIFICATION_QUEUE_SIZE", 10000))
+NOTIFICATION_WORKERS = int(os.getenv("NOTIFICATION_WORKERS", 4))
+NOTIFICATION_MAX_RETRIES = int(os.getenv("NOTIFICATION_MAX_RETRIES", 5))
+BOT_GLOBAL_RATE = float(os.getenv("BOT_GLOBAL_RATE", 30))
+BOT_CHAT_RATE = float(os.getenv("BOT_CHAT_RATE", 1))
+
+BLOCKED_BOT_TEXT = 'You have blocked bot for notifications.'
+
+
+def build_notification_text(match_details: list, message: dict) -> str:
+    detail_message = " | ".join(match_details)
+    return (f"<b>Event Triggered:</b> {detail_message}\n"
+            f"\n<b>Message:</b>\n"
+            f"[{message['sender_username']}]: {message['text']}")
+
+
+class NotificationDispatcher:
+    def __init__(self, bot, workers: int = NOTIFICATION_WORKERS, queue_size: int = NOTIFICATION_QUEUE_SIZE,
+                 max_retries: int = NOTIFICATION_MAX_RETRIES, global_rate: float = BOT_GLOBAL_RATE,
+                 chat_rate: float = BOT_CHAT_RATE):
+        self.bot = bot
+        self.workers_count = workers
+        self.max_retries = max_retries
+        self.chat_rate = chat_rate
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.global_limiter = TokenBucket(global_rate)
+        self.chat_limiters = {}
+        self.workers = []
+        self.notification_sink = WriteBehindSink("notifications", db_crud.notification_crud.create_many)
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+        self.forbidden = 0
+        self.total_send_latency = 0.0
+
+    def _ensure_running(self):
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        while len(self.workers) < self.workers_count:
+            self.workers.append(asyncio.create_task(self._worker()))
+
+    async def submit(self, triggered_events: list, tg_id: int | None):
+        self._ensure_running()
+        for event, user_id, match_details, message in triggered_events:
+            text = build_notification_text(match_details, message)
+            await self.notification_sink.put({"user_id": user_id, "event_id": event.id, "text": text})
+            if not tg_id:
+                continue
+            try:
+                self.queue.put_nowait((user_id, event.id, tg_id, text))
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.warning(f"Notification queue is full, Telegram delivery to {tg_id} dropped")
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._deliver(*job)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Notification delivery failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, user_id: int, event_id: int, tg_id: int, text: str):
+        chat_limiter = self.chat_limiters.get(tg_id)
+        if chat_limiter is None:
+            chat_limiter = self.chat_limiters[tg_id] = TokenBucket(self.chat_rate, 1)
+
+        for attempt in range(self.max_retries + 1):
+            await chat_limiter.acquire()
+            await self.global_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                await self.bot.send_message(chat_id=tg_id, text=text, parse_mode="HTML")
+                self.sent += 1
+                self.total_send_latency += time.perf_counter() - started
+                return
+            except TelegramForbiddenError:
+                self.forbidden += 1
+                await db_crud.user_crud.set_notification_status(user_id, False)
+                await self.notification_sink.put({"user_id": user_id, "event_id": event_id,
+                                                  "text": BLOCKED_BOT_TEXT})
+                return
+            except TelegramRetryAfter as e:
+                self.retries += 1
+                self.global_limiter.block(e.retry_after)
+                logger.warning(f"Bot API flood limit, retrying in {e.retry_after}s")
+            except (TelegramNetworkError, TelegramServerError) as e:
+                self.retries += 1
+                backoff = min(2 ** attempt, 60) + random.uniform(0, 1)
+                logger.warning(f"Bot API error for {tg_id}: {e}, retrying in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+            except TelegramAPIError as e:
+                self.failed += 1
+                logger.error(f"Bot API rejected notification for {tg_id}: {e}")
+                return
+
+        self.failed += 1
+        logger.error(f"Notification for {tg_id} not delivered after {self.max_retries} retries")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        if self.workers:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                pending = 0
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    pending += 1
+                if pending:
+                    self.dropped += pending
+                    logger.warning(f"Notification dispatcher stopped, {pending} pending Telegram deliveries dropped")
+        for worker in self.workers:
+            worker.cancel()
+        for worker in self.workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self.workers = []
+        await self.notification_sink.stop()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "workers": len(self.workers),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "forbidden": self.forbidden,
+            "avg_send_latency_ms": round(self.total_send_latency / self.sent * 1000, 2) if self.sent else 0.0,
+            "notification_sink": self.notification_sink.stats(),
+        }
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+from telethon import errors
+
+from bot.entities import describe_chat, normalize_text, build_message_data
+from bot.sink import message_sink
+from db.facade import DB
+from db.models.chats import ChatModel
+from decorators.db_session import unit_of_work
+
+load_dotenv()
+db_crud = DB()
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 1000))
+PIPELINE_OVERFLOW_POLICY = os.getenv("PIPELINE_OVERFLOW_POLICY", "block")
+PIPELINE_RESOLVE_WORKERS = int(os.getenv("PIPELINE_RESOLVE_WORKERS", 4))
+PIPELINE_EVALUATE_WORKERS = int(os.getenv("PIPELINE_EVALUATE_WORKERS", 2))
+PIPELINE_PERSIST_WORKERS = int(os.getenv("PIPELINE_PERSIST_WORKERS", 1))
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+
+class Stage:
+    def __init__(self, name: str, handler, workers: int, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 overflow_policy: str = PIPELINE_OVERFLOW_POLICY):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow_policy}, expected one of {OVERFLOW_POLICIES}")
+        self.name = name
+        self.handler = handler
+        self.workers_count = workers
+        self.overflow_policy = overflow_policy
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.next_stage = None
+        self.workers = []
+
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_wait = 0.0
+
+    def start(self):
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+
+    async def put(self, record: dict):
+        record["enqueued_at"] = time.monotonic()
+        if self.overflow_policy == "block":
+            await self.queue.put(record)
+            return
+        if self.queue.full():
+            self.dropped += 1
+            if self.overflow_policy == "drop_newest":
+                return
+            self.queue.get_nowait()
+            self.queue.task_done()
+        self.queue.put_nowait(record)
+
+    async def _worker(self):
+        while True:
+            record = await self.queue.get()
+            started = time.monotonic()
+            self.total_wait += started - record["enqueued_at"]
+            try:
+                result = await self.handler(record)
+                if result is not None and self.next_stage is not None:
+                    await self.next_stage.put(result)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Pipeline stage {self.name} failed: {e}")
+            finally:
+                latency = time.monotonic() - started
+                self.processed += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                self.queue.task_done()
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "workers": len(self.workers),
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "avg_latency_ms": round(self.total_latency / self.processed * 1000, 2) if self.processed else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+            "avg_wait_ms": round(self.total_wait / self.processed * 1000, 2) if self.processed else 0.0,
+        }
+
+
+class IngestPipeline:
+    def __init__(self, history, session_name: str, forwarder):
+        self.history = history
+        self.session_name = session_name
+        self.forwarder = forwarder
+        self.known_chats = set()
+        self.chat_locks = {}
+        self.total_lag = 0.0
+        self.persisted = 0
+
+        self.resolve_stage = Stage("resolve", self.resolve, PIPELINE_RESOLVE_WORKERS)
+        self.evaluate_stage = Stage("evaluate", self.evaluate, PIPELINE_EVALUATE_WORKERS)
+        self.persist_stage = Stage("persist", self.persist, PIPELINE_PERSIST_WORKERS)
+        self.resolve_stage.next_stage = self.evaluate_stage
+        self.evaluate_stage.next_stage = self.persist_stage
+        self.stages = (self.resolve_stage, self.evaluate_stage, self.persist_stage)
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    async def submit(self, event):
+        await self.resolve_stage.put({"event": event, "received_at": time.monotonic()})
+
+    async def resolve(self, record: dict) -> dict | None:
+        event = record["event"]
+        try:
+            chat = await event.get_chat()
+        except errors.rpcerrorlist.ChannelPrivateError:
+            return None
+        chat_info = describe_chat(chat) or (0, 'Unknown', 'Unknown', 'Unknown')
+        chat_id, chat_name, chat_username, chat_type = chat_info
+
+        if chat_id not in self.known_chats:
+            async with self.chat_locks.setdefault(chat_id, asyncio.Lock()):
+                if chat_id not in self.known_chats:
+                    async with unit_of_work():
+                        existing_chat = await db_crud.chat_crud.read(chat_id)
+                        if not existing_chat:
+                            chat_model = ChatModel(id=chat_id,
+                                                   chat_title=chat_name,
+                                                   chat_username=chat_username,
+                                                   chat_type=chat_type)
+                            await db_crud.chat_crud.create(**chat_model.model_dump())
+                            await db_crud.chat_crud.add_account_to_chat(chat_id, self.session_name)
+                        elif existing_chat.chat_type != chat_type:
+                            # Supergroups used to be stored as basic groups.
+                            await db_crud.chat_crud.update(chat_id, chat_type=chat_type)
+                    self.known_chats.add(chat_id)
+            self.chat_locks.pop(chat_id, None)
+
+        sender = await event.get_sender()
+        if sender is None:
+            return None
+        message_text = normalize_text(event.text)
+        has_media = self.history.media_downloader is not None and event.message.media is not None
+        if not message_text and not has_media:
+            return None
+
+        record["message_data"] = build_message_data(message_text, chat_info, self.session_name, sender,
+                                                    event.message.id)
+        return record
+
+    async def evaluate(self, record: dict) -> dict | None:
+        message_data = record["message_data"]
+        context = await self.history.ingest_context.get(self.session_name)
+        if context is None:
+            logger.warning(f"Account {self.session_name} not found, message skipped.")
+            return None
+
+        if context.scrape_forward_mode:
+            need_to_forward = await self.history.rule_engine.match_forward_filters(message_data, context.user_id)
+            if need_to_forward:
+                event = record["event"]
+                self.forwarder.submit(message_data["chat_id"], event.input_chat, event.message.id,
+                                      context.target_chats)
+
+        triggered_events = await self.history.rule_engine.match_events(message_data, context.user_id)
+        if triggered_events:
+            await self.history.notification_dispatcher.submit(triggered_events, context.tg_id)
+        return record
+
+    async def persist(self, record: dict) -> None:
+        await message_sink.put(record["message_data"])
+        if self.history.media_downloader is not None:
+            event = record["event"]
+            self.history.media_downloader.submit(event.client, self.session_name,
+                                                 record["message_data"]["chat_id"], event.message)
+        self.persisted += 1
+        self.total_lag += time.monotonic() - record["received_at"]
+
+    async def drain(self, timeout: float) -> bool:
+        # Waits until every record submitted so far has left the last stage.
+        try:
+            for stage in self.stages:
+                await asyncio.wait_for(stage.queue.join(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, drain_timeout: float = 5.0):
+        for stage in self.stages:
+            try:
+                await asyncio.wait_for(stage.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Pipeline for {self.session_name}: stage {stage.name} stopped with "
+                               f"{stage.queue.qsize()} records pending")
+            await stage.stop()
+
+    def stats(self) -> dict:
+        return {
+            "persisted": self.persisted,
+            "avg_end_to_end_ms": round(self.total_lag / self.persisted * 1000, 2) if self.persisted else 0.0,
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+        }
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from db.facade import DB
+
+load_dotenv()
+db_crud = DB()
+
+PROXY_CHECK_INTERVAL = float(os.getenv("PROXY_CHECK_INTERVAL", 300))
+PROXY_CHECK_CONCURRENCY = int(os.getenv("PROXY_CHECK_CONCURRENCY", 50))
+PROXY_CHECK_TIMEOUT = float(os.getenv("PROXY_CHECK_TIMEOUT", 5.0))
+PROXY_MAX_LATENCY_MS = int(os.getenv("PROXY_MAX_LATENCY_MS", 3000))
+PROXY_MAX_ERROR_RATE = float(os.getenv("PROXY_MAX_ERROR_RATE", 0.5))
+PROXY_ERROR_DECAY = 0.8
+
+
+def proxy_tuple(proxy) -> tuple:
+    return proxy.type, proxy.ip, proxy.port, True, proxy.login, proxy.password
+
+
+async def probe_proxy(proxy, timeout: float = PROXY_CHECK_TIMEOUT) -> float:
+    # Opens a connection to the proxy and, for SOCKS5, completes the greeting and
+    # authentication. Returns the round trip in milliseconds or raises.
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(proxy.ip, proxy.port), timeout)
+    try:
+        if (proxy.type or "").lower().startswith("socks5"):
+            methods = b"\x00\x02" if proxy.login else b"\x00"
+            writer.write(bytes([5, len(methods)]) + methods)
+            await writer.drain()
+            version, method = await asyncio.wait_for(reader.readexactly(2), timeout)
+            if version != 5 or method == 0xFF:
+                raise ConnectionError("SOCKS5 greeting rejected")
+            if method == 2:
+                login, password = proxy.login.encode(), (proxy.password or "").encode()
+                writer.write(bytes([1, len(login)]) + login + bytes([len(password)]) + password)
+                await writer.drain()
+                _, status = await asyncio.wait_for(reader.readexactly(2), timeout)
+                if status != 0:
+                    raise ConnectionError("SOCKS5 authentication failed")
+        return (time.perf_counter() - started) * 1000
+    finally:
+        writer.close()
+
+
+class ProxyPool:
+    # Periodically probes every proxy, scores it by latency and a decaying error
+    # rate, and moves monitored accounts off proxies that become unhealthy. With
+    # check_health off it only reacts to the health other processes record.
+    def __init__(self, history, interval: float = PROXY_CHECK_INTERVAL,
+                 concurrency: int = PROXY_CHECK_CONCURRENCY, timeout: float = PROXY_CHECK_TIMEOUT,
+                 check_health: bool = True):
+        self.history = history
+        self.check_health = check_health
+        self.assigned_reserved = False
+        self.interval = interval
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.task = None
+
+        self.checks = 0
+        self.last_check_duration = 0.0
+        self.healthy = 0
+        self.unhealthy = 0
+        self.migrations = 0
+
+    def start(self):
+        if self.interval > 0 and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                if self.check_health:
+                    await self.check_all()
+                await self.migrate_degraded()
+            except Exception as e:
+                logger.error(f"Proxy health check failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def check_all(self) -> list:
+        started = time.monotonic()
+        proxies = await db_crud.proxy_crud.get_all()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(proxy):
+            async with semaphore:
+                try:
+                    latency_ms = await probe_proxy(proxy, self.timeout)
+                    failed = False
+                except Exception:
+                    latency_ms = None
+                    failed = True
+            error_rate = (proxy.error_rate or 0.0) * PROXY_ERROR_DECAY + (1 - PROXY_ERROR_DECAY) * failed
+            return {
+                "id": proxy.id,
+                "latency_ms": round(latency_ms) if latency_ms is not None else None,
+                "error_rate": round(error_rate, 4),
+                "is_healthy": not failed and latency_ms <= PROXY_MAX_LATENCY_MS and error_rate < PROXY_MAX_ERROR_RATE,
+                "checked_at": int(time.time()),
+            }
+
+        results = await asyncio.gather(*(check(proxy) for proxy in proxies))
+        await db_crud.proxy_crud.record_health(results)
+
+        self.checks += 1
+        self.last_check_duration = time.monotonic() - started
+        self.healthy = sum(result["is_healthy"] for result in results)
+        self.unhealthy = len(results) - self.healthy
+        logger.info(f"Checked {len(results)} proxies in {self.last_check_duration:.1f}s: "
+                    f"{self.healthy} healthy, {self.unhealthy} unhealthy")
+        return results
+
+    async def lease(self, location: str, exclude_ids: list = None):
+        if not self.assigned_reserved:
+            # in_use is only set by lease_best, so proxies of accounts created before
+            # leasing existed, or left unmarked by a crash, look free until claimed here.
+            reserved = await db_crud.proxy_crud.reserve_assigned()
+            self.assigned_reserved = True
+            if reserved:
+                logger.info(f"Marked {reserved} proxies of existing accounts as in use")
+        return await db_crud.proxy_crud.lease_best(location, exclude_ids)
+
+    async def release(self, proxy_id: int | None):
+        if proxy_id is not None:
+            await db_crud.proxy_crud.release(proxy_id)
+
+    async def migrate_degraded(self):
+        for session_name in list(self.history.sessions):
+            account = await db_crud.account_crud.read(session_name)
+            if account is None or account.proxy_id is None:
+                continue
+            proxy = await db_crud.proxy_crud.read(account.proxy_id)
+            if proxy is None or proxy.is_healthy:
+                continue
+            await self.migrate(session_name, proxy)
+
+    async def migrate(self, session_name: str, old_proxy):
+        new_proxy = await self.lease(old_proxy.location, exclude_ids=[old_proxy.id])
+        if new_proxy is None:
+            logger.warning(f"Proxy {old_proxy.id} of {session_name} is unhealthy but no replacement "
+                           f"is available in {old_proxy.location}")
+            return
+        await db_crud.account_crud.update(session_name, proxy_id=new_proxy.id)
+        await self.release(old_proxy.id)
+        self.migrations += 1
+        logger.info(f"Moving {session_name} from proxy {old_proxy.id} to {new_proxy.id}")
+
+        client = self.history.sessions.get(session_name)
+        if client is not None:
+            # The session supervisor reconnects through get_client_by_session_name,
+            # which picks up the new proxy from the account row.
+            client.set_proxy(proxy_tuple(new_proxy))
+            await client.disconnect()
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "checks": self.checks,
+            "last_check_duration_s": round(self.last_check_duration, 2),
+            "healthy": self.healthy,
+            "unhealthy": self.unhealthy,
+            "migrations": self.migrations,
+        }
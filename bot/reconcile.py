@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from bot.entities import normalize_text
+from bot.scheduler import priority, RECONCILE
+from bot.sink import message_sink
+from db.facade import DB
+
+load_dotenv()
+db_crud = DB()
+
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", 4))
+RECONCILE_PAGE_SIZE = int(os.getenv("RECONCILE_PAGE_SIZE", 500))
+RECONCILE_STRATEGY = os.getenv("RECONCILE_STRATEGY", "probe")
+PROBE_BATCH_SIZE = 100
+
+STRATEGIES = ("scan", "probe")
+
+
+class Reconciler:
+    # "scan" streams stored messages and chat history side by side in message_id
+    # order and diffs them like a merge join. "probe" asks Telegram only for the
+    # stored ids, 100 per request, and treats ids that come back empty as deleted.
+    def __init__(self, client, account_id: str, apply_filters, filters: dict = None,
+                 strategy: str = RECONCILE_STRATEGY, concurrency: int = RECONCILE_CONCURRENCY,
+                 page_size: int = RECONCILE_PAGE_SIZE):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown reconcile strategy {strategy}, expected one of {STRATEGIES}")
+        self.client = client
+        self.account_id = account_id
+        self.apply_filters = apply_filters
+        self.filters = filters
+        self.strategy = strategy
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.counters = {"chats": 0, "checked": 0, "deleted": 0, "modified": 0, "skipped_chats": 0,
+                         "fetched": 0}
+
+    async def run(self, chats: list, start_time: int, end_time: int, incremental: bool = True) -> dict:
+        diff = {"deleted": {}, "modified": {}}
+        started = time.monotonic()
+
+        await message_sink.flush_all()
+        marks = await db_crud.reconcile_state_crud.get_marks(self.account_id, chats) if incremental else {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def reconcile(chat_id):
+            async with semaphore:
+                try:
+                    deleted, modified = await self.reconcile_chat(chat_id, start_time, end_time,
+                                                                  marks.get(chat_id, 0))
+                except Exception as e:
+                    logger.error(f"Reconciliation of chat {chat_id} for {self.account_id} failed: {e}")
+                    return
+                if deleted:
+                    diff["deleted"][chat_id] = deleted
+                if modified:
+                    diff["modified"][chat_id] = modified
+
+        with priority(RECONCILE):
+            await asyncio.gather(*(reconcile(chat_id) for chat_id in chats))
+        logger.info(f"Reconciled {self.counters['chats']} chats for {self.account_id} in "
+                    f"{time.monotonic() - started:.2f}s ({self.strategy}, {self.counters['fetched']} fetched): "
+                    f"{self.counters['checked']} checked, "
+                    f"{self.counters['deleted']} deleted, {self.counters['modified']} modified")
+        return diff
+
+    async def iter_saved(self, chat_id: int, start_time: int, end_time: int, after_message_id: int):
+        while True:
+            page = await db_crud.message_crud.get_messages_page(self.account_id, chat_id, start_time, end_time,
+                                                                after_message_id, self.page_size)
+            if not page:
+                return
+            after_message_id = page[-1].message_id
+            for message in await self.apply_filters(page, self.filters):
+                yield message
+
+    @staticmethod
+    def compare(saved_message, current_message, chat_id: int, modified: list, edits: list):
+        current_text = normalize_text(current_message.text)
+        if current_text and current_text != saved_message.text:
+            edits.append({"chat_id": chat_id, "message_id": saved_message.message_id, "text": current_text})
+            message_dict = saved_message.to_dict()
+            message_dict.update(before_update_text=saved_message.text, text=current_text, is_updated=True)
+            modified.append(message_dict)
+
+    async def scan(self, chat_id: int, start_time: int, end_time: int, mark: int, first_id: int) -> tuple:
+        # The Telegram side is bounded by the stored ids rather than by date, so
+        # clock skew between message dates and created_at cannot cause false deletions.
+        current = self.client.iter_messages(entity=chat_id, min_id=first_id - 1, reverse=True)
+        current_message = await anext(current, None)
+        self.counters["fetched"] += current_message is not None
+
+        deleted, modified, edits = [], [], []
+        async for saved_message in self.iter_saved(chat_id, start_time, end_time, mark):
+            self.counters["checked"] += 1
+            while current_message is not None and current_message.id < saved_message.message_id:
+                current_message = await anext(current, None)
+                self.counters["fetched"] += current_message is not None
+
+            if current_message is None or current_message.id > saved_message.message_id:
+                deleted.append(saved_message)
+                continue
+            self.compare(saved_message, current_message, chat_id, modified, edits)
+        return deleted, modified, edits
+
+    async def probe(self, chat_id: int, start_time: int, end_time: int, mark: int) -> tuple:
+        deleted, modified, edits = [], [], []
+        batch = []
+
+        async def send(batch):
+            self.counters["fetched"] += len(batch)
+            current_messages = await self.client.get_messages(chat_id, ids=[m.message_id for m in batch])
+            for saved_message, current_message in zip(batch, current_messages):
+                if current_message is None:
+                    deleted.append(saved_message)
+                else:
+                    self.compare(saved_message, current_message, chat_id, modified, edits)
+
+        async for saved_message in self.iter_saved(chat_id, start_time, end_time, mark):
+            self.counters["checked"] += 1
+            batch.append(saved_message)
+            if len(batch) == PROBE_BATCH_SIZE:
+                await send(batch)
+                batch = []
+        if batch:
+            await send(batch)
+        return deleted, modified, edits
+
+    async def covers_mark(self, chat_id: int, end_time: int, mark: int, first_id: int) -> bool:
+        # The mark means every stored id up to it was checked, so it only moves when this
+        # run started right after it: a narrow recent window leaves older ids unchecked.
+        unchecked_first_id, _ = await db_crud.message_crud.get_message_id_range(self.account_id, chat_id, 0,
+                                                                                end_time, mark)
+        return unchecked_first_id == first_id
+
+    async def reconcile_chat(self, chat_id: int, start_time: int, end_time: int, mark: int) -> tuple:
+        first_id, last_id = await db_crud.message_crud.get_message_id_range(self.account_id, chat_id,
+                                                                            start_time, end_time, mark)
+        if first_id is None:
+            self.counters["skipped_chats"] += 1
+            return [], []
+
+        if self.strategy == "probe":
+            deleted, modified, edits = await self.probe(chat_id, start_time, end_time, mark)
+        else:
+            deleted, modified, edits = await self.scan(chat_id, start_time, end_time, mark, first_id)
+
+        if deleted:
+            await db_crud.message_crud.mark_deleted(self.account_id, chat_id,
+                                                    [message.message_id for message in deleted])
+        if edits:
+            await db_crud.message_crud.apply_edits(self.account_id, edits)
+        # With filters only part of the range was checked, so the mark is left alone.
+        if not self.filters and await self.covers_mark(chat_id, end_time, mark, first_id):
+            await db_crud.reconcile_state_crud.set_mark(self.account_id, chat_id, last_id)
+
+        self.counters["chats"] += 1
+        self.counters["deleted"] += len(deleted)
+        self.counters["modified"] += len(modified)
+        return [dict(message.to_dict(), is_deleted=True) for message in deleted], modified
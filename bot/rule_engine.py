@@ -0,0 +1,197 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from db.facade import DB
+
+load_dotenv()
+db_crud = DB()
+
+RULE_ENGINE_TTL = float(os.getenv("RULE_ENGINE_TTL", 300))
+
+MATCH_FIELDS = ("username", "chat_title", "content", "startswith")
+
+
+class AhoCorasick:
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+    def add(self, pattern: str, payload):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(payload)
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def search(self, text: str) -> set:
+        found = set(self.output[0])
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                found.update(self.output[state])
+        return found
+
+
+class PrefixTrie:
+    def __init__(self):
+        self.children = [{}]
+        self.output = [[]]
+
+    def add(self, prefix: str, payload):
+        node = 0
+        for char in prefix:
+            next_node = self.children[node].get(char)
+            if next_node is None:
+                next_node = len(self.children)
+                self.children[node][char] = next_node
+                self.children.append({})
+                self.output.append([])
+            node = next_node
+        self.output[node].append(payload)
+
+    def match(self, text: str) -> set:
+        found = set(self.output[0])
+        node = 0
+        for char in text:
+            node = self.children[node].get(char)
+            if node is None:
+                break
+            found.update(self.output[node])
+        return found
+
+
+class CompiledRules:
+    def __init__(self, rules: list):
+        self.rules = rules
+        self.usernames = {}
+        self.chat_titles = {}
+        self.content = AhoCorasick()
+        self.startswith = PrefixTrie()
+
+        for index, (rule, data) in enumerate(rules):
+            for username in data['username']:
+                if isinstance(username, str):
+                    self.usernames.setdefault(username, set()).add(index)
+            for chat_title in data['chat_title']:
+                if isinstance(chat_title, str):
+                    self.chat_titles.setdefault(chat_title, set()).add(index)
+            for content in data['content']:
+                if isinstance(content, str):
+                    self.content.add(content, index)
+            for prefix in data['startswith']:
+                if isinstance(prefix, str):
+                    self.startswith.add(prefix, index)
+        self.content.build()
+
+    def match(self, message: dict, user_id: int = None) -> list:
+        text = message['text']
+        hits = {
+            "username": self.usernames.get(message["sender_username"], ()),
+            "chat_title": self.chat_titles.get(message["chat_title"], ()),
+            "content": self.content.search(text),
+            "startswith": self.startswith.match(text),
+        }
+
+        triggered = {}
+        for field in MATCH_FIELDS:
+            for index in hits[field]:
+                triggered.setdefault(index, set()).add(field)
+
+        triggered_events = []
+        for index in sorted(triggered):
+            rule, data = self.rules[index]
+            if user_id is not None and data['user_id'] != user_id:
+                continue
+            fields = triggered[index]
+            match_details = []
+            if "username" in fields:
+                match_details.append(f"username: {data['username']}")
+            if "chat_title" in fields:
+                match_details.append(f"chat title: {data['chat_title']}")
+            if "content" in fields:
+                match_details.append(f"content match: {data['content']} in message")
+            if "startswith" in fields:
+                match_details.append(f"message starts with: {data['startswith']}")
+            triggered_events.append((rule, data['user_id'], match_details, message))
+        return triggered_events
+
+
+class RuleEngine:
+    def __init__(self, ttl: float = RULE_ENGINE_TTL):
+        self.ttl = ttl
+        self.events = None
+        self.forward_filters = None
+        self.built_at = 0.0
+        self.dirty = True
+        self.lock = asyncio.Lock()
+        self.builds = 0
+        self.last_build_time = 0.0
+
+    def invalidate(self):
+        self.dirty = True
+
+    async def ensure_compiled(self):
+        if not self.dirty and time.monotonic() - self.built_at < self.ttl:
+            return
+        async with self.lock:
+            if not self.dirty and time.monotonic() - self.built_at < self.ttl:
+                return
+            self.dirty = False
+            started = time.perf_counter()
+            try:
+                events = await db_crud.userEvent_crud.get_all()
+                filters = await db_crud.userFilter_crud.get_all()
+            except Exception:
+                self.dirty = True
+                raise
+            self.events = CompiledRules([(event, event.get_data()) for event in events])
+            self.forward_filters = CompiledRules([(user_filter, user_filter.get_data()) for user_filter in filters
+                                                  if user_filter.scrape_and_forward_mode])
+            self.built_at = time.monotonic()
+            self.builds += 1
+            self.last_build_time = time.perf_counter() - started
+            logger.info(f"Rule engine compiled {len(events)} events and "
+                        f"{len(self.forward_filters.rules)} forward filters")
+
+    async def match_events(self, message: dict, user_id: int = None) -> list:
+        await self.ensure_compiled()
+        return self.events.match(message, user_id)
+
+    async def match_forward_filters(self, message: dict, user_id: int = None) -> list:
+        await self.ensure_compiled()
+        return self.forward_filters.match(message, user_id)
+
+    def stats(self) -> dict:
+        return {
+            "events": len(self.events.rules) if self.events else 0,
+            "forward_filters": len(self.forward_filters.rules) if self.forward_filters else 0,
+            "builds": self.builds,
+            "last_build_ms": round(self.last_build_time * 1000, 2),
+        }
@@ -0,0 +1,223 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+from telethon import TelegramClient, errors, utils
+
+from utils.rate_limit import TokenBucket
+
+load_dotenv()
+
+SCHEDULER_ACCOUNT_RATE = float(os.getenv("SCHEDULER_ACCOUNT_RATE", 20.0))
+SCHEDULER_ACCOUNT_BURST = float(os.getenv("SCHEDULER_ACCOUNT_BURST", 40.0))
+SCHEDULER_METHOD_RATE = float(os.getenv("SCHEDULER_METHOD_RATE", 5.0))
+SCHEDULER_METHOD_BURST = float(os.getenv("SCHEDULER_METHOD_BURST", 10.0))
+SCHEDULER_METHOD_RATES = os.getenv("SCHEDULER_METHOD_RATES", "ResolveUsernameRequest:0.2,SendCodeRequest:0.1")
+SCHEDULER_FLOOD_SLEEP_THRESHOLD = float(os.getenv("SCHEDULER_FLOOD_SLEEP_THRESHOLD", 60.0))
+
+INGEST = 0
+FORWARD = 1
+INTERACTIVE = 2
+BACKFILL = 3
+RECONCILE = 4
+PRIORITY_NAMES = {INGEST: "ingest", FORWARD: "forward", INTERACTIVE: "interactive",
+                  BACKFILL: "backfill", RECONCILE: "reconcile"}
+
+request_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    token = request_priority.set(level)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+def parse_method_rates(value: str) -> dict:
+    rates = {}
+    for item in value.split(","):
+        method, _, rate = item.strip().partition(":")
+        if method and rate:
+            rates[method] = float(rate)
+    return rates
+
+
+class AccountState:
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, max(burst, 1.0))
+        self.method_buckets = {}
+        self.penalties = {}
+        self.waiting = []
+        self.wake_event = asyncio.Event()
+        self.pump_task = None
+        self.sequence = 0
+
+        self.calls = 0
+        self.flood_waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class RequestScheduler:
+    # Every RPC of a ScheduledTelegramClient passes through here. Requests of one
+    # account are released in priority order as long as both the account bucket
+    # and the bucket of the request's method have a token and the method is not
+    # serving a FloodWait penalty.
+    def __init__(self, account_rate: float = SCHEDULER_ACCOUNT_RATE, account_burst: float = SCHEDULER_ACCOUNT_BURST,
+                 method_rate: float = SCHEDULER_METHOD_RATE, method_burst: float = SCHEDULER_METHOD_BURST,
+                 method_rates: dict = None, flood_sleep_threshold: float = SCHEDULER_FLOOD_SLEEP_THRESHOLD):
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.method_rate = method_rate
+        self.method_burst = method_burst
+        self.method_rates = parse_method_rates(SCHEDULER_METHOD_RATES) if method_rates is None else method_rates
+        self.flood_sleep_threshold = flood_sleep_threshold
+        self.accounts = {}
+
+    def _account(self, account_id: str) -> AccountState:
+        state = self.accounts.get(account_id)
+        if state is None:
+            state = self.accounts[account_id] = AccountState(self.account_rate, self.account_burst)
+        return state
+
+    def _method_bucket(self, state: AccountState, method: str) -> TokenBucket:
+        bucket = state.method_buckets.get(method)
+        if bucket is None:
+            rate = self.method_rates.get(method, self.method_rate)
+            bucket = state.method_buckets[method] = TokenBucket(rate, max(min(self.method_burst, rate), 1.0))
+        return bucket
+
+    def _delay(self, state: AccountState, method: str, now: float) -> float:
+        penalty = state.penalties.get(method, 0.0) - now
+        return max(penalty, state.bucket.delay(now), self._method_bucket(state, method).delay(now))
+
+    def _take(self, state: AccountState, method: str):
+        state.bucket.take()
+        self._method_bucket(state, method).take()
+
+    async def acquire(self, account_id: str, method: str, request=None, level: int = None):
+        state = self._account(account_id)
+        now = time.monotonic()
+        penalty = state.penalties.get(method, 0.0) - now
+        if penalty > self.flood_sleep_threshold:
+            raise errors.FloodWaitError(request=request, capture=round(penalty))
+
+        if not state.waiting and self._delay(state, method, now) <= 0:
+            self._take(state, method)
+            state.calls += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        state.sequence += 1
+        state.waiting.append((request_priority.get() if level is None else level, state.sequence, method, future, now,
+                              request))
+        state.waiting.sort(key=lambda entry: entry[:2])
+        state.wake_event.set()
+        if state.pump_task is None:
+            state.pump_task = asyncio.create_task(self._pump(state))
+        await future
+
+    async def _pump(self, state: AccountState):
+        try:
+            while state.waiting:
+                now = time.monotonic()
+                next_delay = None
+                for entry in state.waiting:
+                    level, _, method, future, enqueued_at, request = entry
+                    if future.done():
+                        state.waiting.remove(entry)
+                        break
+                    penalty = state.penalties.get(method, 0.0) - now
+                    if penalty > self.flood_sleep_threshold:
+                        state.waiting.remove(entry)
+                        future.set_exception(errors.FloodWaitError(request=request, capture=round(penalty)))
+                        break
+                    delay = self._delay(state, method, now)
+                    if delay <= 0:
+                        state.waiting.remove(entry)
+                        self._take(state, method)
+                        waited = now - enqueued_at
+                        state.calls += 1
+                        state.total_wait += waited
+                        state.max_wait = max(state.max_wait, waited)
+                        future.set_result(None)
+                        break
+                    next_delay = delay if next_delay is None else min(next_delay, delay)
+                else:
+                    # Nothing can go yet; sleep until the earliest token, or until a new request arrives.
+                    state.wake_event.clear()
+                    try:
+                        await asyncio.wait_for(state.wake_event.wait(), next_delay)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            state.pump_task = None
+
+    def penalize(self, account_id: str, method: str, seconds: float):
+        state = self._account(account_id)
+        state.flood_waits += 1
+        state.penalties[method] = max(state.penalties.get(method, 0.0), time.monotonic() + seconds)
+        state.wake_event.set()
+
+    async def call(self, account_id: str, request, send):
+        method = type(request[0] if utils.is_list_like(request) else request).__name__
+        while True:
+            await self.acquire(account_id, method, request)
+            try:
+                return await send()
+            except (errors.FloodWaitError, errors.FloodTestPhoneWaitError, errors.SlowModeWaitError) as e:
+                seconds = max(e.seconds, 1)
+                # Slow mode is a limit of one chat, not of the method.
+                if not isinstance(e, errors.SlowModeWaitError):
+                    self.penalize(account_id, method, seconds)
+                if seconds > self.flood_sleep_threshold:
+                    raise
+                logger.info(f"{method} for {account_id} hit a {seconds}s flood wait, retrying")
+                if isinstance(e, errors.SlowModeWaitError):
+                    await asyncio.sleep(seconds)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        accounts = {}
+        for account_id, state in self.accounts.items():
+            queued = {}
+            for level, *_ in state.waiting:
+                name = PRIORITY_NAMES.get(level, str(level))
+                queued[name] = queued.get(name, 0) + 1
+            waited_calls = state.calls or 1
+            accounts[account_id] = {
+                "queued": len(state.waiting),
+                "queued_by_priority": queued,
+                "calls": state.calls,
+                "flood_waits": state.flood_waits,
+                "avg_wait_ms": round(state.total_wait / waited_calls * 1000, 2),
+                "max_wait_ms": round(state.max_wait * 1000, 2),
+                "penalties": {method: round(until - now, 1)
+                              for method, until in state.penalties.items() if until > now},
+            }
+        return accounts
+
+
+request_scheduler = RequestScheduler()
+
+
+class ScheduledTelegramClient(TelegramClient):
+    # Telethon's own flood sleeping is turned off so that every FloodWait is seen,
+    # and accounted for, by the scheduler.
+    def __init__(self, *args, account_id: str, **kwargs):
+        kwargs.setdefault("flood_sleep_threshold", 0)
+        super().__init__(*args, **kwargs)
+        self.account_id = account_id
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        parent = super()._call
+        return await request_scheduler.call(
+            self.account_id, request,
+            lambda: parent(sender, request, ordered=ordered, flood_sleep_threshold=0)
+        )
@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+import os
+import pathlib
+import sqlite3
+import sys
+
+from dotenv import load_dotenv
+from loguru import logger
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession
+from telethon.tl import types
+
+from db.create_tables import create_tables
+from db.facade import DB
+
+load_dotenv()
+db_crud = DB()
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "file")
+SESSION_DIR = "bot/sessions"
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", 5.0))
+
+pending_flushes = set()
+
+
+class DatabaseSession(MemorySession):
+    # Telethon session kept in memory and written to the main database. Telethon
+    # calls save() and the setters very often, so changes are only marked dirty
+    # and written together at most every SESSION_FLUSH_INTERVAL seconds.
+    def __init__(self, name: str, flush_interval: float = SESSION_FLUSH_INTERVAL):
+        super().__init__()
+        self.name = name
+        self.flush_interval = flush_interval
+        self.flush_task = None
+        self.session_dirty = False
+        self.dirty_entities = set()
+        self.dirty_states = {}
+        self.writes = 0
+
+    @classmethod
+    async def load(cls, name: str) -> "DatabaseSession":
+        session = cls(name)
+        session_row, entities, states = await db_crud.telegram_session_crud.load(name)
+        if session_row is not None:
+            session._dc_id = session_row.dc_id
+            session._server_address = session_row.server_address
+            session._port = session_row.port
+            session._takeout_id = session_row.takeout_id
+            if session_row.auth_key:
+                session._auth_key = AuthKey(data=session_row.auth_key)
+        session._entities = set(entities)
+        for entity_id, pts, qts, date, seq in states:
+            session._update_states[entity_id] = types.updates.State(
+                pts, qts, datetime.datetime.fromtimestamp(date, tz=datetime.timezone.utc), seq, unread_count=0)
+        return session
+
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self.session_dirty = True
+        self._schedule_flush()
+
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self.session_dirty = True
+        self._schedule_flush()
+
+    @MemorySession.takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self.session_dirty = True
+        self._schedule_flush()
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self.dirty_states[entity_id] = state
+        self._schedule_flush()
+
+    def process_entities(self, tlo):
+        rows = self._entities_to_rows(tlo)
+        new_rows = set(rows) - self._entities
+        if new_rows:
+            self._entities |= new_rows
+            self.dirty_entities |= new_rows
+            self._schedule_flush()
+
+    def save(self):
+        self._schedule_flush()
+
+    def close(self):
+        self._schedule_flush(delay=0)
+
+    def delete(self):
+        self.session_dirty = False
+        self.dirty_entities.clear()
+        self.dirty_states.clear()
+        self._spawn(db_crud.telegram_session_crud.delete_state(self.name))
+        return True
+
+    def _spawn(self, coro):
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()
+            return None
+        pending_flushes.add(task)
+        task.add_done_callback(pending_flushes.discard)
+        return task
+
+    def _schedule_flush(self, delay: float = None):
+        if not (self.session_dirty or self.dirty_entities or self.dirty_states):
+            return
+        if delay != 0 and self.flush_task is not None and not self.flush_task.done():
+            return
+        self.flush_task = self._spawn(self._flush_later(self.flush_interval if delay is None else delay))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self):
+        values = None
+        if self.session_dirty:
+            values = {"dc_id": self._dc_id, "server_address": self._server_address, "port": self._port,
+                      "auth_key": self._auth_key.key if self._auth_key else None, "takeout_id": self._takeout_id}
+        entities, self.dirty_entities = list(self.dirty_entities), set()
+        dirty_states, self.dirty_states = self.dirty_states, {}
+        states = [(entity_id, state.pts, state.qts, int(state.date.timestamp()), state.seq)
+                  for entity_id, state in dirty_states.items()]
+        self.session_dirty = False
+        if values is None and not entities and not states:
+            return
+        try:
+            await db_crud.telegram_session_crud.save_state(self.name, values, entities, states)
+            self.writes += 1
+        except Exception as e:
+            logger.error(f"Failed to save Telegram session {self.name}: {e}")
+            self.session_dirty = self.session_dirty or values is not None
+            self.dirty_entities |= set(entities)
+            self.dirty_states = {**dirty_states, **self.dirty_states}
+
+
+async def open_session(session_name: str):
+    if SESSION_BACKEND == "database":
+        return await DatabaseSession.load(session_name)
+    return f"{SESSION_DIR}/{session_name}"
+
+
+async def delete_session(session_name: str):
+    if SESSION_BACKEND == "database":
+        await db_crud.telegram_session_crud.delete_state(session_name)
+    else:
+        os.remove(f"{SESSION_DIR}/{session_name}.session")
+
+
+async def flush_sessions():
+    await asyncio.gather(*pending_flushes, return_exceptions=True)
+
+
+async def migrate_session_files(session_dir: str = SESSION_DIR) -> int:
+    await create_tables()
+    migrated = 0
+    for path in sorted(pathlib.Path(session_dir).glob("*.session")):
+        conn = sqlite3.connect(path)
+        try:
+            session_row = conn.execute("select dc_id, server_address, port, auth_key, takeout_id "
+                                       "from sessions").fetchone()
+            if session_row is None:
+                logger.warning(f"Skipping {path.name}: no session row")
+                continue
+            entities = conn.execute("select id, hash, username, phone, name from entities").fetchall()
+            states = conn.execute("select id, pts, qts, date, seq from update_state").fetchall()
+        finally:
+            conn.close()
+
+        dc_id, server_address, port, auth_key, takeout_id = session_row
+        await db_crud.telegram_session_crud.save_state(
+            path.stem,
+            {"dc_id": dc_id, "server_address": server_address, "port": port,
+             "auth_key": auth_key or None, "takeout_id": takeout_id},
+            entities,
+            [(entity_id, pts, qts, int(date), seq) for entity_id, pts, qts, date, seq in states]
+        )
+        migrated += 1
+        logger.info(f"Imported {path.name}: {len(entities)} entities, {len(states)} update states")
+    return migrated
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate_session_files(sys.argv[1] if len(sys.argv) > 1 else SESSION_DIR))
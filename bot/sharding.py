@@ -0,0 +1,227 @@
+import asyncio
+import itertools
+import multiprocessing
+import pickle
+import zlib
+
+from loguru import logger
+
+from bot.reconcile import RECONCILE_STRATEGY
+
+SHUTDOWN = "__shutdown__"
+
+
+class ShardError(Exception):
+    pass
+
+
+def shard_key(account_id) -> str:
+    return str(account_id).replace("+", "").replace(" ", "")
+
+
+def shard_for(account_id, shards: int) -> int:
+    return zlib.crc32(shard_key(account_id).encode()) % shards
+
+
+def _pack_error(error: Exception):
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return ShardError(f"{type(error).__name__}: {error}")
+
+
+async def _serve_shard(index: int, conn):
+    from bot.bot import TelegramChatHistory
+
+    # Every shard reads the same proxy table, so one of them probing it is enough.
+    history = TelegramChatHistory(proxy_health_checks=index == 0)
+    if index == 0:
+        # Probe even if none of the accounts hash to this shard.
+        history.proxy_pool.start()
+    loop = asyncio.get_running_loop()
+    requests = asyncio.Queue()
+    tasks = set()
+
+    def on_request():
+        try:
+            requests.put_nowait(conn.recv())
+        except (EOFError, OSError):
+            loop.remove_reader(conn.fileno())
+            requests.put_nowait((None, SHUTDOWN, (), {}))
+
+    loop.add_reader(conn.fileno(), on_request)
+
+    async def handle(request_id, method, args, kwargs):
+        try:
+            result = getattr(history, method)(*args, **kwargs)
+            if asyncio.iscoroutine(result):
+                result = await result
+            response = (request_id, True, result)
+        except Exception as e:
+            response = (request_id, False, _pack_error(e))
+        try:
+            conn.send(response)
+        except Exception as e:
+            conn.send((request_id, False, ShardError(f"Result of {method} could not be sent: {e}")))
+
+    logger.info(f"Shard {index} started")
+    while True:
+        request_id, method, args, kwargs = await requests.get()
+        if method == SHUTDOWN:
+            break
+        task = asyncio.create_task(handle(request_id, method, args, kwargs))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    loop.remove_reader(conn.fileno())
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # A shard stopping is a restart, not the user stopping monitoring: accounts
+    # stay active so start_active_accounts resumes them.
+    try:
+        await history.stop_ingest()
+    finally:
+        await history.shutdown()
+    logger.info(f"Shard {index} stopped")
+
+
+def run_shard(index: int, conn):
+    try:
+        asyncio.run(_serve_shard(index, conn))
+    except (EOFError, KeyboardInterrupt):
+        pass
+
+
+class ShardSupervisor:
+    # Mirrors the TelegramChatHistory API used by the routers, routing each call
+    # to the worker process that owns the account.
+    def __init__(self, shards: int):
+        self.shards = shards
+        self.processes = []
+        self.connections = []
+        self.pending = {}
+        self.request_ids = itertools.count()
+
+    def start(self):
+        if self.processes:
+            return
+        context = multiprocessing.get_context("spawn")
+        loop = asyncio.get_running_loop()
+        for index in range(self.shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=run_shard, args=(index, child_conn), daemon=True,
+                                      name=f"telegram-shard-{index}")
+            process.start()
+            child_conn.close()
+            self.processes.append(process)
+            self.connections.append(parent_conn)
+            loop.add_reader(parent_conn.fileno(), self._on_response, index)
+        logger.info(f"Started {self.shards} Telegram shard processes")
+
+    def _on_response(self, index: int):
+        conn = self.connections[index]
+        try:
+            request_id, ok, result = conn.recv()
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            logger.error(f"Shard {index} exited")
+            for request_id, future in list(self.pending.items()):
+                if future.shard == index:
+                    del self.pending[request_id]
+                    if not future.done():
+                        future.set_exception(ShardError(f"Shard {index} exited"))
+            return
+        future = self.pending.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(result)
+        else:
+            future.set_exception(result)
+
+    async def call(self, shard: int, method: str, *args, **kwargs):
+        self.start()
+        request_id = next(self.request_ids)
+        future = asyncio.get_running_loop().create_future()
+        future.shard = shard
+        self.pending[request_id] = future
+        self.connections[shard].send((request_id, method, args, kwargs))
+        return await future
+
+    async def call_owner(self, account_id, method: str, *args, **kwargs):
+        return await self.call(shard_for(account_id, self.shards), method, *args, **kwargs)
+
+    async def broadcast(self, method: str, *args, **kwargs) -> list:
+        return await asyncio.gather(*(self.call(shard, method, *args, **kwargs) for shard in range(self.shards)))
+
+    async def create_user_session(self, phone):
+        return await self.call_owner(phone, "create_user_session", phone)
+
+    async def pass_code(self, phone, code=None, account=None, password=None):
+        return await self.call_owner(phone, "pass_code", phone, code=code, account=account, password=password)
+
+    async def create_session(self, session_name):
+        return await self.call_owner(session_name, "create_session", session_name)
+
+    async def start_monitoring_for_session(self, session_name):
+        return await self.call_owner(session_name, "start_monitoring_for_session", session_name)
+
+    async def stop_monitoring_for_session(self, session_name):
+        return await self.call_owner(session_name, "stop_monitoring_for_session", session_name)
+
+    async def remove_session(self, session_name):
+        return await self.call_owner(session_name, "remove_session", session_name)
+
+    async def fetch_all_chats_to_json(self, session_name):
+        return await self.call_owner(session_name, "fetch_all_chats_to_json", session_name)
+
+    async def check_deleted_in_chat(self, start_time: int, end_time: int, chats: list = None,
+                                    account_id: str = None, filters: dict = None,
+                                    incremental: bool = True, strategy: str = RECONCILE_STRATEGY) -> dict:
+        return await self.call_owner(account_id, "check_deleted_in_chat", start_time, end_time,
+                                     chats=chats, account_id=account_id, filters=filters,
+                                     incremental=incremental, strategy=strategy)
+
+    async def start_backfill(self, account_id: str, chat_ids: list, since: int = None,
+                             max_messages: int = None, apply_rules: bool = True) -> dict:
+        return await self.call_owner(account_id, "start_backfill", account_id, chat_ids, since=since,
+                                     max_messages=max_messages, apply_rules=apply_rules)
+
+    async def backfill_status(self, account_id: str = None) -> dict:
+        if account_id is not None:
+            return await self.call_owner(account_id, "backfill_status", account_id)
+        statuses = await self.broadcast("backfill_status")
+        return {"flood_waits": sum(status["flood_waits"] for status in statuses),
+                "accounts": {account: progress for status in statuses for account, progress in status["accounts"].items()}}
+
+    async def invalidate_ingest_context(self, user_id: int = None, account_id: str = None,
+                                        rules_changed: bool = False):
+        await self.broadcast("invalidate_ingest_context", user_id=user_id, account_id=account_id,
+                             rules_changed=rules_changed)
+
+    async def list_sessions(self):
+        return [session for sessions in await self.broadcast("list_sessions") for session in sessions]
+
+    async def stop_monitoring(self):
+        await self.broadcast("stop_monitoring")
+
+    async def metrics(self):
+        shard_metrics = await self.broadcast("metrics")
+        return {f"shard-{index}": metrics for index, metrics in enumerate(shard_metrics)}
+
+    async def shutdown(self):
+        if not self.processes:
+            return
+        loop = asyncio.get_running_loop()
+        for conn in self.connections:
+            loop.remove_reader(conn.fileno())
+            try:
+                conn.send((None, SHUTDOWN, (), {}))
+            except OSError:
+                pass
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, 30)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.connections = []
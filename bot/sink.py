@@ -0,0 +1,161 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from db.facade import DB
+
+load_dotenv()
+db_crud = DB()
+
+MESSAGE_SINK_BATCH_SIZE = int(os.getenv("MESSAGE_SINK_BATCH_SIZE", 500))
+MESSAGE_SINK_FLUSH_INTERVAL = float(os.getenv("MESSAGE_SINK_FLUSH_INTERVAL", 1.0))
+MESSAGE_SINK_MAX_QUEUE = int(os.getenv("MESSAGE_SINK_MAX_QUEUE", 20000))
+
+
+class WriteBehindSink:
+    # Rows are flushed with one multi-row INSERT when the buffer reaches
+    # max_batch_size or every flush_interval seconds, whichever comes first.
+    def __init__(self, name: str, flush_func, max_batch_size: int = 500,
+                 flush_interval: float = 1.0, max_queue_size: int = 20000, max_retries: int = 3):
+        self.name = name
+        self.flush_func = flush_func
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.max_retries = max_retries
+
+        self.buffer = []
+        self.flush_lock = asyncio.Lock()
+        self.wake_event = asyncio.Event()
+        self.flush_task = None
+        self.stopping = False
+        self.failed_attempts = 0
+
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def _ensure_running(self):
+        if self.flush_task is None or self.flush_task.done():
+            # An Event belongs to the loop it was first awaited on; a restarted
+            # flush loop may be running on a different one.
+            self.wake_event = asyncio.Event()
+            self.flush_task = asyncio.create_task(self._run())
+
+    async def put(self, row: dict):
+        self._ensure_running()
+        if len(self.buffer) >= self.max_queue_size:
+            await self.flush()
+        self.buffer.append(row)
+        if len(self.buffer) >= self.max_batch_size:
+            self.wake_event.set()
+
+    async def flush(self) -> int:
+        async with self.flush_lock:
+            if not self.buffer:
+                return 0
+            batch = self.buffer[:self.max_batch_size]
+            del self.buffer[:len(batch)]
+
+            started = time.perf_counter()
+            try:
+                await self.flush_func(batch)
+            except Exception as e:
+                self.failed_flushes += 1
+                self.failed_attempts += 1
+                if self.failed_attempts <= self.max_retries:
+                    self.buffer[:0] = batch
+                    logger.error(f"Sink {self.name}: flush of {len(batch)} rows failed, will retry: {e}")
+                    return 0
+                self.failed_attempts = 0
+                logger.error(f"Sink {self.name}: flush of {len(batch)} rows failed repeatedly, "
+                             f"isolating the failing rows: {e}")
+                written = await self._write_isolating(batch)
+                if written:
+                    self.flushes += 1
+                    self.flushed_rows += written
+                return written
+
+            latency = time.perf_counter() - started
+            self.failed_attempts = 0
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_latency += latency
+            return len(batch)
+
+    async def _write_isolating(self, rows: list) -> int:
+        # Bisects a batch that keeps failing so that only the rows that fail on
+        # their own (constraint violations and the like) are dropped.
+        try:
+            await self.flush_func(rows)
+            return len(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                self.dropped_rows += 1
+                logger.error(f"Sink {self.name}: dropping row {str(rows[0])[:200]}: {e}")
+                return 0
+        middle = len(rows) // 2
+        return await self._write_isolating(rows[:middle]) + await self._write_isolating(rows[middle:])
+
+    async def flush_all(self):
+        # Stops once a flush makes no progress, i.e. the batch went back for a retry.
+        while self.buffer:
+            pending = len(self.buffer)
+            await self.flush()
+            if len(self.buffer) >= pending:
+                break
+
+    async def _run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wake_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake_event.clear()
+            await self.flush_all()
+
+    async def stop(self):
+        if self.flush_task is not None:
+            # Not cancelled: wait_for swallows a cancellation that races with
+            # wake_event being set, which left stop() waiting forever.
+            self.stopping = True
+            self.wake_event.set()
+            try:
+                await self.flush_task
+            except Exception as e:
+                logger.error(f"Sink {self.name}: flush loop failed: {e}")
+            finally:
+                self.stopping = False
+                self.flush_task = None
+        await self.flush_all()
+        if self.buffer:
+            logger.error(f"Sink {self.name}: {len(self.buffer)} rows left unwritten on shutdown")
+        else:
+            logger.info(f"Sink {self.name} flushed and stopped")
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self.buffer),
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "dropped_rows": self.dropped_rows,
+            "last_flush_latency_ms": round(self.last_flush_latency * 1000, 2),
+            "max_flush_latency_ms": round(self.max_flush_latency * 1000, 2),
+            "avg_flush_latency_ms": round(self.total_flush_latency / self.flushes * 1000, 2) if self.flushes else 0.0,
+        }
+
+
+message_sink = WriteBehindSink("messages", db_crud.message_crud.create_many,
+                               max_batch_size=MESSAGE_SINK_BATCH_SIZE,
+                               flush_interval=MESSAGE_SINK_FLUSH_INTERVAL,
+                               max_queue_size=MESSAGE_SINK_MAX_QUEUE)
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from utils.rate_limit import TokenBucket
+
+load_dotenv()
+
+STARTUP_CONCURRENCY = int(os.getenv("STARTUP_CONCURRENCY", 10))
+STARTUP_PROXY_INTERVAL = float(os.getenv("STARTUP_PROXY_INTERVAL", 2.0))
+
+PENDING = "pending"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+FAILED = "failed"
+
+
+class AccountStartup:
+    def __init__(self, account_id: str, proxy_id: int | None):
+        self.account_id = account_id
+        self.proxy_id = proxy_id
+        self.status = PENDING
+        self.started_at = None
+        self.duration = None
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "proxy_id": self.proxy_id,
+            "duration_s": round(self.duration, 2) if self.duration is not None else None,
+            "error": self.error,
+        }
+
+
+class StartupCoordinator:
+    def __init__(self, bot, concurrency: int = STARTUP_CONCURRENCY, proxy_interval: float = STARTUP_PROXY_INTERVAL):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.proxy_interval = proxy_interval
+        self.accounts = {}
+        self.proxy_limiters = {}
+        self.task = None
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self, accounts: list):
+        if self.task and not self.task.done():
+            logger.info("Account startup already in progress.")
+            return
+        self.accounts = {account.id: AccountStartup(account.id, account.proxy_id) for account in accounts}
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self.start_account(account, semaphore) for account in self.accounts.values()))
+        self.finished_at = time.monotonic()
+        progress = self.progress()
+        logger.info(f"Account startup finished in {progress['elapsed_s']}s: "
+                    f"{progress['connected']} connected, {progress['failed']} failed")
+
+    async def start_account(self, account: AccountStartup, semaphore: asyncio.Semaphore):
+        if account.proxy_id is not None and self.proxy_interval > 0:
+            limiter = self.proxy_limiters.get(account.proxy_id)
+            if limiter is None:
+                limiter = self.proxy_limiters[account.proxy_id] = TokenBucket(1 / self.proxy_interval, 1)
+            await limiter.acquire()
+
+        async with semaphore:
+            account.status = CONNECTING
+            account.started_at = time.monotonic()
+            try:
+                started = await self.bot.start_monitoring_for_session(account.account_id)
+                account.status = CONNECTED if started else FAILED
+                if not started:
+                    account.error = "Client is not authorized"
+            except Exception as e:
+                account.status = FAILED
+                account.error = str(e)
+                logger.error(f"Failed to start monitoring for {account.account_id}: {e}")
+            account.duration = time.monotonic() - account.started_at
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def progress(self) -> dict:
+        counts = {PENDING: 0, CONNECTING: 0, CONNECTED: 0, FAILED: 0}
+        for account in self.accounts.values():
+            counts[account.status] += 1
+        end = self.finished_at or time.monotonic()
+        return {
+            **counts,
+            "total": len(self.accounts),
+            "finished": self.finished_at is not None,
+            "elapsed_s": round(end - self.started_at, 2) if self.started_at else 0.0,
+            "accounts": {account_id: account.to_dict() for account_id, account in self.accounts.items()},
+        }
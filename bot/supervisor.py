@@ -0,0 +1,114 @@
+import asyncio
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from bot.scheduler import request_priority, INGEST
+
+load_dotenv()
+
+SESSION_RECONNECT_BASE_DELAY = float(os.getenv("SESSION_RECONNECT_BASE_DELAY", 2.0))
+SESSION_RECONNECT_MAX_DELAY = float(os.getenv("SESSION_RECONNECT_MAX_DELAY", 300.0))
+SESSION_MAX_FAILURES = int(os.getenv("SESSION_MAX_FAILURES", 10))
+SESSION_STABLE_AFTER = float(os.getenv("SESSION_STABLE_AFTER", 60.0))
+
+CONNECTING = "connecting"
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+FAILED = "failed"
+STOPPED = "stopped"
+
+
+class SessionSupervisor:
+    # Keeps one account monitored: whenever the connection drops the client is
+    # rebuilt and monitoring resumes after a jittered exponential backoff.
+    def __init__(self, history, session_name: str, base_delay: float = SESSION_RECONNECT_BASE_DELAY,
+                 max_delay: float = SESSION_RECONNECT_MAX_DELAY, max_failures: int = SESSION_MAX_FAILURES):
+        self.history = history
+        self.session_name = session_name
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_failures = max_failures
+
+        self.status = CONNECTING
+        self.failures = 0
+        self.reconnects = 0
+        self.caught_up = 0
+        self.uptime = 0.0
+        self.connected_at = None
+        self.connected_since = None
+        self.last_error = None
+
+    def backoff(self) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def on_connected(self):
+        self.status = CONNECTED
+        self.connected_at = time.monotonic()
+        self.connected_since = time.time()
+
+    def on_message(self, message_date):
+        # Messages dated before the connection was established were delivered by catch-up.
+        if self.connected_since is not None and message_date.timestamp() < self.connected_since:
+            self.caught_up += 1
+
+    def on_disconnected(self, error: str = None):
+        if self.connected_at is not None:
+            connected_for = time.monotonic() - self.connected_at
+            self.uptime += connected_for
+            if connected_for >= SESSION_STABLE_AFTER:
+                self.failures = 0
+        self.connected_at = None
+        self.connected_since = None
+        if error is not None:
+            self.last_error = error
+
+    async def run(self):
+        # Everything started from here, including Telethon's update loop and the
+        # ingest pipeline workers, inherits the ingest priority.
+        request_priority.set(INGEST)
+        try:
+            while True:
+                client = await self.history.get_client_by_session_name(self.session_name)
+                if client is None or self.session_name not in self.history.sessions:
+                    self.last_error = "Client is not authorized"
+                else:
+                    await self.history.monitor_messages(self.session_name, self)
+
+                self.failures += 1
+                if self.failures > self.max_failures:
+                    self.status = FAILED
+                    logger.error(f"Giving up on {self.session_name} after {self.max_failures} "
+                                 f"failed reconnects: {self.last_error}")
+                    return
+
+                delay = self.backoff()
+                self.status = RECONNECTING
+                logger.warning(f"Session {self.session_name} disconnected, reconnecting in {delay:.1f}s "
+                               f"(attempt {self.failures})")
+                await asyncio.sleep(delay)
+                self.reconnects += 1
+        finally:
+            self.on_disconnected()
+            if self.status != FAILED:
+                self.status = STOPPED
+            if self.history.monitoring_tasks.get(self.session_name) is asyncio.current_task():
+                del self.history.monitoring_tasks[self.session_name]
+
+    def stats(self) -> dict:
+        uptime = self.uptime
+        if self.connected_at is not None:
+            uptime += time.monotonic() - self.connected_at
+        return {
+            "status": self.status,
+            "uptime_s": round(uptime, 1),
+            "connected_since": self.connected_since,
+            "reconnects": self.reconnects,
+            "consecutive_failures": self.failures,
+            "caught_up_messages": self.caught_up,
+            "last_error": self.last_error,
+        }
@@ -1,7 +1,22 @@
+from sqlalchemy import insert, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.future import select
 from sqlalchemy.exc import NoResultFound
 from decorators.db_session import db_session
 
+BULK_CHUNK_SIZE = 500
+
+
+def chunked(items: list, size: int = BULK_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def dialect_insert(session, table):
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
 
 class AsyncCRUD:
     def __init__(self, model):
@@ -48,3 +63,63 @@ class AsyncCRUD:
 
         except NoResultFound:
             return None
+
+    # Set-based variants: chunked statements that return affected-row counts and
+    # never load ORM instances.
+    @db_session
+    async def create_many(self, session, rows: list) -> int:
+        for chunk in chunked(rows):
+            await session.execute(insert(self.model.__table__), chunk)
+        await session.commit()
+        return len(rows)
+
+    @db_session
+    async def update_many(self, session, ids: list, **values) -> int:
+        affected = 0
+        for chunk in chunked(list(dict.fromkeys(ids))):
+            result = await session.execute(
+                update(self.model.__table__).where(self.model.__table__.c.id.in_(chunk)).values(**values)
+            )
+            affected += result.rowcount
+        await session.commit()
+        return affected
+
+    @db_session
+    async def delete_many(self, session, ids: list) -> int:
+        affected = 0
+        for chunk in chunked(list(dict.fromkeys(ids))):
+            result = await session.execute(delete(self.model.__table__).where(self.model.__table__.c.id.in_(chunk)))
+            affected += result.rowcount
+        await session.commit()
+        return affected
+
+    @db_session
+    async def upsert_many(self, session, rows: list, index_elements: list = None,
+                          update_columns: list = None) -> int:
+        # Conflicts on index_elements (the primary key by default) update
+        # update_columns (every other column present in the rows by default) plus
+        # the columns that have an onupdate default. An empty update_columns
+        # turns the upsert into INSERT ... ON CONFLICT DO NOTHING.
+        if not rows:
+            return 0
+        table = self.model.__table__
+        if index_elements is None:
+            index_elements = [column.name for column in table.primary_key]
+        if update_columns is None:
+            update_columns = [name for name in rows[0] if name not in index_elements]
+
+        affected = 0
+        for chunk in chunked(rows):
+            stmt = dialect_insert(session, table).values(chunk)
+            if update_columns:
+                set_ = {name: stmt.excluded[name] for name in update_columns}
+                for column in table.columns:
+                    if column.onupdate is not None and not column.onupdate.is_callable and column.name not in set_:
+                        set_[column.name] = column.onupdate.arg
+                stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+            result = await session.execute(stmt)
+            affected += result.rowcount
+        await session.commit()
+        return affected
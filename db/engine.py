@@ -1,6 +1,8 @@
 import logging
 import os
+from contextvars import ContextVar
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -16,4 +18,15 @@ async_session = sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession
 )
 
+# Set to a one-item list to count pool checkouts made in the current context.
+pool_checkouts = ContextVar("pool_checkouts", default=None)
+
+
+@event.listens_for(engine.sync_engine.pool, "checkout")
+def count_checkout(*args):
+    counter = pool_checkouts.get()
+    if counter is not None:
+        counter[0] += 1
+
+
 logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
@@ -7,6 +7,10 @@ from db.models.users import UserCRUD
 from db.models.user_event_messages import UserEventMessageCRUD
 from db.models.filters import UserFiltersCRUD
 from db.models.notification import NotificationCRUD
+from db.models.reconcile_state import ReconcileStateCRUD
+from db.models.media import MediaFileCRUD
+from db.models.backfill import BackfillCheckpointCRUD
+from db.models.telegram_session import TelegramSessionCRUD
 
 
 class DB:
@@ -19,3 +23,7 @@ class DB:
     userFilter_crud = UserFiltersCRUD()
     userEventMessage_crud = UserEventMessageCRUD()
     notification_crud = NotificationCRUD()
+    reconcile_state_crud = ReconcileStateCRUD()
+    media_crud = MediaFileCRUD()
+    backfill_crud = BackfillCheckpointCRUD()
+    telegram_session_crud = TelegramSessionCRUD()
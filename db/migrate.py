@@ -0,0 +1,242 @@
+import asyncio
+import re
+import sys
+import time
+
+from loguru import logger
+from sqlalchemy import Column, Integer, String, BigInteger, MetaData, inspect, select, text
+from sqlalchemy.schema import CreateTable
+
+from db.engine import engine, Base
+from db.models.associations import account_chat_association
+from db.models.users import User  # don`t remove this import
+from db.models.accounts import Account  # don`t remove this import
+from db.models.chats import Chat  # don`t remove this import
+from db.models.message import Message, MessageCRUD  # don`t remove this import
+from db.models.proxy import Proxy  # don`t remove this import
+from db.models.user_events import UserEvents  # don`t remove this import
+from db.models.user_event_messages import UserEventMessage  # don`t remove this import
+from db.models.filters import UserFilters  # don`t remove this import
+from db.models.notification import Notification  # don`t remove this import
+from db.models.reconcile_state import ReconcileState  # don`t remove this import
+from db.models.media import MediaFile  # don`t remove this import
+from db.models.backfill import BackfillCheckpoint  # don`t remove this import
+from db.models.telegram_session import TelegramSession  # don`t remove this import
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(BigInteger, nullable=False)
+
+
+def column_names(conn, table: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+async def add_proxy_health_columns(conn, dialect: str):
+    existing = await conn.run_sync(column_names, "proxy")
+    true = "true" if dialect == "postgresql" else "1"
+    columns = {
+        "latency_ms": "INTEGER",
+        "error_rate": "FLOAT NOT NULL DEFAULT 0",
+        "last_checked_at": "BIGINT",
+        "is_healthy": f"BOOLEAN NOT NULL DEFAULT {true}",
+    }
+    for name, ddl in columns.items():
+        if name not in existing:
+            await conn.execute(text(f"ALTER TABLE proxy ADD COLUMN {name} {ddl}"))
+
+
+async def fix_message_column_types(conn, dialect: str):
+    # messages.chat_id was a VARCHAR pointing at the INTEGER chats.id, and
+    # account_id an INTEGER pointing at the VARCHAR accounts.id. Telegram chat ids
+    # do not fit in 32 bits, so every chat id column becomes BIGINT.
+    if dialect == "postgresql":
+        await conn.execute(text("ALTER TABLE chats ALTER COLUMN id TYPE BIGINT"))
+        await conn.execute(text("ALTER TABLE account_chat_association ALTER COLUMN chat_id TYPE BIGINT"))
+        await conn.execute(text("ALTER TABLE messages ALTER COLUMN chat_id TYPE BIGINT USING chat_id::bigint"))
+        await conn.execute(text("ALTER TABLE messages ALTER COLUMN account_id TYPE VARCHAR USING account_id::varchar"))
+        return
+
+    # SQLite integers are always 64-bit, so only the VARCHAR chat_id needs fixing.
+    await rebuild_sqlite_table(conn, Message.__table__, {"chat_id": "CAST(chat_id AS INTEGER)",
+                                                         "account_id": "CAST(account_id AS TEXT)"})
+
+
+async def rebuild_sqlite_table(conn, table, values: dict):
+    # SQLite cannot change a column type in place: copy into a new table and swap.
+    # `values` maps column names to the SQL expression that converts them.
+    metadata = MetaData()
+    for referenced in {foreign_key.column.table for foreign_key in table.foreign_keys}:
+        referenced.to_metadata(metadata)
+    rebuilt = table.to_metadata(metadata, name=f"{table.name}_rebuilt")
+    await conn.execute(text(f"DROP TABLE IF EXISTS {rebuilt.name}"))
+    await conn.execute(CreateTable(rebuilt))
+
+    existing = await conn.run_sync(column_names, table.name)
+    names = [column.name for column in rebuilt.columns if column.name in existing]
+    await conn.execute(text(f"INSERT INTO {rebuilt.name} ({', '.join(names)}) "
+                            f"SELECT {', '.join(values.get(name, name) for name in names)} FROM {table.name}"))
+    await conn.execute(text(f"DROP TABLE {table.name}"))
+    await conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+
+
+async def fix_association_account_id(conn, dialect: str):
+    # account_chat_association.account_id was an INTEGER pointing at the VARCHAR
+    # accounts.id, while add_account_to_chats writes phone numbers into it.
+    if dialect == "postgresql":
+        await conn.execute(text("ALTER TABLE account_chat_association ALTER COLUMN account_id "
+                                "TYPE VARCHAR USING account_id::varchar"))
+        return
+
+    # SQLite stored '+79991234567' as the integer 79991234567; give it its plus back.
+    await rebuild_sqlite_table(conn, account_chat_association, {"account_id": (
+        "CASE WHEN typeof(account_id) = 'integer' AND '+' || account_id IN (SELECT id FROM accounts) "
+        "THEN '+' || account_id ELSE CAST(account_id AS TEXT) END"
+    )})
+
+
+async def create_indexes(conn, dialect: str, indexes: list):
+    for name, columns in indexes:
+        columns = ", ".join(columns)
+        if dialect == "postgresql":
+            # A failed concurrent build leaves an invalid index behind; rebuild it.
+            invalid = await conn.execute(text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+            ), {"name": name})
+            if invalid.first() is not None:
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            await conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON messages ({columns})"))
+        else:
+            await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON messages ({columns})"))
+
+
+async def drop_indexes(conn, dialect: str, names: list):
+    concurrently = " CONCURRENTLY" if dialect == "postgresql" else ""
+    for name in names:
+        await conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS {name}"))
+
+
+# Index lists are spelled out per migration, so later changes to MESSAGE_INDEXES
+# never alter what an already released migration does.
+async def create_message_indexes(conn, dialect: str):
+    await create_indexes(conn, dialect, [
+        ("ix_messages_account_created", ["account_id", "created_at"]),
+        ("ix_messages_account_chat_created", ["account_id", "chat_id", "created_at"]),
+        ("ix_messages_account_chat_message", ["account_id", "chat_id", "message_id"]),
+        ("ix_messages_sender_created", ["sender_username", "created_at"]),
+    ])
+
+
+async def add_message_keyset_indexes(conn, dialect: str):
+    # Keyset pages order by (created_at, id); the id suffix lets the index serve
+    # both the cursor predicate and the ORDER BY without a sort.
+    await create_indexes(conn, dialect, [
+        ("ix_messages_account_created_id", ["account_id", "created_at", "id"]),
+        ("ix_messages_account_chat_created_id", ["account_id", "chat_id", "created_at", "id"]),
+        ("ix_messages_sender_created_id", ["sender_username", "created_at", "id"]),
+        ("ix_messages_created_id", ["created_at", "id"]),
+    ])
+    await drop_indexes(conn, dialect, [
+        "ix_messages_account_created", "ix_messages_account_chat_created", "ix_messages_sender_created",
+    ])
+
+
+# (version, name, function, needs_autocommit). Append only; never renumber.
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction, so those steps run
+# in autocommit mode.
+MIGRATIONS = [
+    (1, "proxy_health_columns", add_proxy_health_columns, False),
+    (2, "message_column_types", fix_message_column_types, False),
+    (3, "message_indexes", create_message_indexes, True),
+    (4, "message_keyset_indexes", add_message_keyset_indexes, True),
+    (5, "association_account_id_type", fix_association_account_id, False),
+]
+
+
+async def current_version(conn) -> int:
+    result = await conn.execute(select(SchemaVersion.version).order_by(SchemaVersion.version.desc()).limit(1))
+    return result.scalar() or 0
+
+
+async def record_version(conn, version: int, name: str):
+    await conn.execute(SchemaVersion.__table__.insert().values(version=version, name=name,
+                                                               applied_at=int(time.time())))
+
+
+async def migrate():
+    dialect = engine.dialect.name
+    async with engine.begin() as conn:
+        fresh = not await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("messages"))
+        # Creates tables that do not exist yet, with the current column types and indexes.
+        await conn.run_sync(Base.metadata.create_all)
+        version = await current_version(conn)
+        if fresh:
+            for migration_version, name, _, _ in MIGRATIONS:
+                await record_version(conn, migration_version, name)
+            logger.info(f"Created schema at version {MIGRATIONS[-1][0]}")
+            return
+
+    for migration_version, name, migration, needs_autocommit in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        started = time.monotonic()
+        if needs_autocommit:
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await migration(conn, dialect)
+                await record_version(conn, migration_version, name)
+        else:
+            async with engine.begin() as conn:
+                await migration(conn, dialect)
+                await record_version(conn, migration_version, name)
+        logger.info(f"Applied migration {migration_version} {name} in {time.monotonic() - started:.1f}s")
+
+
+FULL_SCAN_PATTERNS = {"postgresql": r"Seq Scan on messages", "sqlite": r"SCAN messages(?! USING (COVERING )?INDEX)"}
+
+
+def hot_queries() -> dict:
+    # Same filters and keyset ordering as the MessageCRUD methods behind the busiest endpoints.
+    page = MessageCRUD.keyset_page
+    cursor = (10 ** 9, 1000)
+    return {
+        "new_messages_poll": page(select(Message).where(Message.account_id.in_(["+1", "+2"])), after=cursor),
+        "history_messages": page(select(Message).where(Message.account_id.in_(["+1", "+2"])), before=cursor),
+        "history_messages_all_accounts": page(select(Message), before=cursor),
+        "filtered_messages_by_username": page(select(Message).where(Message.sender_username == "user",
+                                                                    Message.created_at >= 0), before=cursor),
+        "messages_by_chat_and_time": select(Message).where(Message.chat_id == 1, Message.created_at >= 0,
+                                                           Message.created_at <= 10 ** 10,
+                                                           Message.account_id == "+1"),
+        "mark_deleted": select(Message.id).where(Message.account_id == "+1", Message.chat_id == 1,
+                                                 Message.message_id.in_([1, 2, 3])),
+    }
+
+
+async def check_indexes() -> bool:
+    # EXPLAIN every hot query and fail if one scans the whole messages table.
+    dialect = engine.dialect.name
+    ok = True
+    async with engine.connect() as conn:
+        if dialect == "postgresql":
+            # Small tables are always cheaper to scan; only index availability matters here.
+            await conn.execute(text("SET enable_seqscan = off"))
+        for name, query in hot_queries().items():
+            compiled = query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+            prefix = "EXPLAIN" if dialect == "postgresql" else "EXPLAIN QUERY PLAN"
+            result = await conn.execute(text(f"{prefix} {compiled}"))
+            plan = "\n".join(str(row[-1]) for row in result.all())
+            scans = bool(re.search(FULL_SCAN_PATTERNS.get(dialect, FULL_SCAN_PATTERNS["sqlite"]), plan))
+            ok = ok and not scans
+            logger.info(f"{'FULL SCAN' if scans else 'ok'}: {name}\n{plan}")
+    return ok
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["check"]:
+        sys.exit(0 if asyncio.run(check_indexes()) else 1)
+    asyncio.run(migrate())
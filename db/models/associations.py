@@ -1,10 +1,10 @@
-from sqlalchemy import Table, Column, ForeignKey, Integer
+from sqlalchemy import Table, Column, ForeignKey, String, BigInteger
 from db.engine import Base
 
 
 account_chat_association = Table(
     'account_chat_association',
     Base.metadata,
-    Column('account_id', Integer, ForeignKey('accounts.id'), primary_key=True),
-    Column('chat_id', Integer, ForeignKey('chats.id'), primary_key=True)
+    Column('account_id', String, ForeignKey('accounts.id'), primary_key=True),
+    Column('chat_id', BigInteger, ForeignKey('chats.id'), primary_key=True)
 )
\ No newline at end of file
@@ -0,0 +1,84 @@
+from sqlalchemy import Column, Integer, String, BigInteger, Boolean, func, select, update
+
+from db.crud import AsyncCRUD, dialect_insert
+from db.engine import Base
+from decorators.db_session import db_session
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class BackfillCheckpoint(Base):
+    __tablename__ = "backfill_checkpoints"
+    account_id = Column(String, primary_key=True)
+    chat_id = Column(BigInteger, primary_key=True)
+    status = Column(String, nullable=False, default=PENDING)
+    since = Column(BigInteger, nullable=True)
+    max_messages = Column(Integer, nullable=True)
+    apply_rules = Column(Boolean, nullable=False, default=True)
+    offset_id = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(BigInteger, nullable=False, default=func.extract('epoch', func.now()))
+    updated_at = Column(BigInteger, nullable=False, default=func.extract('epoch', func.now()),
+                        onupdate=func.extract('epoch', func.now()))
+
+    def to_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+
+class BackfillCheckpointCRUD(AsyncCRUD):
+    def __init__(self):
+        super().__init__(BackfillCheckpoint)
+
+    @db_session
+    async def schedule(self, session, account_id: str, chat_ids: list, since: int = None,
+                       max_messages: int = None, apply_rules: bool = True):
+        rows = [{'account_id': account_id, 'chat_id': chat_id, 'status': PENDING, 'since': since,
+                 'max_messages': max_messages, 'apply_rules': apply_rules, 'offset_id': 0,
+                 'processed': 0, 'inserted': 0}
+                for chat_id in dict.fromkeys(chat_ids)]
+        if not rows:
+            return
+        stmt = dialect_insert(session, BackfillCheckpoint).values(rows)
+        # Finished or failed chats start over, chats still in progress keep their cursor.
+        stmt = stmt.on_conflict_do_nothing(index_elements=[BackfillCheckpoint.account_id, BackfillCheckpoint.chat_id])
+        await session.execute(stmt)
+        await session.execute(
+            update(BackfillCheckpoint)
+            .where(BackfillCheckpoint.account_id == account_id,
+                   BackfillCheckpoint.chat_id.in_([row['chat_id'] for row in rows]),
+                   BackfillCheckpoint.status.in_([DONE, FAILED]))
+            .values(status=PENDING, since=since, max_messages=max_messages, apply_rules=apply_rules,
+                    offset_id=0, processed=0, inserted=0, total=None, error=None)
+        )
+        await session.commit()
+
+    @db_session
+    async def get_unfinished(self, session, account_id: str) -> list:
+        result = await session.execute(
+            select(BackfillCheckpoint).where(BackfillCheckpoint.account_id == account_id,
+                                             BackfillCheckpoint.status.in_([PENDING, RUNNING]))
+        )
+        return result.scalars().all()
+
+    @db_session
+    async def get_for_account(self, session, account_id: str = None) -> list:
+        query = select(BackfillCheckpoint)
+        if account_id is not None:
+            query = query.where(BackfillCheckpoint.account_id == account_id)
+        result = await session.execute(query.order_by(BackfillCheckpoint.account_id, BackfillCheckpoint.chat_id))
+        return result.scalars().all()
+
+    @db_session
+    async def save(self, session, account_id: str, chat_id: int, **values):
+        await session.execute(
+            update(BackfillCheckpoint)
+            .where(BackfillCheckpoint.account_id == account_id, BackfillCheckpoint.chat_id == chat_id)
+            .values(**values)
+        )
+        await session.commit()
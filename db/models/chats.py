@@ -1,11 +1,11 @@
 from operator import and_
 from typing import List, Optional
 
-from sqlalchemy import Column, Integer, String, select, BigInteger, func
+from sqlalchemy import Column, String, select, BigInteger, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import relationship, joinedload, aliased
 from db.engine import Base
-from db.crud import AsyncCRUD
+from db.crud import AsyncCRUD, chunked, dialect_insert
 from pydantic import BaseModel
 
 from db.models.accounts import Account
@@ -30,10 +30,19 @@ class ChatModel(BaseModel):
         from_attributes = True
 
 
+# Private chats and basic groups share one message_id sequence per account;
+# channels and supergroups number their messages on their own.
+PRIVATE_CHAT = 'Private chat'
+BASIC_GROUP = 'Group'
+SUPERGROUP = 'Supergroup'
+CHANNEL = 'Channel'
+NON_CHANNEL_CHAT_TYPES = (PRIVATE_CHAT, BASIC_GROUP)
+
+
 class Chat(Base):
     __tablename__ = "chats"
 
-    id = Column(Integer, primary_key=True, autoincrement=False)
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
     chat_title = Column(String, nullable=True)
     chat_username = Column(String, nullable=True)
     chat_type = Column(String, nullable=True)
@@ -63,6 +72,28 @@ class ChatCRUD(AsyncCRUD):
         await session.commit()
         return instance
 
+    @db_session
+    async def upsert_many(self, session, rows: list) -> dict:
+        rows = list({row['id']: row for row in rows}.values())
+        existing_count = 0
+        for chunk in chunked([row['id'] for row in rows]):
+            existing = await session.execute(select(Chat.id).where(Chat.id.in_(chunk)))
+            existing_count += len(existing.scalars().all())
+        await super().upsert_many(rows, update_columns=['chat_title', 'chat_username', 'chat_type'])
+        return {"inserted": len(rows) - existing_count, "updated": existing_count}
+
+    @db_session
+    async def add_account_to_chats(self, session, chat_ids: list, account_id) -> int:
+        linked = 0
+        for chunk in chunked(list(dict.fromkeys(chat_ids))):
+            stmt = dialect_insert(session, account_chat_association).values(
+                [{'account_id': account_id, 'chat_id': chat_id} for chat_id in chunk]
+            ).on_conflict_do_nothing()
+            result = await session.execute(stmt)
+            linked += result.rowcount
+        await session.commit()
+        return linked
+
     @db_session
     async def get_chats_for_account(self, session: AsyncSession, account_id: int):
         # Fetch chats associated with the account
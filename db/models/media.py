@@ -0,0 +1,65 @@
+from sqlalchemy import Column, Integer, String, BigInteger, func, select, update
+
+from db.crud import AsyncCRUD
+from db.engine import Base
+from db.models.message import Message
+from decorators.db_session import db_session
+
+
+class MediaFile(Base):
+    __tablename__ = "media_files"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sha256 = Column(String(64), nullable=False, unique=True, index=True)
+    path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    mime_type = Column(String, nullable=True)
+    created_at = Column(BigInteger, nullable=False, default=func.extract('epoch', func.now()))
+    last_accessed_at = Column(BigInteger, nullable=False, default=func.extract('epoch', func.now()))
+
+    def to_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+
+class MediaFileCRUD(AsyncCRUD):
+    def __init__(self):
+        super().__init__(MediaFile)
+
+    @db_session
+    async def get_by_hash(self, session, sha256: str) -> MediaFile | None:
+        result = await session.execute(select(MediaFile).where(MediaFile.sha256 == sha256))
+        return result.scalars().one_or_none()
+
+    @db_session
+    async def touch(self, session, media_id: int):
+        await session.execute(update(MediaFile).where(MediaFile.id == media_id)
+                              .values(last_accessed_at=func.extract('epoch', func.now())))
+        await session.commit()
+
+    @db_session
+    async def total_size(self, session) -> int:
+        result = await session.execute(select(func.coalesce(func.sum(MediaFile.size), 0)))
+        return result.scalar()
+
+    @db_session
+    async def get_least_recently_used(self, session, limit: int, exclude_id: int = None) -> list:
+        query = select(MediaFile).order_by(MediaFile.last_accessed_at, MediaFile.id).limit(limit)
+        if exclude_id is not None:
+            query = query.where(MediaFile.id != exclude_id)
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @db_session
+    async def delete_many(self, session, media_ids: list) -> int:
+        await session.execute(update(Message).where(Message.photo_id.in_(media_ids)).values(photo_id=None))
+        return await super().delete_many(media_ids)
+
+    @db_session
+    async def link_message(self, session, media_id: int, account_id: str, chat_id: int, message_id: int) -> int:
+        result = await session.execute(
+            update(Message).where(Message.account_id == account_id,
+                                  Message.chat_id == chat_id,
+                                  Message.message_id == message_id)
+            .values(photo_id=media_id).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount
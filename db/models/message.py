@@ -2,13 +2,14 @@ from typing import Optional
 
 from pydantic import BaseModel
 from sqlalchemy import (
-    Column, ForeignKey, Integer, String, select, or_, func, and_, Boolean, BigInteger
+    Column, ForeignKey, Integer, String, select, or_, func, and_, Boolean, BigInteger, update, bindparam, Index,
+    tuple_
 )
 from sqlalchemy.orm import relationship, joinedload
 
-from db.crud import AsyncCRUD
+from db.crud import AsyncCRUD, chunked
 from db.engine import Base
-from db.models.chats import ChatCRUD
+from db.models.chats import ChatCRUD, Chat, NON_CHANNEL_CHAT_TYPES
 from decorators.db_session import db_session
 
 
@@ -16,7 +17,7 @@ class MessageModel(BaseModel):
     id: int
     text: str
     chat_id: int
-    account_id: int
+    account_id: str
     chat_title: str
     chat_id: int
     before_update_text: str
@@ -31,7 +32,7 @@ class MessageModel(BaseModel):
 class MessageCreateModel(BaseModel):
     text: str
     chat_id: int
-    account_id: int
+    account_id: str
     sender_user_id: int
     sender_username: str
 
@@ -49,14 +50,30 @@ class FilterModel(BaseModel):
                 'startswith': self.startswith}
 
 
+MESSAGE_PAGE_SIZE = 100
+MESSAGE_PAGE_MAX = 500
+
+# Every hot query filters on account_id (or sender_username) first and then on a
+# created_at range ordered by (created_at, id); reconciliation and change tracking
+# look rows up by message_id.
+MESSAGE_INDEXES = (
+    Index("ix_messages_account_created_id", "account_id", "created_at", "id"),
+    Index("ix_messages_account_chat_created_id", "account_id", "chat_id", "created_at", "id"),
+    Index("ix_messages_account_chat_message", "account_id", "chat_id", "message_id"),
+    Index("ix_messages_sender_created_id", "sender_username", "created_at", "id"),
+    Index("ix_messages_created_id", "created_at", "id"),
+)
+
+
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = MESSAGE_INDEXES
     id = Column(Integer, primary_key=True, autoincrement=True)
     text = Column(String)
-    chat_id = Column(String, ForeignKey("chats.id"))
+    chat_id = Column(BigInteger, ForeignKey("chats.id"))
     message_id = Column(Integer)
     chat_title = Column(String)
-    account_id = Column(Integer, ForeignKey("accounts.id"))
+    account_id = Column(String, ForeignKey("accounts.id"))
     sender_user_id = Column(Integer)
     sender_username = Column(String)
     photo_id = Column(Integer)
@@ -80,50 +97,129 @@ class MessageCRUD(AsyncCRUD):
         super().__init__(Message)
 
     @db_session
-    async def get_messages_by_ids(self, session, ids: list):
-        messages = []
-        for id_ in ids:
-            result = await session.execute(select(Message).filter(Message.id == id_))
-            res = result.scalars().one_or_none()
-            messages.extend(res)
-        return messages
+    async def mark_deleted(self, session, account_id: str, chat_id: Optional[int], message_ids: list) -> int:
+        query = update(Message).where(Message.account_id == account_id,
+                                      Message.message_id.in_(message_ids),
+                                      Message.is_deleted.is_not(True))
+        if chat_id is not None:
+            query = query.where(Message.chat_id == chat_id)
+        else:
+            # Telegram leaves the chat out only for private chats and basic groups;
+            # channel and supergroup messages can reuse the same message_ids.
+            query = query.where(Message.chat_id.in_(
+                select(Chat.id).where(Chat.chat_type.in_(NON_CHANNEL_CHAT_TYPES))
+            ))
+        result = await session.execute(query.values(is_deleted=True).execution_options(synchronize_session=False))
+        await session.commit()
+        return result.rowcount
 
     @db_session
-    async def set_messages_deleted(self, session, ids: list):
-        messages = [
-            (await session.execute(select(Message).filter(Message.id == id_))).scalars().one_or_none()
-            for id_ in ids
-        ]
-
-        for message in messages:
-            message.is_deleted = True
+    async def apply_edits(self, session, account_id: str, edits: list) -> int:
+        if not edits:
+            return 0
+        table = Message.__table__
+        query = update(table).where(
+            table.c.account_id == account_id,
+            table.c.chat_id == bindparam("b_chat_id"),
+            table.c.message_id == bindparam("b_message_id"),
+            table.c.text != bindparam("b_text"),
+        ).values(before_update_text=table.c.text, text=bindparam("b_text"), is_updated=True)
+        result = await session.execute(query, [{"b_chat_id": edit["chat_id"],
+                                                "b_message_id": edit["message_id"],
+                                                "b_text": edit["text"]} for edit in edits])
         await session.commit()
-        return messages
+        return result.rowcount
 
     @db_session
-    async def get_filtered_messages(self, session, username: Optional[str],
-                                    chat_id: Optional[int],
-                                    start_time: float,
-                                    end_time: Optional[float]):
-        query = select(Message)
-        if username:
-            query = query.filter(Message.sender_username == username)
-        if chat_id:
-            query = query.filter(Message.chat_id == chat_id)
-        query = query.filter(Message.created_at >= start_time)
-        if end_time:
-            query = query.filter(Message.created_at <= end_time)
+    async def get_existing_message_ids(self, session, account_id: str, chat_id: int, message_ids: list) -> set:
+        result = await session.execute(select(Message.message_id).where(Message.account_id == account_id,
+                                                                        Message.chat_id == chat_id,
+                                                                        Message.message_id.in_(message_ids)))
+        return set(result.scalars().all())
+
+    @db_session
+    async def get_message_id_range(self, session, account_id: str, chat_id: int, start_time: float,
+                                   end_time: float, after_message_id: int = 0) -> tuple:
+        result = await session.execute(
+            select(func.min(Message.message_id), func.max(Message.message_id)).where(
+                Message.account_id == account_id,
+                Message.chat_id == chat_id,
+                Message.created_at >= start_time,
+                Message.created_at <= end_time,
+                Message.message_id > after_message_id
+            )
+        )
+        return result.one()
 
+    @db_session
+    async def get_messages_page(self, session, account_id: str, chat_id: int, start_time: float,
+                                end_time: float, after_message_id: int, limit: int) -> list:
+        query = select(Message).where(
+            Message.account_id == account_id,
+            Message.chat_id == chat_id,
+            Message.created_at >= start_time,
+            Message.created_at <= end_time,
+            Message.message_id > after_message_id
+        ).order_by(Message.message_id).limit(limit)
         result = await session.execute(query)
         return result.scalars().all()
 
     @db_session
-    async def get_new_messages_async(self, session, filters: dict, last_sent_time: float, account_ids: list):
+    async def get_changed_messages(self, session, account_id: str, chat_ids: list, start_time: float,
+                                   end_time: float) -> list:
         query = select(Message).where(
-            Message.created_at > last_sent_time,
-            Message.account_id.in_(account_ids)
-        ).options(joinedload(Message.chat))
+            Message.account_id == account_id,
+            Message.chat_id.in_(chat_ids),
+            Message.created_at >= start_time,
+            Message.created_at <= end_time,
+            or_(Message.is_deleted.is_(True), Message.is_updated.is_(True))
+        )
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @staticmethod
+    def in_id_order(messages: list, ids: list) -> list:
+        by_id = {message.id: message for message in messages}
+        return [by_id[id_] for id_ in ids if id_ in by_id]
+
+    @db_session
+    async def get_messages_by_ids(self, session, ids: list) -> list:
+        # Returned in the order of ids, each message once; unknown ids are skipped.
+        ids = list(dict.fromkeys(ids))
+        messages = []
+        for chunk in chunked(ids):
+            result = await session.execute(select(Message).where(Message.id.in_(chunk)))
+            messages.extend(result.scalars().all())
+        return self.in_id_order(messages, ids)
 
+    @db_session
+    async def set_messages_deleted(self, session, ids: list) -> list:
+        ids = list(dict.fromkeys(ids))
+        messages = []
+        for chunk in chunked(ids):
+            result = await session.execute(
+                update(Message).where(Message.id.in_(chunk)).values(is_deleted=True).returning(Message)
+                .execution_options(synchronize_session=False)
+            )
+            messages.extend(result.scalars().all())
+        await session.commit()
+        return self.in_id_order(messages, ids)
+
+    @staticmethod
+    def keyset_page(query, before: tuple = None, after: tuple = None, limit: int = MESSAGE_PAGE_SIZE):
+        # Pages over (created_at, id): newest first below `before`, oldest first
+        # above `after`. The id breaks ties between messages of the same second.
+        limit = max(1, min(limit or MESSAGE_PAGE_SIZE, MESSAGE_PAGE_MAX))
+        key = tuple_(Message.created_at, Message.id)
+        if after is not None:
+            return query.where(key > tuple_(*after)).order_by(Message.created_at, Message.id).limit(limit)
+        if before is not None:
+            query = query.where(key < tuple_(*before))
+        return query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit)
+
+    @staticmethod
+    async def filter_conditions(filters: dict) -> list | None:
+        # Returns None when a chat_title filter matches no chat, so nothing can match.
         conditions = []
 
         if filters.get("username"):
@@ -133,19 +229,16 @@ class MessageCRUD(AsyncCRUD):
                 conditions.append(Message.sender_username.in_(filters["username"]))
 
         if filters.get("chat_title"):
+            titles = filters["chat_title"] if isinstance(filters["chat_title"], list) else [filters["chat_title"]]
             chat_crud = ChatCRUD()
-            if isinstance(filters["chat_title"], str):
-                chat = await chat_crud.get_by_title(session, filters["chat_title"])
+            chat_ids = []
+            for chat_title in titles:
+                chat = await chat_crud.get_by_title(chat_title)
                 if chat:
-                    conditions.append(Message.chat_id == chat.id)
-            elif isinstance(filters["chat_title"], list):
-                chat_ids = []
-                for chat_title in filters["chat_title"]:
-                    chat = await chat_crud.get_by_title(session, chat_title)
-                    if chat:
-                        chat_ids.append(chat.id)
-                if chat_ids:
-                    conditions.append(Message.chat_id.in_(chat_ids))
+                    chat_ids.append(chat.id)
+            if not chat_ids:
+                return None
+            conditions.append(Message.chat_id.in_(chat_ids))
 
         if filters.get("content"):
             if isinstance(filters["content"], list):
@@ -161,63 +254,49 @@ class MessageCRUD(AsyncCRUD):
                 start_conditions = [Message.text.startswith(prefix) for prefix in filters["startswith"]]
                 conditions.append(or_(*start_conditions))
 
-        if conditions:
-            query = query.where(and_(*conditions))
-
-        result = await session.execute(query)
-        messages = result.scalars().all()
-
-        return messages
+        return conditions
 
     @db_session
-    async def get_history_messages(self, session, filters: dict, account_ids: str, timestamp: int, limit: int):
-
-        query = select(Message).filter(Message.account_id.in_(account_ids),
-                                       Message.created_at < timestamp).order_by(Message.created_at.desc())
-
-        conditions = []
-        if filters["username"] is not None:
-            if isinstance(filters["username"], str):
-                conditions.append(Message.sender_username == filters["username"])
-            elif isinstance(filters["username"], list):
-                conditions.append(Message.sender_username.in_(filters["username"]))
-
-        if filters["chat_title"] is not None:
-            chat_crud = ChatCRUD()
-            if isinstance(filters["chat_title"], str):
-                chat = await chat_crud.get_by_title(filters["chat_title"])
-                conditions.append(Message.chat_id == chat.id)
-            elif isinstance(filters["chat_title"], list):
-                chat_id_s = []
-                for chat_title in filters["chat_title"]:
-                    chat = await chat_crud.get_by_title(chat_title)
-                    chat_id_s.append(chat.id)
-
-                conditions.append(Message.chat_id.in_(chat_id_s))
-
-        if filters["content"] is not None:
-            if isinstance(filters["content"], list):
-                content_conditions = [Message.text.contains(content_str) for content_str in filters["content"]]
-                conditions.append(or_(*content_conditions))
-            elif isinstance(filters["content"], str):
-                conditions.append(Message.text.contains(filters["content"]))
+    async def get_filtered_messages(self, session, username: Optional[str],
+                                    chat_id: Optional[int],
+                                    start_time: float,
+                                    end_time: Optional[float],
+                                    before: tuple = None,
+                                    limit: int = MESSAGE_PAGE_SIZE):
+        query = select(Message)
+        if username:
+            query = query.filter(Message.sender_username == username)
+        if chat_id:
+            query = query.filter(Message.chat_id == chat_id)
+        query = query.filter(Message.created_at >= start_time)
+        if end_time:
+            query = query.filter(Message.created_at <= end_time)
 
-        if filters["startswith"] is not None:
-            if isinstance(filters["startswith"], str):
-                conditions.append(Message.text.like(f'{filters["startswith"]}%'))
-            elif isinstance(filters["startswith"], list):
-                start_conditions = [Message.text.startswith(prefix) for prefix in filters["startswith"]]
-                conditions.append(or_(*start_conditions))
+        result = await session.execute(self.keyset_page(query, before=before, limit=limit))
+        return result.scalars().all()
 
-        if len(conditions) > 0:
-            query = (select(Message).where(Message.account_id.in_(account_ids),
-                                           Message.created_at < timestamp, and_(*conditions))
-                     .order_by(Message.created_at.desc()))
+    @db_session
+    async def get_new_messages_async(self, session, filters: dict, after: tuple, account_ids: list,
+                                     limit: int = MESSAGE_PAGE_MAX):
+        conditions = await self.filter_conditions(filters)
+        if conditions is None:
+            return []
+        query = select(Message).where(Message.account_id.in_(account_ids), *conditions)
+        result = await session.execute(self.keyset_page(query, after=after, limit=limit)
+                                       .options(joinedload(Message.chat)))
+        return result.scalars().all()
 
-        result = await session.execute(query.limit(limit))
-        messages = result.scalars().all()
-        clear_data = sorted(messages, key=lambda m: m.created_at)
-        return clear_data
+    @db_session
+    async def get_history_messages(self, session, filters: dict, account_ids: list, timestamp: Optional[int],
+                                   limit: int, before: tuple = None):
+        conditions = await self.filter_conditions(filters)
+        if conditions is None:
+            return []
+        query = select(Message).where(Message.account_id.in_(account_ids), *conditions)
+        if before is None and timestamp is not None:
+            query = query.where(Message.created_at < timestamp)
+        result = await session.execute(self.keyset_page(query, before=before, limit=limit))
+        return result.scalars().all()
 
     @db_session
     async def get_all_messages(self, session, filters: dict) -> list:
@@ -1,11 +1,12 @@
 from typing import Optional
 
 from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, Boolean, func, select, BigInteger
+from sqlalchemy import Column, Integer, String, Boolean, Float, func, select, update, bindparam, BigInteger
 from sqlalchemy.orm import relationship
 
 from db.crud import AsyncCRUD
 from db.engine import Base
+from db.models.accounts import Account
 from decorators.db_session import db_session
 
 
@@ -41,6 +42,10 @@ class Proxy(Base):
     updated_at = Column(BigInteger, nullable=False, default=func.extract('epoch', func.now()),
                         onupdate=func.extract('epoch', func.now()))
     in_use = Column(Boolean, default=False)
+    latency_ms = Column(Integer, nullable=True)
+    error_rate = Column(Float, nullable=False, default=0.0)
+    last_checked_at = Column(BigInteger, nullable=True)
+    is_healthy = Column(Boolean, nullable=False, default=True)
 
     account = relationship("Account", back_populates="proxy")
 
@@ -67,3 +72,58 @@ class ProxyCRUD(AsyncCRUD):
         result = await session.execute(select(Proxy).where(Proxy.in_use.is_(False),
                                                            Proxy.location == location))
         return result.scalars().all()
+
+    @db_session
+    async def get_existing_keys(self, session, ips: list) -> set:
+        result = await session.execute(select(Proxy.ip, Proxy.port, Proxy.login).where(Proxy.ip.in_(set(ips))))
+        return {tuple(row) for row in result.all()}
+
+    @db_session
+    async def record_health(self, session, results: list) -> int:
+        if not results:
+            return 0
+        table = Proxy.__table__
+        query = update(table).where(table.c.id == bindparam("b_id")).values(
+            latency_ms=bindparam("b_latency_ms"),
+            error_rate=bindparam("b_error_rate"),
+            is_healthy=bindparam("b_is_healthy"),
+            last_checked_at=bindparam("b_checked_at"),
+        )
+        await session.execute(query, [{f"b_{key}": value for key, value in result.items()} for result in results])
+        await session.commit()
+        return len(results)
+
+    @db_session
+    async def lease_best(self, session, location: str, exclude_ids: list = None) -> Proxy | None:
+        query = select(Proxy.id).where(Proxy.in_use.is_(False),
+                                       Proxy.is_healthy.is_(True),
+                                       Proxy.location == location)
+        if exclude_ids:
+            query = query.where(Proxy.id.not_in(exclude_ids))
+        result = await session.execute(query.order_by(Proxy.latency_ms.is_(None), Proxy.latency_ms,
+                                                      Proxy.error_rate).limit(10))
+        # Compare-and-set on in_use, so two callers never lease the same proxy.
+        for proxy_id in result.scalars().all():
+            leased = await session.execute(
+                update(Proxy).where(Proxy.id == proxy_id, Proxy.in_use.is_(False))
+                .values(in_use=True).execution_options(synchronize_session=False)
+            )
+            if leased.rowcount == 1:
+                await session.commit()
+                return await session.get(Proxy, proxy_id)
+        return None
+
+    @db_session
+    async def reserve_assigned(self, session) -> int:
+        result = await session.execute(
+            update(Proxy).where(Proxy.in_use.is_(False),
+                                Proxy.id.in_(select(Account.proxy_id).where(Account.proxy_id.is_not(None))))
+            .values(in_use=True).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount
+
+    @db_session
+    async def release(self, session, proxy_id: int):
+        await session.execute(update(Proxy).where(Proxy.id == proxy_id).values(in_use=False))
+        await session.commit()
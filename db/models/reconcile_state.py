@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, BigInteger, func, select
+
+from db.crud import AsyncCRUD
+from db.engine import Base
+from decorators.db_session import db_session
+
+
+class ReconcileState(Base):
+    __tablename__ = "reconcile_state"
+    account_id = Column(String, primary_key=True)
+    chat_id = Column(BigInteger, primary_key=True)
+    last_message_id = Column(Integer, nullable=False, default=0)
+    checked_at = Column(BigInteger, nullable=False, default=func.extract('epoch', func.now()),
+                        onupdate=func.extract('epoch', func.now()))
+
+    def to_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+
+class ReconcileStateCRUD(AsyncCRUD):
+    def __init__(self):
+        super().__init__(ReconcileState)
+
+    @db_session
+    async def get_marks(self, session, account_id: str, chat_ids: list) -> dict:
+        result = await session.execute(
+            select(ReconcileState.chat_id, ReconcileState.last_message_id)
+            .where(ReconcileState.account_id == account_id, ReconcileState.chat_id.in_(chat_ids))
+        )
+        return {chat_id: last_message_id for chat_id, last_message_id in result.all()}
+
+    async def set_mark(self, account_id: str, chat_id: int, last_message_id: int):
+        await self.upsert_many([{'account_id': account_id, 'chat_id': chat_id, 'last_message_id': last_message_id}])
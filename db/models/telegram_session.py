@@ -0,0 +1,99 @@
+from sqlalchemy import Column, Integer, String, BigInteger, LargeBinary, func, select, delete
+
+from db.crud import AsyncCRUD, chunked, dialect_insert
+from db.engine import Base
+from decorators.db_session import db_session
+
+
+class TelegramSession(Base):
+    __tablename__ = "telegram_sessions"
+    name = Column(String, primary_key=True)
+    dc_id = Column(Integer, nullable=False, default=0)
+    server_address = Column(String, nullable=True)
+    port = Column(Integer, nullable=True)
+    auth_key = Column(LargeBinary, nullable=True)
+    takeout_id = Column(BigInteger, nullable=True)
+    updated_at = Column(BigInteger, nullable=False, default=func.extract('epoch', func.now()),
+                        onupdate=func.extract('epoch', func.now()))
+
+
+class TelegramSessionEntity(Base):
+    __tablename__ = "telegram_session_entities"
+    session_name = Column(String, primary_key=True)
+    id = Column(BigInteger, primary_key=True)
+    hash = Column(BigInteger, nullable=False)
+    username = Column(String, nullable=True)
+    phone = Column(String, nullable=True)
+    name = Column(String, nullable=True)
+
+
+class TelegramUpdateState(Base):
+    __tablename__ = "telegram_update_states"
+    session_name = Column(String, primary_key=True)
+    entity_id = Column(BigInteger, primary_key=True)
+    pts = Column(Integer, nullable=False)
+    qts = Column(Integer, nullable=False)
+    date = Column(BigInteger, nullable=False)
+    seq = Column(Integer, nullable=False)
+
+
+class TelegramSessionCRUD(AsyncCRUD):
+    def __init__(self):
+        super().__init__(TelegramSession)
+
+    @db_session
+    async def load(self, session, name: str) -> tuple:
+        session_row = await session.get(TelegramSession, name)
+        entities = await session.execute(
+            select(TelegramSessionEntity.id, TelegramSessionEntity.hash, TelegramSessionEntity.username,
+                   TelegramSessionEntity.phone, TelegramSessionEntity.name)
+            .where(TelegramSessionEntity.session_name == name)
+        )
+        states = await session.execute(
+            select(TelegramUpdateState.entity_id, TelegramUpdateState.pts, TelegramUpdateState.qts,
+                   TelegramUpdateState.date, TelegramUpdateState.seq)
+            .where(TelegramUpdateState.session_name == name)
+        )
+        return session_row, [tuple(row) for row in entities.all()], [tuple(row) for row in states.all()]
+
+    @db_session
+    async def save_state(self, session, name: str, values: dict = None, entities: list = None,
+                         states: list = None):
+        if values is not None:
+            stmt = dialect_insert(session, TelegramSession).values(name=name, **values)
+            stmt = stmt.on_conflict_do_update(index_elements=[TelegramSession.name],
+                                              set_={**values, 'updated_at': func.extract('epoch', func.now())})
+            await session.execute(stmt)
+
+        for chunk in chunked(entities or []):
+            stmt = dialect_insert(session, TelegramSessionEntity).values(
+                [{'session_name': name, 'id': id_, 'hash': hash_, 'username': username,
+                  'phone': str(phone) if phone is not None else None, 'name': entity_name}
+                 for id_, hash_, username, phone, entity_name in chunk]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[TelegramSessionEntity.session_name, TelegramSessionEntity.id],
+                set_={'hash': stmt.excluded.hash, 'username': stmt.excluded.username,
+                      'phone': stmt.excluded.phone, 'name': stmt.excluded.name}
+            )
+            await session.execute(stmt)
+
+        for chunk in chunked(states or []):
+            stmt = dialect_insert(session, TelegramUpdateState).values(
+                [{'session_name': name, 'entity_id': entity_id, 'pts': pts, 'qts': qts, 'date': date, 'seq': seq}
+                 for entity_id, pts, qts, date, seq in chunk]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[TelegramUpdateState.session_name, TelegramUpdateState.entity_id],
+                set_={'pts': stmt.excluded.pts, 'qts': stmt.excluded.qts,
+                      'date': stmt.excluded.date, 'seq': stmt.excluded.seq}
+            )
+            await session.execute(stmt)
+        await session.commit()
+
+    @db_session
+    async def delete_state(self, session, name: str):
+        for model in (TelegramUpdateState, TelegramSessionEntity):
+            await session.execute(delete(model).where(model.session_name == name))
+        await session.execute(delete(TelegramSession).where(TelegramSession.name == name))
+        await session.commit()
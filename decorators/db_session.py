@@ -1,8 +1,41 @@
+import asyncio
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from functools import wraps
 from db.engine import async_session
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
+current_session = ContextVar("current_session", default=None)
+
+
+class JoinedSession:
+    # Handed to CRUD calls running inside an open unit of work: their commit only
+    # flushes, and the scope that opened the session commits or rolls back once.
+    # Only the task that opened it joins; tasks spawned inside inherit the context
+    # variable but may outlive the scope, so they get sessions of their own.
+    def __init__(self, session):
+        self.session = session
+        self.owner = asyncio.current_task()
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def commit(self):
+        await self.session.flush()
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def joined_session() -> JoinedSession | None:
+    joined = current_session.get()
+    if joined is not None and joined.owner is asyncio.current_task():
+        return joined
+    return None
+
 
 @asynccontextmanager
 async def session_scope():
@@ -17,9 +50,35 @@ async def session_scope():
             await session.close()
 
 
+@asynccontextmanager
+async def unit_of_work():
+    joined = joined_session()
+    if joined is not None:
+        yield joined
+        return
+    async with async_session() as session:
+        token = current_session.set(JoinedSession(session))
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            current_session.reset(token)
+
+
 def db_session(func):
     @wraps(func)
     async def wrapper(self, *args, **kwargs):
+        joined = joined_session()
+        if joined is not None:
+            return await func(self, joined, *args, **kwargs)
         async with session_scope() as session:
-            return await func(self, session, *args, **kwargs)
+            # CRUD methods calling other CRUD methods reuse this session.
+            token = current_session.set(JoinedSession(session))
+            try:
+                return await func(self, session, *args, **kwargs)
+            finally:
+                current_session.reset(token)
     return wrapper
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Tests run against a throwaway SQLite database, never the configured DB_URL.
+os.environ["DB_URL"] = os.getenv("TEST_DB_URL",
+                                 f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+# bot.bot builds the aiogram Bot at import time; tests never reach the real Bot API.
+os.environ.setdefault("TOKEN", "123456:TEST")
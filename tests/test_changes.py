@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy import delete, insert, select
+
+from bot import changes
+from bot.changes import MessageChangeTracker
+from bot.sink import message_sink
+from db.create_tables import create_tables
+from db.engine import async_session, engine
+from db.facade import DB
+from db.models.accounts import Account
+from db.models.chats import Chat, PRIVATE_CHAT, CHANNEL
+from db.models.message import Message
+
+db_crud = DB()
+
+ACCOUNT_ID = "+10000000000"
+PRIVATE_CHAT_ID = 777000
+CHANNEL_ID = 1234567890
+
+
+def message_row(id_: int, chat_id: int, message_id: int) -> dict:
+    return {"id": id_, "account_id": ACCOUNT_ID, "chat_id": chat_id, "message_id": message_id, "text": "text",
+            "is_deleted": False, "is_updated": False, "created_at": 1, "updated_at": 1}
+
+
+class FakePipeline:
+    # A message whose NewMessage is still in the ingest stages: it reaches the
+    # sink only once the pipeline is drained.
+    def __init__(self, pending_rows: list):
+        self.pending_rows = pending_rows
+        self.drained = False
+
+    async def drain(self, timeout: float) -> bool:
+        await asyncio.sleep(0.05)
+        for row in self.pending_rows:
+            await message_sink.put(row)
+        self.pending_rows = []
+        self.drained = True
+        return True
+
+
+class MessageChangesTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await create_tables()
+        async with async_session() as session:
+            for model in (Message, Chat, Account):
+                await session.execute(delete(model))
+            await session.execute(insert(Account), [{"id": ACCOUNT_ID, "created_at": 0, "updated_at": 0}])
+            await session.execute(insert(Chat), [
+                {"id": PRIVATE_CHAT_ID, "chat_type": PRIVATE_CHAT, "created_at": 0, "updated_at": 0},
+                {"id": CHANNEL_ID, "chat_type": CHANNEL, "created_at": 0, "updated_at": 0},
+            ])
+            await session.commit()
+
+    async def asyncTearDown(self):
+        await message_sink.stop()
+        await engine.dispose()
+
+    async def add_messages(self, rows: list):
+        async with async_session() as session:
+            await session.execute(insert(Message), rows)
+            await session.commit()
+
+    async def deleted_ids(self) -> set:
+        async with async_session() as session:
+            result = await session.execute(select(Message.id).where(Message.is_deleted.is_(True)))
+            return set(result.scalars().all())
+
+    async def test_deletion_without_chat_skips_channel_messages(self):
+        await self.add_messages([message_row(1, PRIVATE_CHAT_ID, 42), message_row(2, CHANNEL_ID, 42)])
+
+        marked = await db_crud.message_crud.mark_deleted(ACCOUNT_ID, None, [42])
+
+        self.assertEqual(marked, 1)
+        self.assertEqual(await self.deleted_ids(), {1})
+
+    async def test_deletion_with_chat_marks_channel_messages(self):
+        await self.add_messages([message_row(1, PRIVATE_CHAT_ID, 42), message_row(2, CHANNEL_ID, 42)])
+
+        await db_crud.message_crud.mark_deleted(ACCOUNT_ID, CHANNEL_ID, [42])
+
+        self.assertEqual(await self.deleted_ids(), {2})
+
+    async def test_changes_wait_for_messages_still_in_the_pipeline(self):
+        pipeline = FakePipeline([message_row(1, PRIVATE_CHAT_ID, 42)])
+        tracker = MessageChangeTracker(ACCOUNT_ID, pipeline, batch_window=60)
+
+        tracker.on_deleted(SimpleNamespace(chat_id=None, deleted_ids=[42]))
+        await tracker.flush()
+
+        self.assertTrue(pipeline.drained)
+        self.assertEqual(await self.deleted_ids(), {1})
+        self.assertEqual(tracker.deleted_rows, 1)
+        await tracker.stop()
+
+    async def test_failed_batch_is_retried(self):
+        await self.add_messages([message_row(1, PRIVATE_CHAT_ID, 42)])
+        tracker = MessageChangeTracker(ACCOUNT_ID, batch_window=60)
+        tracker.on_deleted(SimpleNamespace(chat_id=None, deleted_ids=[42]))
+
+        with mock.patch.object(changes.db_crud.message_crud, "mark_deleted", side_effect=RuntimeError("db down")):
+            await tracker.flush()
+        self.assertEqual(tracker.failed_flushes, 1)
+        self.assertEqual(tracker.deleted, {None: {42}})
+
+        await tracker.flush()
+        self.assertEqual(await self.deleted_ids(), {1})
+        self.assertEqual(tracker.deleted, {})
+        await tracker.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
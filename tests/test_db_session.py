@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+
+from sqlalchemy import delete
+
+from db.create_tables import create_tables
+from db.engine import async_session, engine
+from db.facade import DB
+from db.models.chats import Chat
+from decorators.db_session import unit_of_work
+
+db_crud = DB()
+
+
+class UnitOfWorkTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await create_tables()
+        async with async_session() as session:
+            await session.execute(delete(Chat))
+            await session.commit()
+
+    async def asyncTearDown(self):
+        await engine.dispose()
+
+    async def create_chat(self, chat_id: int, delay: float = 0.0):
+        await asyncio.sleep(delay)
+        await db_crud.chat_crud.create(id=chat_id, chat_title=f"chat {chat_id}", created_at=0, updated_at=0)
+
+    async def test_task_spawned_inside_commits_its_own_writes(self):
+        async with unit_of_work():
+            await self.create_chat(1)
+            # Still writing after the unit of work below has committed and closed.
+            task = asyncio.create_task(self.create_chat(2, delay=0.1))
+        await task
+
+        self.assertIsNotNone(await db_crud.chat_crud.read(1))
+        self.assertIsNotNone(await db_crud.chat_crud.read(2))
+
+    async def test_task_spawned_inside_survives_a_rollback(self):
+        with self.assertRaises(RuntimeError):
+            async with unit_of_work():
+                # SQLite allows one writer, so the spawned task writes before this transaction does.
+                await asyncio.create_task(self.create_chat(2))
+                await self.create_chat(1)
+                raise RuntimeError("abort")
+
+        self.assertIsNone(await db_crud.chat_crud.read(1))
+        self.assertIsNotNone(await db_crud.chat_crud.read(2))
+
+    async def test_calls_in_the_owning_task_share_the_transaction(self):
+        with self.assertRaises(RuntimeError):
+            async with unit_of_work():
+                await self.create_chat(1)
+                await self.create_chat(2)
+                raise RuntimeError("abort")
+
+        self.assertIsNone(await db_crud.chat_crud.read(1))
+        self.assertIsNone(await db_crud.chat_crud.read(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
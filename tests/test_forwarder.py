@@ -0,0 +1,70 @@
+import asyncio
+import time
+import unittest
+
+from telethon import errors
+
+from bot.forwarder import Forwarder
+
+ACCOUNT_ID = "+10000000000"
+
+
+class FakeClient:
+    # Records forward_messages calls; `flood_waits` makes the first calls raise
+    # FloodWait, and `latency` slows every call down.
+    def __init__(self, latency: float = 0.0, flood_waits: int = 0):
+        self.latency = latency
+        self.flood_waits = flood_waits
+        self.forwarded = []
+
+    async def get_entity(self, chat_id):
+        return chat_id
+
+    async def forward_messages(self, entity, ids, from_peer=None):
+        if self.flood_waits:
+            self.flood_waits -= 1
+            raise errors.FloodWaitError(request=None, capture=1)
+        await asyncio.sleep(self.latency)
+        self.forwarded.append((entity, list(ids)))
+
+
+class ForwarderStopTest(unittest.IsolatedAsyncioTestCase):
+    async def test_stop_flushes_pending_batches(self):
+        client = FakeClient()
+        forwarder = Forwarder(client, ACCOUNT_ID, batch_window=60)
+        for message_id in range(1, 4):
+            forwarder.submit(1, "source", message_id, [10, 20])
+
+        started = time.monotonic()
+        await forwarder.stop(flush_timeout=5)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(sorted(client.forwarded), [(10, [1, 2, 3]), (20, [1, 2, 3])])
+        self.assertEqual(forwarder.pending, {})
+        self.assertEqual(forwarder.tasks, set())
+
+    async def test_stop_waits_for_flood_wait_retries(self):
+        client = FakeClient(flood_waits=1)
+        forwarder = Forwarder(client, ACCOUNT_ID, batch_window=60)
+        forwarder.submit(1, "source", 1, [10])
+
+        await forwarder.stop(flush_timeout=5)
+
+        self.assertEqual(client.forwarded, [(10, [1])])
+        self.assertEqual(forwarder.target_stats[10].flood_waits, 1)
+
+    async def test_stop_gives_up_after_flush_timeout(self):
+        client = FakeClient(latency=30)
+        forwarder = Forwarder(client, ACCOUNT_ID, batch_window=60)
+        forwarder.submit(1, "source", 1, [10])
+
+        started = time.monotonic()
+        await forwarder.stop(flush_timeout=0.2)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(client.forwarded, [])
+        self.assertEqual(forwarder.tasks, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
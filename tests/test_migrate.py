@@ -0,0 +1,60 @@
+import unittest
+
+from sqlalchemy import delete, inspect, text
+
+from db.engine import Base, engine
+from db.migrate import MIGRATIONS, SchemaVersion, check_indexes, current_version, migrate
+
+ACCOUNT_ID = "+10000000000"
+CHAT_ID = -1001234567890
+
+
+class MigrateTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+
+    async def asyncTearDown(self):
+        await engine.dispose()
+
+    async def version(self) -> int:
+        async with engine.connect() as conn:
+            return await current_version(conn)
+
+    async def test_fresh_schema_has_indexes_for_hot_queries(self):
+        await migrate()
+
+        self.assertEqual(await self.version(), MIGRATIONS[-1][0])
+        self.assertTrue(await check_indexes())
+
+    async def test_association_account_id_becomes_a_string(self):
+        await migrate()
+        # Roll back to the schema migration 5 replaces: an INTEGER account_id.
+        async with engine.begin() as conn:
+            await conn.execute(delete(SchemaVersion).where(SchemaVersion.version >= 5))
+            await conn.execute(text("DROP TABLE account_chat_association"))
+            await conn.execute(text(
+                "CREATE TABLE account_chat_association (account_id INTEGER NOT NULL REFERENCES accounts (id), "
+                "chat_id BIGINT NOT NULL REFERENCES chats (id), PRIMARY KEY (account_id, chat_id))"
+            ))
+            await conn.execute(text(f"INSERT INTO accounts (id, created_at, updated_at) VALUES ('{ACCOUNT_ID}', 0, 0)"))
+            await conn.execute(text(f"INSERT INTO chats (id, created_at, updated_at) VALUES ({CHAT_ID}, 0, 0)"))
+            await conn.execute(text(f"INSERT INTO account_chat_association VALUES ('{ACCOUNT_ID}', {CHAT_ID})"))
+
+        await migrate()
+
+        self.assertEqual(await self.version(), MIGRATIONS[-1][0])
+        async with engine.connect() as conn:
+            columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns("account_chat_association"))
+            rows = (await conn.execute(text("SELECT account_id, typeof(account_id), chat_id "
+                                            "FROM account_chat_association"))).all()
+            linked = await conn.execute(text("SELECT accounts.id FROM accounts JOIN account_chat_association "
+                                             "ON account_chat_association.account_id = accounts.id"))
+        self.assertEqual({column["name"]: str(column["type"]) for column in columns}["account_id"], "VARCHAR")
+        self.assertEqual(rows, [(ACCOUNT_ID, "text", CHAT_ID)])
+        self.assertEqual(linked.scalars().all(), [ACCOUNT_ID])
+        self.assertTrue(await check_indexes())
+
+
+if __name__ == "__main__":
+    unittest.main()
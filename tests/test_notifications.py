@@ -0,0 +1,277 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+from sqlalchemy import delete, insert
+from telethon.tl.types import User
+
+from bot.notifications import NotificationDispatcher
+from bot.pipeline import IngestPipeline
+from bot.sink import message_sink
+from db.create_tables import create_tables
+from db.engine import async_session, engine
+from db.models.accounts import Account
+from db.models.chats import Chat
+from db.models.message import Message
+
+TOKEN = "123456:TEST"
+ACCOUNT_ID = "+10000000000"
+
+
+class FakeBotAPI:
+    # A local Bot API server for aiogram: sendMessage answers after `latency`
+    # seconds, and the first `flood_responses` calls get a 429 with retry_after.
+    def __init__(self, latency: float = 0.0, flood_responses: int = 0, retry_after: int = 1):
+        self.latency = latency
+        self.flood_responses = flood_responses
+        self.retry_after = retry_after
+        self.requests = 0
+        self.sent = []
+        self.runner = None
+        self.url = None
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/sendMessage", self.send_message)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.runner.cleanup()
+
+    def bot(self) -> Bot:
+        return Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(self.url)))
+
+    async def send_message(self, request):
+        data = await request.post()
+        self.requests += 1
+        if self.flood_responses:
+            self.flood_responses -= 1
+            return web.json_response({"ok": False, "error_code": 429,
+                                      "description": f"Too Many Requests: retry after {self.retry_after}",
+                                      "parameters": {"retry_after": self.retry_after}}, status=429)
+        await asyncio.sleep(self.latency)
+        chat_id = int(data["chat_id"])
+        self.sent.append((chat_id, time.monotonic()))
+        return web.json_response({"ok": True, "result": {
+            "message_id": len(self.sent), "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "text": data["text"],
+        }})
+
+
+def triggered(count: int) -> list:
+    message = {"sender_username": "sender", "text": "hello"}
+    return [(SimpleNamespace(id=index), 1, [f"rule {index}"], message) for index in range(count)]
+
+
+class NotificationDispatcherTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.stored = []
+        self.dispatchers = []
+        self.bots = []
+
+    async def asyncTearDown(self):
+        for dispatcher in self.dispatchers:
+            await dispatcher.stop(drain_timeout=0)
+        for bot in self.bots:
+            await bot.session.close()
+        await engine.dispose()
+
+    def make_dispatcher(self, api: FakeBotAPI, **kwargs) -> NotificationDispatcher:
+        bot = api.bot()
+        self.bots.append(bot)
+        dispatcher = NotificationDispatcher(bot, **kwargs)
+
+        async def store(rows):
+            self.stored.extend(rows)
+
+        dispatcher.notification_sink.flush_func = store
+        self.dispatchers.append(dispatcher)
+        return dispatcher
+
+    async def wait_sent(self, api: FakeBotAPI, count: int, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while len(api.sent) < count:
+            self.assertLess(time.monotonic(), deadline, f"only {len(api.sent)} of {count} notifications sent")
+            await asyncio.sleep(0.01)
+
+    async def test_submit_does_not_wait_for_slow_sends(self):
+        async with FakeBotAPI(latency=0.5) as api:
+            dispatcher = self.make_dispatcher(api, workers=2, global_rate=1000, chat_rate=1000)
+
+            started = time.monotonic()
+            for tg_id in range(1, 201):
+                await dispatcher.submit(triggered(1), tg_id)
+            elapsed = time.monotonic() - started
+
+            # 200 sends at 0.5s over 2 workers take 50s; submitting them must not.
+            self.assertLess(elapsed, 0.5)
+            self.assertEqual(api.sent, [])
+            self.assertGreaterEqual(dispatcher.queue.qsize(), 198)
+
+    async def test_notifications_are_stored_without_a_telegram_id(self):
+        async with FakeBotAPI() as api:
+            dispatcher = self.make_dispatcher(api)
+
+            await dispatcher.submit(triggered(3), None)
+            await dispatcher.notification_sink.flush_all()
+
+            self.assertEqual([row["event_id"] for row in self.stored], [0, 1, 2])
+            self.assertEqual(dispatcher.queue.qsize(), 0)
+            self.assertEqual(api.requests, 0)
+
+    async def test_per_chat_rate_limit(self):
+        async with FakeBotAPI() as api:
+            dispatcher = self.make_dispatcher(api, workers=4, global_rate=1000, chat_rate=10)
+
+            await dispatcher.submit(triggered(5), 42)
+            await self.wait_sent(api, 5)
+
+        times = [sent_at for _, sent_at in api.sent]
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        # One message per 0.1s to the same chat, even with four workers.
+        self.assertTrue(all(gap >= 0.09 for gap in gaps), gaps)
+
+    async def test_global_rate_limit(self):
+        async with FakeBotAPI() as api:
+            dispatcher = self.make_dispatcher(api, workers=8, global_rate=20, chat_rate=1000)
+
+            for tg_id in range(1, 41):
+                await dispatcher.submit(triggered(1), tg_id)
+            await self.wait_sent(api, 40)
+
+        times = sorted(sent_at for _, sent_at in api.sent)
+        # A burst of 20, then 20 per second across all chats.
+        self.assertGreaterEqual(times[-1] - times[0], 0.9)
+        for index, sent_at in enumerate(times):
+            in_window = sum(1 for other in times[index:] if other - sent_at < 0.5)
+            self.assertLessEqual(in_window, 20 + 10 + 1)
+
+    async def test_flood_limit_is_retried_after_retry_after(self):
+        async with FakeBotAPI(flood_responses=1, retry_after=1) as api:
+            dispatcher = self.make_dispatcher(api, workers=1, global_rate=1000, chat_rate=1000)
+
+            started = time.monotonic()
+            for tg_id in range(1, 6):
+                await dispatcher.submit(triggered(1), tg_id)
+            await self.wait_sent(api, 5)
+
+        self.assertEqual(dispatcher.retries, 1)
+        self.assertEqual(dispatcher.sent, 5)
+        self.assertEqual([chat_id for chat_id, _ in api.sent], [1, 2, 3, 4, 5])
+        # The 429 blocks the global limiter for retry_after before anything else goes out.
+        self.assertGreaterEqual(api.sent[0][1] - started, 0.95)
+
+    async def test_stop_waits_for_queued_deliveries(self):
+        async with FakeBotAPI(latency=0.05) as api:
+            dispatcher = self.make_dispatcher(api, workers=2, global_rate=1000, chat_rate=1000)
+            for tg_id in range(1, 11):
+                await dispatcher.submit(triggered(1), tg_id)
+
+            await dispatcher.stop(drain_timeout=5)
+
+        self.assertEqual(len(api.sent), 10)
+        self.assertEqual(dispatcher.dropped, 0)
+
+    async def test_stop_drops_what_does_not_drain_in_time(self):
+        async with FakeBotAPI(latency=0.5) as api:
+            dispatcher = self.make_dispatcher(api, workers=2, global_rate=1000, chat_rate=1000)
+            for tg_id in range(1, 21):
+                await dispatcher.submit(triggered(1), tg_id)
+            await asyncio.sleep(0.05)
+
+            await dispatcher.stop(drain_timeout=0.1)
+
+        # Two sends were in flight when the workers were cancelled; the other 18 never left the queue.
+        self.assertEqual(dispatcher.dropped, 18)
+        self.assertEqual(dispatcher.queue.qsize(), 0)
+        self.assertEqual(api.sent, [])
+
+
+class FakeRuleEngine:
+    # Every message triggers one event.
+    async def match_events(self, message_data, user_id):
+        return [(SimpleNamespace(id=1), user_id, ["rule"], message_data)]
+
+
+class FakeIngestContext:
+    def __init__(self, tg_id: int):
+        self.context = SimpleNamespace(scrape_forward_mode=False, user_id=1, tg_id=tg_id)
+
+    async def get(self, session_name):
+        return self.context
+
+
+def new_message_event(chat: User, message_id: int) -> SimpleNamespace:
+    async def get_entity():
+        return chat
+
+    return SimpleNamespace(get_chat=get_entity, get_sender=get_entity, text=f"message {message_id}",
+                           message=SimpleNamespace(id=message_id, media=None))
+
+
+class IngestThroughputTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await create_tables()
+        async with async_session() as session:
+            for model in (Message, Chat, Account):
+                await session.execute(delete(model))
+            await session.execute(insert(Account), [{"id": ACCOUNT_ID, "created_at": 0, "updated_at": 0}])
+            await session.commit()
+
+    async def asyncTearDown(self):
+        await message_sink.stop()
+        await engine.dispose()
+
+    async def ingest(self, latency: float, first_message_id: int, count: int) -> tuple:
+        async with FakeBotAPI(latency=latency) as api:
+            bot = api.bot()
+            dispatcher = NotificationDispatcher(bot, workers=4, global_rate=1000, chat_rate=1000)
+
+            async def store(rows):
+                pass
+
+            dispatcher.notification_sink.flush_func = store
+            history = SimpleNamespace(media_downloader=None, rule_engine=FakeRuleEngine(),
+                                      ingest_context=FakeIngestContext(tg_id=42),
+                                      notification_dispatcher=dispatcher)
+            pipeline = IngestPipeline(history, ACCOUNT_ID, forwarder=None)
+            pipeline.start()
+            chat = User(id=777000, first_name="sender", username="sender")
+
+            started = time.monotonic()
+            for message_id in range(first_message_id, first_message_id + count):
+                await pipeline.submit(new_message_event(chat, message_id))
+            self.assertTrue(await pipeline.drain(timeout=30))
+            elapsed = time.monotonic() - started
+
+            sent = len(api.sent)
+            await pipeline.stop()
+            await dispatcher.stop(drain_timeout=0)
+            await bot.session.close()
+        return elapsed, sent, pipeline.persisted
+
+    async def test_ingest_throughput_does_not_depend_on_send_latency(self):
+        count = 300
+        fast, _, fast_persisted = await self.ingest(0.0, 1, count)
+        slow, slow_sent, slow_persisted = await self.ingest(0.5, count + 1, count)
+
+        self.assertEqual((fast_persisted, slow_persisted), (count, count))
+        # With 0.5s sends over 4 workers, a blocking pipeline would need 300 / 4 * 0.5 = 37.5s.
+        self.assertLess(slow, max(fast * 3, 1.0), f"{count / fast:.0f} msg/s with instant sends, "
+                                                  f"{count / slow:.0f} msg/s with 0.5s sends")
+        self.assertLess(slow_sent, count)
+
+
+if __name__ == "__main__":
+    unittest.main()
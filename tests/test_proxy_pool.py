@@ -0,0 +1,225 @@
+import asyncio
+import socket
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy import delete, insert
+
+from bot import bot as bot_module
+from bot.bot import TelegramChatHistory
+from bot.proxy_pool import ProxyPool, probe_proxy
+from db.create_tables import create_tables
+from db.engine import async_session, engine
+from db.facade import DB
+from db.models.accounts import Account
+from db.models.proxy import Proxy
+
+db_crud = DB()
+
+
+class Socks5Server:
+    # Speaks just enough SOCKS5 for probe_proxy: the greeting and, when
+    # credentials are set, username/password authentication (RFC 1929).
+    def __init__(self, login: str = None, password: str = None, reject_methods: bool = False):
+        self.login = login
+        self.password = password
+        self.reject_methods = reject_methods
+        self.server = None
+        self.port = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        try:
+            _, count = await reader.readexactly(2)
+            methods = await reader.readexactly(count)
+            wanted = 2 if self.login else 0
+            if self.reject_methods or wanted not in methods:
+                writer.write(b"\x05\xff")
+                return
+            writer.write(bytes([5, wanted]))
+            if wanted == 2:
+                _, login_length = await reader.readexactly(2)
+                login = (await reader.readexactly(login_length)).decode()
+                password_length = (await reader.readexactly(1))[0]
+                password = (await reader.readexactly(password_length)).decode()
+                ok = login == self.login and password == self.password
+                writer.write(b"\x01\x00" if ok else b"\x01\x01")
+            await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def proxy(port: int, login: str = None, password: str = None) -> SimpleNamespace:
+    return SimpleNamespace(type="socks5", ip="127.0.0.1", port=port, login=login, password=password)
+
+
+class ProbeProxyTest(unittest.IsolatedAsyncioTestCase):
+    async def test_probe_without_auth(self):
+        async with Socks5Server() as server:
+            latency_ms = await probe_proxy(proxy(server.port), timeout=2)
+        self.assertGreaterEqual(latency_ms, 0)
+
+    async def test_probe_with_auth(self):
+        async with Socks5Server("user", "secret") as server:
+            latency_ms = await probe_proxy(proxy(server.port, "user", "secret"), timeout=2)
+        self.assertGreaterEqual(latency_ms, 0)
+
+    async def test_probe_rejects_wrong_credentials(self):
+        async with Socks5Server("user", "secret") as server:
+            with self.assertRaisesRegex(ConnectionError, "authentication failed"):
+                await probe_proxy(proxy(server.port, "user", "wrong"), timeout=2)
+
+    async def test_probe_rejects_unsupported_methods(self):
+        async with Socks5Server(reject_methods=True) as server:
+            with self.assertRaisesRegex(ConnectionError, "greeting rejected"):
+                await probe_proxy(proxy(server.port), timeout=2)
+
+    async def test_probe_fails_when_nothing_listens(self):
+        with self.assertRaises(OSError):
+            await probe_proxy(proxy(closed_port()), timeout=2)
+
+
+class ProxyTableTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await create_tables()
+        async with async_session() as session:
+            await session.execute(delete(Account))
+            await session.execute(delete(Proxy))
+            await session.commit()
+
+    async def asyncTearDown(self):
+        await engine.dispose()
+
+    async def add_proxies(self, rows: list):
+        defaults = {"type": "socks5", "ip": "127.0.0.1", "location": "usa", "in_use": False,
+                    "error_rate": 0.0, "is_healthy": True, "created_at": 0, "updated_at": 0}
+        async with async_session() as session:
+            await session.execute(insert(Proxy), [{**defaults, **row} for row in rows])
+            await session.commit()
+
+
+class ProxyPoolTest(ProxyTableTestCase):
+    async def test_check_all_marks_failing_proxies_unhealthy(self):
+        async with Socks5Server("user", "secret") as server:
+            await self.add_proxies([
+                {"id": 1, "port": server.port, "login": "user", "password": "secret"},
+                {"id": 2, "port": server.port, "login": "user", "password": "wrong"},
+                {"id": 3, "port": closed_port()},
+            ])
+            results = await ProxyPool(history=None, timeout=2).check_all()
+
+        by_id = {result["id"]: result for result in results}
+        self.assertTrue(by_id[1]["is_healthy"])
+        self.assertIsNotNone(by_id[1]["latency_ms"])
+        for proxy_id in (2, 3):
+            self.assertFalse(by_id[proxy_id]["is_healthy"])
+            self.assertIsNone(by_id[proxy_id]["latency_ms"])
+            self.assertGreater(by_id[proxy_id]["error_rate"], 0)
+
+        stored = {proxy_id: await db_crud.proxy_crud.read(proxy_id) for proxy_id in (1, 2, 3)}
+        self.assertEqual([stored[proxy_id].is_healthy for proxy_id in (1, 2, 3)], [True, False, False])
+        self.assertIsNotNone(stored[1].last_checked_at)
+
+    async def test_lease_prefers_lowest_latency_healthy_proxy(self):
+        await self.add_proxies([
+            {"id": 1, "port": 1001, "latency_ms": 300},
+            {"id": 2, "port": 1002, "latency_ms": 50},
+            {"id": 3, "port": 1003, "latency_ms": 10, "is_healthy": False},
+            {"id": 4, "port": 1004, "latency_ms": 5, "location": "eu"},
+        ])
+
+        leased = await db_crud.proxy_crud.lease_best("usa")
+        self.assertEqual(leased.id, 2)
+        self.assertTrue(leased.in_use)
+
+    async def test_lease_is_compare_and_set(self):
+        await self.add_proxies([{"id": proxy_id, "port": 1000 + proxy_id, "latency_ms": proxy_id}
+                                for proxy_id in range(1, 4)])
+
+        leased = await asyncio.gather(*(db_crud.proxy_crud.lease_best("usa") for _ in range(8)))
+        leased_ids = [proxy.id for proxy in leased if proxy is not None]
+
+        # Three proxies, eight concurrent callers: each proxy goes to exactly one caller.
+        self.assertEqual(sorted(leased_ids), [1, 2, 3])
+        self.assertEqual(sum(proxy is None for proxy in leased), 5)
+
+    async def test_released_proxy_can_be_leased_again(self):
+        await self.add_proxies([{"id": 1, "port": 1001, "latency_ms": 10}])
+
+        self.assertEqual((await db_crud.proxy_crud.lease_best("usa")).id, 1)
+        self.assertIsNone(await db_crud.proxy_crud.lease_best("usa"))
+        await db_crud.proxy_crud.release(1)
+        self.assertEqual((await db_crud.proxy_crud.lease_best("usa")).id, 1)
+
+    async def test_lease_skips_proxies_of_existing_accounts(self):
+        await self.add_proxies([{"id": 1, "port": 1001, "latency_ms": 10},
+                                {"id": 2, "port": 1002, "latency_ms": 50}])
+        async with async_session() as session:
+            await session.execute(insert(Account), [{"id": "+10000000000", "proxy_id": 1,
+                                                     "created_at": 0, "updated_at": 0}])
+            await session.commit()
+
+        leased = await ProxyPool(history=None).lease("usa")
+
+        self.assertEqual(leased.id, 2)
+        self.assertTrue((await db_crud.proxy_crud.read(1)).in_use)
+
+    async def test_health_checks_can_be_left_to_another_process(self):
+        async with Socks5Server() as server:
+            await self.add_proxies([{"id": 1, "port": server.port, "is_healthy": False}])
+            pool = ProxyPool(history=SimpleNamespace(sessions={}), interval=60, check_health=False)
+            pool.start()
+            await asyncio.sleep(0.2)
+            await pool.stop()
+
+        self.assertEqual(pool.checks, 0)
+        self.assertFalse((await db_crud.proxy_crud.read(1)).is_healthy)
+
+
+class FakeLoginClient:
+    def __init__(self):
+        self.disconnected = False
+
+    async def disconnect(self):
+        self.disconnected = True
+
+
+class PendingLoginTest(ProxyTableTestCase):
+    async def test_unfinished_login_releases_its_proxy(self):
+        await self.add_proxies([{"id": 1, "port": 1001, "latency_ms": 10}])
+        history = TelegramChatHistory()
+        proxy = await history.proxy_pool.lease("usa")
+        client = FakeLoginClient()
+
+        with mock.patch.object(bot_module, "PENDING_LOGIN_TTL", 0.1):
+            history.pending_sessions["+10000000000"] = [client, "code hash", proxy.id]
+            history._expire_pending_login_later("+10000000000")
+            await asyncio.sleep(0.3)
+
+        self.assertTrue(client.disconnected)
+        self.assertEqual(history.pending_sessions, {})
+        self.assertEqual(history.pending_login_timers, {})
+        self.assertFalse((await db_crud.proxy_crud.read(1)).in_use)
+        self.assertEqual(await history.pass_code("+10000000000", code="12345"),
+                         "No login session found for +10000000000")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+
+from sqlalchemy import delete, insert, select
+
+from bot.reconcile import Reconciler
+from db.create_tables import create_tables
+from db.engine import async_session, engine
+from db.facade import DB
+from db.models.accounts import Account
+from db.models.chats import Chat
+from db.models.message import Message
+from db.models.reconcile_state import ReconcileState
+
+db_crud = DB()
+
+ACCOUNT_ID = "+10000000000"
+CHAT_ID = -1001234567890
+CREATED_AT = 1_700_000_000
+
+
+class FakeMessage:
+    def __init__(self, message_id: int):
+        self.id = message_id
+        self.text = f"message {message_id}"
+
+
+class FakeClient:
+    # Serves the chat history from memory; only probe's get_messages is needed.
+    def __init__(self, message_ids):
+        self.history = {message_id: FakeMessage(message_id) for message_id in message_ids}
+
+    async def get_messages(self, entity, ids: list):
+        return [self.history.get(message_id) for message_id in ids]
+
+
+async def no_filters(messages, filters):
+    return messages
+
+
+class ReconcileMarkTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await create_tables()
+        async with async_session() as session:
+            for model in (ReconcileState, Message, Chat, Account):
+                await session.execute(delete(model))
+            await session.execute(insert(Account), [{"id": ACCOUNT_ID, "created_at": 0, "updated_at": 0}])
+            await session.execute(insert(Chat), [{"id": CHAT_ID, "chat_title": "chat", "created_at": 0,
+                                                  "updated_at": 0}])
+            await session.commit()
+        self.client = FakeClient(range(1, 101))
+
+    async def asyncTearDown(self):
+        await engine.dispose()
+
+    async def store(self, message_ids):
+        async with async_session() as session:
+            await session.execute(insert(Message), [
+                {"account_id": ACCOUNT_ID, "chat_id": CHAT_ID, "message_id": message_id,
+                 "text": f"message {message_id}", "is_deleted": False, "is_updated": False,
+                 "created_at": CREATED_AT + message_id, "updated_at": CREATED_AT + message_id}
+                for message_id in message_ids
+            ])
+            await session.commit()
+
+    async def run_window(self, first_id: int, last_id: int) -> dict:
+        reconciler = Reconciler(self.client, ACCOUNT_ID, no_filters)
+        return await reconciler.run([CHAT_ID], CREATED_AT + first_id, CREATED_AT + last_id)
+
+    async def mark(self):
+        return (await db_crud.reconcile_state_crud.get_marks(ACCOUNT_ID, [CHAT_ID])).get(CHAT_ID)
+
+    def deleted_message_ids(self, diff: dict) -> set:
+        return {message["message_id"] for message in diff["deleted"].get(CHAT_ID, [])}
+
+    async def test_narrow_window_does_not_hide_older_messages(self):
+        await self.store(range(1, 11))
+
+        await self.run_window(8, 10)
+        self.assertIsNone(await self.mark())
+
+        # Deleted after the narrow run; the wide run must still look at it.
+        del self.client.history[2]
+        diff = await self.run_window(0, 10)
+
+        self.assertEqual(self.deleted_message_ids(diff), {2})
+        self.assertEqual(await self.mark(), 10)
+        async with async_session() as session:
+            result = await session.execute(select(Message.message_id).where(Message.is_deleted.is_(True)))
+            self.assertEqual(result.scalars().all(), [2])
+
+    async def test_window_starting_at_the_mark_advances_it(self):
+        await self.store(range(1, 11))
+        await self.run_window(0, 10)
+        self.assertEqual(await self.mark(), 10)
+
+        await self.store(range(11, 13))
+        await self.run_window(11, 12)
+        self.assertEqual(await self.mark(), 12)
+
+    async def test_window_past_unchecked_messages_keeps_the_mark(self):
+        await self.store(range(1, 11))
+        await self.run_window(0, 10)
+
+        await self.store(range(11, 21))
+        await self.run_window(18, 20)
+        self.assertEqual(await self.mark(), 10)
+
+        del self.client.history[12]
+        diff = await self.run_window(0, 20)
+        self.assertEqual(self.deleted_message_ids(diff), {12})
+        self.assertEqual(await self.mark(), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
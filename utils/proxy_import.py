@@ -0,0 +1,131 @@
+import asyncio
+import ipaddress
+import re
+import time
+from types import SimpleNamespace
+
+from loguru import logger
+
+from bot.proxy_pool import probe_proxy
+from db.facade import DB
+
+db_crud = DB()
+
+PROXY_IMPORT_READ_SIZE = 64 * 1024
+PROXY_IMPORT_CHUNK_SIZE = 1000
+PROXY_IMPORT_CHECK_CONCURRENCY = 100
+MAX_REPORTED_ERRORS = 50
+
+HOSTNAME_RE = re.compile(r"^(?=.{1,253}$)([a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,63}$")
+
+
+async def iter_lines(file, read_size: int = PROXY_IMPORT_READ_SIZE):
+    tail = b""
+    while True:
+        data = await file.read(read_size)
+        if not data:
+            break
+        lines = (tail + data).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line
+    if tail:
+        yield tail
+
+
+def parse_proxy_line(line: str, prx_type: str, location: str) -> dict:
+    parts = line.split(":")
+    if len(parts) not in (2, 4):
+        raise ValueError("expected ip:port or ip:port:login:password")
+    ip, port = parts[0].strip(), parts[1].strip()
+    try:
+        ipaddress.ip_address(ip)
+    except ValueError:
+        if not HOSTNAME_RE.match(ip):
+            raise ValueError(f"invalid host {ip!r}")
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"invalid port {port!r}")
+    login, password = (parts[2], parts[3]) if len(parts) == 4 else (None, None)
+    return {
+        "type": prx_type,
+        "ip": ip,
+        "port": int(port),
+        "login": login or None,
+        "password": password or None,
+        "location": location,
+    }
+
+
+class ProxyImporter:
+    def __init__(self, prx_type: str, location: str, check: bool = False,
+                 chunk_size: int = PROXY_IMPORT_CHUNK_SIZE):
+        self.prx_type = prx_type
+        self.location = location
+        self.check = check
+        self.chunk_size = chunk_size
+        self.seen = set()
+        self.summary = {"inserted": 0, "skipped": 0, "rejected": 0, "unreachable": 0, "errors": []}
+
+    def reject(self, line_number: int, reason: str):
+        self.summary["rejected"] += 1
+        if len(self.summary["errors"]) < MAX_REPORTED_ERRORS:
+            self.summary["errors"].append({"line": line_number, "error": reason})
+
+    async def run(self, file) -> dict:
+        chunk = []
+        line_number = 0
+        async for raw_line in iter_lines(file):
+            line_number += 1
+            try:
+                line = raw_line.decode().strip()
+            except UnicodeDecodeError:
+                self.reject(line_number, "not valid UTF-8")
+                continue
+            if not line or line.startswith("#"):
+                continue
+            try:
+                row = parse_proxy_line(line, self.prx_type, self.location)
+            except ValueError as e:
+                self.reject(line_number, str(e))
+                continue
+
+            key = (row["ip"], row["port"], row["login"])
+            if key in self.seen:
+                self.summary["skipped"] += 1
+                continue
+            self.seen.add(key)
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                await self.insert(chunk)
+                chunk = []
+        if chunk:
+            await self.insert(chunk)
+
+        logger.info(f"Proxy import finished: {self.summary['inserted']} inserted, {self.summary['skipped']} "
+                    f"skipped, {self.summary['rejected']} rejected, {self.summary['unreachable']} unreachable")
+        return self.summary
+
+    async def insert(self, rows: list):
+        existing = await db_crud.proxy_crud.get_existing_keys([row["ip"] for row in rows])
+        new_rows = [row for row in rows if (row["ip"], row["port"], row["login"]) not in existing]
+        self.summary["skipped"] += len(rows) - len(new_rows)
+        if self.check:
+            await self.check_connectivity(new_rows)
+        self.summary["inserted"] += await db_crud.proxy_crud.create_many(new_rows)
+
+    async def check_connectivity(self, rows: list):
+        semaphore = asyncio.Semaphore(PROXY_IMPORT_CHECK_CONCURRENCY)
+
+        async def check(row):
+            async with semaphore:
+                try:
+                    latency_ms = round(await probe_proxy(SimpleNamespace(**row)))
+                except Exception:
+                    latency_ms = None
+                    self.summary["unreachable"] += 1
+                row.update(latency_ms=latency_ms,
+                           is_healthy=latency_ms is not None,
+                           error_rate=0.0 if latency_ms is not None else 1.0,
+                           last_checked_at=int(time.time()))
+
+        await asyncio.gather(*(check(row) for row in rows))
@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    # delay() and take() are the non-blocking half of acquire(), for callers that
+    # schedule several buckets themselves and pass one clock reading to all of them.
+    def delay(self, now: float = None) -> float:
+        if now is None:
+            now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def try_acquire(self) -> bool:
+        if self.delay() > 0:
+            return False
+        self.take()
+        return True
+
+    async def acquire(self):
+        async with self.lock:
+            while not self.try_acquire():
+                await asyncio.sleep(self.delay())
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)